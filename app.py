@@ -1,76 +1,264 @@
 # Modified app.py
 
-from flask import Flask, render_template, request, jsonify
-from app.controllers.game_controller import GameController
+import atexit
+import os
+import time
+from functools import lru_cache
 
-# Initialize Flask app, pointing to your custom templates and static folders
+from flask import Flask, Response, g, render_template, request, jsonify
+from app.controllers.game_service import (
+    ApiError, GameService, MAX_BOARD_SIZE, MIN_BOARD_SIZE, SESSION_COOKIE,
+)
+from app.utils import metrics, preload
+from app.views import assets
+
+# Initialize Flask app, pointing to your custom templates. Static files
+# are served by static_file below: fingerprinted, precompressed and cached
 app = Flask(
     __name__,
     template_folder="app/views/templates",
-    static_folder="app/views/static"
+    static_folder=None
 )
+static_files = assets.StaticFiles(os.path.join(app.root_path, "app/views/static"))
+static_files.add("js/palettes.js", GameService.palettes_script())
+app.add_template_global(static_files.url, "asset_url")
+PAGE_FIELDS = ("board_size", "initial_state")
+
+# Games, sessions and route logic (see game_service): the puzzle pool is
+# refilled in the background and saved under the instance folder, and
+# GAME_STORE / PUZZLE_CATALOG_DIR pick the session store and catalogs
+service = GameService.from_env(app.instance_path)
+# Per-size tables and catalogs, built before gunicorn forks (preload_app,
+# see gunicorn.conf.py) so workers share them; the saved puzzle pool is
+# loaded and graded there once too, each worker keeping a share of it, and
+# the service's threads then start in each worker
+preload.warm_tables(range(MIN_BOARD_SIZE, MAX_BOARD_SIZE + 1), service.catalogs.values())
+if preload.FORKING:
+    service.load_pool()
+    preload.in_workers(service.start, service.stop)
+else:
+    service.start()
+    atexit.register(service.stop)
+
+def current_game(create=None):
+    """
+    Check out the game of the requesting browser (see session_store).
+    A session id is issued on the first request and set as a cookie.
+    """
+    session_id, is_new = service.session_id(request.cookies.get(SESSION_COOKIE))
+    if is_new:
+        g.new_session_id = session_id
+    return service.session(session_id, create)
+
+@app.errorhandler(ApiError)
+def api_error(e):
+    return jsonify({"error": str(e)}), e.status
+
+# Request metrics (QUEENS_METRICS=1, served on /metrics; each gunicorn
+# worker reports its own), and with METRICS_PROFILE_SLOWEST=<n> the cProfile
+# stats of the n slowest requests (one request profiled at a time)
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_seconds", "Time to handle a request.")
+RESPONSE_BYTES = metrics.histogram(
+    "http_response_bytes", "Size of the response body.", metrics.SIZE_BUCKETS)
+REQUESTS = metrics.counter(
+    "http_requests_total", "Requests handled.")
+profile_slowest = int(os.environ.get("METRICS_PROFILE_SLOWEST", 0))
+slowest_profiles = metrics.SlowestProfiles(profile_slowest) if profile_slowest else None
+
+@app.before_request
+def start_request_metrics():
+    if metrics.ENABLED:
+        g.request_start = time.perf_counter()
+        if slowest_profiles is not None:
+            g.profile = slowest_profiles.start()
 
-# Create a single global GameController instance
-# (you could also scope this per-session if you want multiple simultaneous users)
-controller = GameController(board_size=8)
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route=route)
+        REQUESTS.inc(route=route, status=response.status_code)
+        if not response.direct_passthrough:
+            RESPONSE_BYTES.observe(response.calculate_content_length() or 0, route=route)
+    return response
+
+@app.teardown_request
+def stop_request_profile(exc):
+    # Not in after_request, which a view raising skips: the profiler must
+    # be released (and unhooked from this thread) after every request
+    token = g.pop("profile", None)
+    if token is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        slowest_profiles.stop(token, f"{request.method} {route}")
+
+@app.route("/metrics", methods=["GET"])
+def metrics_text():
+    """Counters and histograms of this worker, in Prometheus text format."""
+    if not metrics.ENABLED:
+        return jsonify({"error": "Metrics are disabled (set QUEENS_METRICS=1)."}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/metrics/profiles", methods=["GET"])
+def metrics_profiles():
+    """cProfile stats of the slowest requests, slowest first."""
+    if not metrics.ENABLED or slowest_profiles is None:
+        return jsonify({"error": "Profiling is disabled (set METRICS_PROFILE_SLOWEST)."}), 404
+    return Response(slowest_profiles.report(), mimetype="text/plain")
+
+@app.after_request
+def set_session_cookie(response):
+    session_id = g.pop("new_session_id", None)
+    if session_id:
+        response.set_cookie(
+            SESSION_COOKIE, session_id,
+            max_age=30 * 24 * 3600, httponly=True, samesite="Lax"
+        )
+    return response
+
+@lru_cache(maxsize=1)
+def index_shell():
+    """index.html rendered once, with placeholders for the per-session values."""
+    return assets.PageShell(
+        render_template("index.html", **assets.PageShell.placeholders(PAGE_FIELDS)),
+        PAGE_FIELDS,
+    )
+
+@app.route("/static/<path:filename>", methods=["GET"])
+def static_file(filename):
+    """
+    A static file from memory: gzip / brotli copies when the client takes
+    them, immutable caching for fingerprinted names (see assets.StaticFiles)
+    and 304 for an If-None-Match that still holds.
+    """
+    found = static_files.response(
+        filename,
+        request.headers.get("Accept-Encoding"),
+        request.headers.get("If-None-Match"),
+    )
+    if found is None:
+        return jsonify({"error": "Not found."}), 404
+    status, body, headers = found
+    return Response(body, status=status, headers=headers)
 
 @app.route("/", methods=["GET"])
 def index():
     """
-    Render the main game page.
-    Pass in the initial board size and the current game state as JSON.
+    Render the main game page: the cached shell of index.html with the
+    board size and the current game state filled in. The ETag follows the
+    game, so reloading an unchanged game answers 304 without building the
+    state (the page then takes a fresh server clock from /get_time).
     """
-    return render_template(
-        "index.html",
-        board_size=controller.board_size,
-        initial_state=controller.get_game_state()
-    )
+    shell = index_shell()
+    with current_game() as game:
+        controller = game.controller
+        etag = shell.etag(*service.state_key(controller))
+        page = None
+        if not assets.etag_matches(request.headers.get("If-None-Match"), etag):
+            page = shell.fill(
+                board_size=controller.board_size,
+                initial_state=assets.script_json(controller.get_game_state()),
+            )
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if page is None:
+        return Response(status=304, headers=headers)
+    return Response(page, mimetype="text/html", headers=headers)
 
 @app.route("/move", methods=["POST"])
 def move():
     """
     Handle a move request from the client.
-    Expects JSON with { row, col, move_type }.
-    Returns JSON with { valid, message, state }.
+    Expects JSON with { row, col, move_type, version }, where version is
+    the state version the client last saw.
+    Returns JSON with { valid, message, version, changes, elapsed_time,
+    is_complete }, where changes lists the [row, col, user, error] cells
+    that changed. The full state is added as "state" when the client asks
+    for it ({ full: true }). A move sent with an out-of-date version is not
+    applied: the answer is a 409, and the client fetches /state again.
     """
     data = request.get_json()
-    row = int(data.get("row", -1))
-    col = int(data.get("col", -1))
-    move_type = data.get("move_type", "queen")
+    cell = service.parse_move(data)
+    with current_game() as game:
+        result = service.move_result(
+            game.controller, data, service.move(game.controller, cell)
+        )
+    return jsonify(result)
 
-    valid, message = controller.update_move(row, col, move_type)
-    state = controller.get_game_state()
+@app.route("/moves", methods=["POST"])
+def moves():
+    """
+    Apply a batch of moves atomically, e.g. a drag-to-cross gesture.
+    Expects JSON with { moves: [{ row, col, move_type }, ...], version }.
+    Returns the same JSON as /move, with the changes of the whole batch;
+    an invalid move rejects the batch with a 400 and changes nothing.
+    """
+    data = request.get_json()
+    batch = service.parse_moves(data)
+    with current_game() as game:
+        result = service.move_result(
+            game.controller, data, service.moves(game.controller, batch)
+        )
+    return jsonify(result)
 
-    return jsonify({
-        "valid": valid,
-        "message": message,
-        "state": state
-    })
+@app.route("/hint", methods=["GET"])
+def hint():
+    """
+    Next logical step for the current board: { hint: { rule, action,
+    cells, reason } }, or { hint: null } when there is nothing to add.
+    Read-only; the client decides whether to apply it.
+    """
+    with current_game() as game:
+        return jsonify({ "hint": game.controller.get_hint() })
+
+@app.route("/auto_cross", methods=["POST"])
+def auto_cross():
+    """
+    Cross every empty cell the rules already rule out, as one batch.
+    Expects JSON with { version } and returns the same JSON as /moves.
+    Without a body (or a version) the crosses go on the current board.
+    """
+    data = request.get_json(silent=True) or {}
+    with current_game() as game:
+        result = service.move_result(
+            game.controller, data, game.controller.auto_cross
+        )
+    return jsonify(result)
+
+@app.route("/state", methods=["GET"])
+def state():
+    """
+    Full game state, for clients that need to resync.
+    """
+    with current_game() as game:
+        return jsonify(service.state(game.controller))
 
 @app.route("/get_time", methods=["GET"])
 def get_time():
     """
-    New endpoint to get the current elapsed time.
-    This helps with keeping the timer synchronized.
+    Current elapsed time, plus the game start and server clock (epoch
+    seconds). The page itself no longer polls this: it gets started_at
+    and server_time with the game state and runs the timer locally.
     """
-    return jsonify({
-        "elapsed_time": controller.get_elapsed_time()
-    })
+    with current_game() as game:
+        return jsonify(service.elapsed(game.controller))
 
 @app.route("/reset", methods=["POST"])
 def reset():
-    global controller
-    data = request.get_json()
-    new_size = int(data.get("board_size", controller.board_size))
-    
-    # Validate board size
-    if new_size < 4 or new_size > 15:
-        return jsonify({
-            "error": "Invalid board size. Must be between 4 and 15."
-        }), 400
-        
-    controller = GameController(board_size=new_size)
-    return jsonify({ "state": controller.get_game_state() })
+    """
+    Start a new game. Expects JSON with either { board_size, difficulty }
+    for a fresh random puzzle, or { puzzle_id } to play a specific puzzle,
+    where puzzle_id is one returned in a game state (to replay or share it)
+    or "daily" for the puzzle of the day at board_size. Seeded puzzles are
+    memoized, so everyone asking for the same ID shares one generation;
+    a client opening many large ones is rate limited (429).
+    The optional difficulty is one of difficulty.BANDS.
+    """
+    controller = service.reset_controller(request.get_json(), request.remote_addr)
+    with current_game(lambda: controller) as game:
+        game.controller = controller
+        state = controller.get_game_state()
+    return jsonify({ "state": state })
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=7860)
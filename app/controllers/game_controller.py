@@ -1,26 +1,100 @@
 # app/controllers/game_controller.py
 
+import random
 import time
-from app.models import queens, coloring
+from app.models import coloring, difficulty, hints, puzzle
+from app.models.board import Board, CELL_VALUES, CROSS, EMPTY, QUEEN
+from app.models.conflicts import ConflictIndex
+from app.utils import metrics
+
+SCAN_SECONDS = metrics.histogram(
+    "game_scan_errors_seconds", "Time to rebuild the conflict index from scratch.")
 
 class GameController:
-    def __init__(self, board_size):
+    # Cell changes not yet saved, as (row, col, old state, new state), or
+    # None when nothing journals them; a journaling session store sets it
+    # to a list and drains it after every checkout (see session_store)
+    journal = None
+
+    def __init__(self, board_size, unique=True, game=None, seed=None, puzzle_id=None):
         self.board_size = board_size
-        self.start_game()
+        # unique: generate regions whose only solution is the queen layout
+        self.unique = unique
+        self.start_game(game, seed, puzzle_id)
         
-    def start_game(self):
-        # 1) solution & colored
-        self.solution_queen_board = queens.generate_random_board(self.board_size)
-        self.colored_board, _     = coloring.color_board(
-            self.solution_queen_board, self.board_size
+    @classmethod
+    def from_catalog(cls, catalog, index):
+        """Start a game on record `index` of a catalog.Catalog."""
+        controller = cls(
+            catalog.size, unique=catalog.header.unique,
+            game=catalog[index], puzzle_id=catalog.puzzle_id(index),
         )
-        # 2) user board: '' / 'X' / 'Q'
-        n = self.board_size
-        self.user_board  = [['' for _ in range(n)] for __ in range(n)]
-        self.error_board = [[False for _ in range(n)] for __ in range(n)]
-        # 3) timer
+        band = catalog.band(index)
+        if band is not None:
+            controller.difficulty = difficulty.BANDS[band]
+        return controller
+
+    def start_game(self, game=None, seed=None, puzzle_id=None):
+        # 1) solution & regions
+        #    (game: a ready puzzle.Puzzle, e.g. from the puzzle pool or a
+        #     catalog, with its puzzle_id if it has one;
+        #     seed: an int gives the memoized puzzle of that ID, always
+        #     unique, and a random.Random is drawn from as is; without
+        #     either, a seed is drawn so that a unique puzzle has an ID too)
+        self.puzzle_id = puzzle_id
+        self.difficulty = None   # band name, set by whoever graded the puzzle
+        if game is None or game.size != self.board_size:
+            self.puzzle_id = None
+            if isinstance(seed, random.Random):
+                game = puzzle.generate_puzzle(
+                    self.board_size, unique=self.unique, rng=seed
+                )
+            elif seed is None:
+                seed = random.getrandbits(64)
+                game = puzzle.generate_puzzle(
+                    self.board_size, unique=self.unique, rng=seed
+                )
+                if self.unique:
+                    self.puzzle_id = puzzle.puzzle_id(self.board_size, seed)
+            else:
+                self.puzzle_id = puzzle.puzzle_id(self.board_size, seed)
+                game = puzzle.puzzle_from_id(self.puzzle_id)
+        self.solution_queen_board = bytes(game.queen_board)
+        # 2) user board: a state byte per cell, the region bytes of the
+        #    puzzle and an error bitset, plus the conflicts between queens
+        self.board = Board(self.board_size, game.regions)
+        self.conflicts = ConflictIndex(self.board)
+        self.correct_queens = 0   # queens placed on their solution cell
+        # 3) change tracking: version bumps on every change, and the cells
+        #    changed since the last pop_changes() are sent to the client
+        self.version = 0
+        self.changed_cells = set()
+        # 4) timer
         self.start_time = time.time()
 
+    # Nested-list views of the board, built on demand for rendering
+    @property
+    def user_board(self):
+        """N x N matrix of '' / 'X' / 'Q'."""
+        return self.board.user_rows()
+
+    @property
+    def error_board(self):
+        """N x N matrix of booleans, True on queens in conflict."""
+        return self.board.error_rows()
+
+    @property
+    def region_board(self):
+        """N x N matrix of region indices."""
+        return self.board.region_rows()
+
+    @property
+    def colored_board(self):
+        """N x N matrix of RGB tuples (the palette is applied here only)."""
+        return self.board.colored_rows(
+            coloring.seed_colors(self.board.regions, self.board_size)
+        )
+
     def get_elapsed_time(self):
         elapsed = time.time() - self.start_time
         m, s = divmod(int(elapsed), 60)
@@ -28,96 +102,265 @@ class GameController:
 
     def scan_errors(self):
         """
-        Recompute error_board by flagging every pair of queens
-        that conflict by:
+        Rebuild the conflict index from scratch, flagging every queen
+        that conflicts with another by:
          - distance‑1 (orthogonal or diagonal)
          - same row or column
-         - same colored_cell in colored_board
+         - same region in region_board
+        update_move keeps it up to date incrementally; this is only
+        needed if the board cells were changed directly.
         """
         n = self.board_size
-        self.error_board = [[False]*n for _ in range(n)]
-        # collect queen positions
-        queens_pos = [
-            (r,c)
-            for r in range(n) for c in range(n)
-            if self.user_board[r][c] == 'Q'
-        ]
-        def mark(a,b):
-            (r1,c1),(r2,c2) = a,b
-            self.error_board[r1][c1] = True
-            self.error_board[r2][c2] = True
-
-        for i in range(len(queens_pos)):
-            for j in range(i+1, len(queens_pos)):
-                r1,c1 = queens_pos[i]
-                r2,c2 = queens_pos[j]
-                # distance‑1
-                if max(abs(r1-r2), abs(c1-c2)) == 1:
-                    mark((r1,c1),(r2,c2))
-                # same row/col
-                if r1==r2 or c1==c2:
-                    mark((r1,c1),(r2,c2))
-                # same solution color
-                if self.colored_board[r1][c1] == self.colored_board[r2][c2]:
-                    mark((r1,c1),(r2,c2))
+        with SCAN_SECONDS.time(size=n):
+            self.board.errors = 0
+            self.conflicts = ConflictIndex(self.board)
+            self.correct_queens = 0
+            for r in range(n):
+                for c in range(n):
+                    if self.board.state(r, c) == QUEEN:
+                        self.conflicts.add_queen(r, c)
+                        if self.solution_queen_board[r] == c:
+                            self.correct_queens += 1
+
+    # board cell state set by each move type
+    MOVE_STATES = {"cross": CROSS, "queen": QUEEN, "clear": EMPTY}
+
+    def set_cell(self, row, col, move_type):
+        """
+        Write the state of a move into the board (an unknown move type
+        leaves the cell as it is). Returns the new cell state.
+        """
+        current = self.board.state(row, col)
+        new = self.MOVE_STATES.get(move_type, current)
+        if new != current:
+            self.board.set_state(row, col, new)
+            self.changed_cells.add((row, col))
+            if self.journal is not None:
+                self.journal.append((row, col, current, new))
+        return new
+
+    def replay(self, changes, version):
+        """
+        Reapply journaled cell changes ((row, col, old, new), oldest first)
+        on top of this game, e.g. one rebuilt from a snapshot, then rebuild
+        the conflicts and take the version the journal was saved at.
+        """
+        for row, col, _, new in changes:
+            self.board.set_state(row, col, new)
+        self.scan_errors()
+        self.version = version
+
+    def check_queen(self, row, col):
+        """Hint message for a queen at (row, col): empty if it is correct."""
+        # check if that placement is the correct column
+        correct = self.solution_queen_board[row]
+        if col != correct:
+            return "Incorrect queen position."
+        return ""
+
+    def update_conflicts(self, row, col, was_queen):
+        """
+        Update the conflict index and the correct queen count after the
+        cell at (row, col) changed; crosses cannot conflict, so only a
+        queen appearing or disappearing matters.
+        """
+        is_queen = self.board.state(row, col) == QUEEN
+        is_correct = self.solution_queen_board[row] == col
+        if was_queen and not is_queen:
+            self.changed_cells.update(self.conflicts.remove_queen(row, col))
+            self.correct_queens -= is_correct
+        elif is_queen and not was_queen:
+            self.changed_cells.update(self.conflicts.add_queen(row, col))
+            self.correct_queens += is_correct
 
     def update_move(self, row, col, move_type):
         """
-        1) cycle cell state:
-           '' -> 'X' -> 'Q' -> ''
-        2) after any change, re‑scan all errors
+        1) set the cell to the state of `move_type` in MOVE_STATES
+           ('cross' -> 'X', 'queen' -> 'Q', 'clear' -> ''); an unknown
+           move type leaves it as it is
+        2) when a queen is placed or removed, update the flags
+           of the queens it shares a line or region with or touches
         Returns (always valid=True, optional message)
         """
-        current = self.user_board[row][col]
-        # determine new state
-        if move_type == "cross":
-            new = 'X'
-        elif move_type == "queen":
-            new = 'Q'
-        elif move_type == "clear":
-            new = ''
-        else:
-            new = current
-
-        self.user_board[row][col] = new
+        current = self.board.state(row, col)
+        new = self.set_cell(row, col, move_type)
 
         # optional hint only when placing a queen
         message = ""
-        if new == 'Q':
-            # check if that placement is the correct column
-            correct = self.solution_queen_board[row]
-            if col != correct:
-                message = "Incorrect queen position."
+        if new == QUEEN:
+            message = self.check_queen(row, col)
 
-        # recompute all errors
-        self.scan_errors()
+        self.update_conflicts(row, col, current == QUEEN)
+
+        if new != current:
+            self.version += 1
+        return True, message
+
+    def apply_moves(self, moves):
+        """
+        Apply an ordered list of (row, col, move_type) moves as one change.
+        All moves are checked before any is applied, so an invalid move
+        leaves the board untouched. Conflicts are updated once at the end,
+        for the cells whose queen actually appeared or disappeared.
+        Returns (always valid=True, optional message); raises ValueError
+        for a cell outside the board or an unknown move type.
+        """
+        n = self.board_size
+        for row, col, move_type in moves:
+            if not (0 <= row < n and 0 <= col < n):
+                raise ValueError(f"Cell ({row}, {col}) is outside the board.")
+            if move_type not in self.MOVE_STATES:
+                raise ValueError(f"Unknown move type: {move_type!r}.")
 
+        before = {}
+        for row, col, move_type in moves:
+            before.setdefault((row, col), self.board.state(row, col))
+            self.set_cell(row, col, move_type)
+        for cell, current in before.items():
+            if self.board.state(*cell) == current:
+                self.changed_cells.discard(cell)
+
+        message = ""
+        changed = False
+        for (row, col), current in before.items():
+            self.update_conflicts(row, col, current == QUEEN)
+            new = self.board.state(row, col)
+            changed = changed or new != current
+            if new == QUEEN and current != QUEEN:
+                message = self.check_queen(row, col) or message
+
+        if changed:
+            self.version += 1
         return True, message
 
+    def correct_queen_cells(self):
+        """
+        Flat indices of the queens on their solution cell, and the first
+        (row, col) of a queen that is not, or None.
+        """
+        n = self.board_size
+        correct, wrong = [], None
+        for index, state in enumerate(self.board.cells):
+            if state == QUEEN:
+                r, c = divmod(index, n)
+                if self.solution_queen_board[r] == c:
+                    correct.append(index)
+                elif wrong is None:
+                    wrong = (r, c)
+        return correct, wrong
+
+    def get_hint(self):
+        """
+        The next logical step for the player (see hints.deductions), as a
+        dict with rule, action ('cross' / 'queen' / 'clear'), the [row, col]
+        cells to change and a reason; None once every queen is placed.
+        A misplaced queen or a cross on a solution cell is pointed out
+        first, and a solution queen is revealed when no rule applies.
+        """
+        correct, wrong = self.correct_queen_cells()
+        if wrong is not None:
+            return {
+                "rule": "wrong_queen", "action": "clear", "cells": [list(wrong)],
+                "reason": "This queen is not part of the solution."
+            }
+        for r, c in enumerate(self.solution_queen_board):
+            if self.board.state(r, c) == CROSS:
+                return {
+                    "rule": "wrong_cross", "action": "clear", "cells": [[r, c]],
+                    "reason": "This cell is not ruled out: it holds a queen."
+                }
+
+        wanted = {"cross": CROSS, "queen": QUEEN}
+        for step in hints.deductions(self.board.regions, self.board_size, correct):
+            cells = [
+                [r, c] for r, c in step.cells
+                if self.board.state(r, c) != wanted[step.action]
+            ]
+            if cells:
+                return {
+                    "rule": step.rule, "action": step.action,
+                    "cells": cells, "reason": step.reason
+                }
+        # The rules are stuck: reveal the queen of the first empty row
+        for r, c in enumerate(self.solution_queen_board):
+            if self.board.state(r, c) != QUEEN:
+                return {
+                    "rule": "reveal", "action": "queen", "cells": [[r, c]],
+                    "reason": "No simple rule applies here; this queen is part of the solution."
+                }
+        return None
+
+    def auto_cross(self):
+        """
+        Cross every empty cell that the correctly placed queens and the
+        rules in hints.deductions rule out, as one change (see apply_moves).
+        """
+        correct, _ = self.correct_queen_cells()
+        crosses, _ = hints.forced_crosses(
+            self.board.regions, self.board_size, correct
+        )
+        return self.apply_moves([
+            (r, c, "cross") for r, c in crosses
+            if self.board.state(r, c) == EMPTY
+        ])
+
+    def pop_changes(self):
+        """
+        Cells changed since the last call, as [row, col, user, error]
+        lists (user is '' / 'X' / 'Q', error a boolean).
+        """
+        changes = [
+            [r, c, CELL_VALUES[self.board.state(r, c)], self.board.has_error(r, c)]
+            for r, c in sorted(self.changed_cells)
+        ]
+        self.changed_cells.clear()
+        return changes
+
     def is_game_complete(self):
         """
         True if every row has a queen in the correct column
-        and there are no errors flagged.
-        """
-        # all rows correct?
-        for r,correct_col in enumerate(self.solution_queen_board):
-            if self.user_board[r][correct_col] != 'Q':
-                return False
-        # no errors?
-        for row in self.error_board:
-            if any(row):
-                return False
-        return True
+        and there are no errors flagged (answered from counters).
+        """
+        return (
+            self.correct_queens == self.board_size
+            and self.conflicts.error_count == 0
+        )
 
     def get_game_state(self):
+        """
+        Full state, sent once per game and on resync. Colors are sent as
+        the region index of every cell and the palette index of each region
+        (region_colors); the palettes themselves are a static file
+        (js/palettes.js, see GameService.palettes_script).
+        """
+        return {
+            "version":         self.version,
+            "board_size":      self.board_size,
+            "puzzle_id":       self.puzzle_id,
+            "difficulty":      self.difficulty,
+            "user_board":      self.board.user_rows(),
+            "error_board":     self.board.error_rows(),
+            "regions":         self.board.region_rows(),
+            "region_colors":   list(coloring.region_colors(self.board.regions, self.board_size)),
+            "elapsed_time":    self.get_elapsed_time(),
+            "started_at":      self.start_time,
+            "server_time":     time.time(),
+            "is_complete":     self.is_game_complete()
+        }
+
+    def get_move_result(self):
+        """
+        What changed since the last call: the changed cells,
+        the state version and the completion flag.
+        """
         return {
-            "user_board":      self.user_board,
-            "error_board":     self.error_board,
-            "colored_board":   self.colored_board,
+            "version":         self.version,
+            "changes":         self.pop_changes(),
             "elapsed_time":    self.get_elapsed_time(),
+            "server_time":     time.time(),
             "is_complete":     self.is_game_complete()
         }
 
-    def reset_game(self, board_size):
+    def reset_game(self, board_size, seed=None):
         self.board_size = board_size
-        self.start_game()
+        self.start_game(seed=seed)
@@ -0,0 +1,444 @@
+# app/controllers/game_service.py
+
+import datetime
+import json
+import os
+import time
+import unittest
+import uuid
+from contextlib import contextmanager
+
+from app.controllers.game_controller import GameController
+from app.controllers.puzzle_pool import PuzzlePool
+from app.controllers.session_store import SessionConflict, store_from_url
+from app.models import catalog, coloring, difficulty, puzzle
+from app.utils.rate_limit import RateLimiter
+
+SESSION_COOKIE = "queens_session"
+DEFAULT_BOARD_SIZE = 8
+MIN_BOARD_SIZE, MAX_BOARD_SIZE = 4, 15
+# Regenerating the puzzle of an ID costs tens of milliseconds at most up to
+# this board size, but up to a second at 15 x 15. Larger IDs that are not in
+# a catalog nor one of the last DAILY_DAYS daily puzzles are generated at
+# most ID_GENERATIONS_PER_MINUTE times a minute per client (after a burst
+# of ID_GENERATION_BURST), so made-up IDs cannot tie up the workers
+GENERATED_ID_MAX_SIZE = 10
+DAILY_DAYS = 7
+ID_GENERATIONS_PER_MINUTE = 10
+ID_GENERATION_BURST = 5
+
+
+def recent_daily_seeds():
+    """Seeds of the daily puzzles of the last DAILY_DAYS days (UTC)."""
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    return {
+        puzzle.daily_seed(today - datetime.timedelta(days=days))
+        for days in range(DAILY_DAYS)
+    }
+
+
+class ApiError(Exception):
+    """A request the API rejects; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class GameService:
+    """
+    The game API without a web framework: where games come from, where the
+    game of each session is kept, and what every route does with the JSON
+    it receives. app.py (Flask) and asgi.py (Quart) only parse requests,
+    check out the session's game and wrap these results into responses.
+
+    Handlers take the parsed JSON body and return the JSON payload, raising
+    ApiError for a bad request.
+    """
+
+    def __init__(self, store, pool, catalogs=None):
+        self.store = store
+        self.pool = pool
+        self.catalogs = catalogs or {}
+        self.id_generations = RateLimiter(
+            ID_GENERATIONS_PER_MINUTE / 60, ID_GENERATION_BURST
+        )
+
+    @classmethod
+    def from_env(cls, instance_path):
+        """
+        Build the service from the environment:
+          PUZZLE_POOL_LOW_WATER, PUZZLE_POOL_PATH, PUZZLE_POOL_PROCESSES
+              the background-filled puzzle pool, saved under instance_path
+          GAME_STORE=memory | sqlite:<path> | journal:<directory>
+              where games are kept (sqlite is shared by every worker,
+              journal is memory that survives a restart)
+          PUZZLE_CATALOG_DIR
+              memory-mapped catalog_<N>.bin files to draw games from
+        """
+        os.makedirs(instance_path, exist_ok=True)
+        pool = PuzzlePool(
+            sizes=range(MIN_BOARD_SIZE, MAX_BOARD_SIZE + 1),
+            low_water=int(os.environ.get("PUZZLE_POOL_LOW_WATER", 4)),
+            path=os.environ.get(
+                "PUZZLE_POOL_PATH", os.path.join(instance_path, "puzzle_pool.bin")
+            ),
+            processes=int(os.environ.get("PUZZLE_POOL_PROCESSES", 0)),
+        )
+        store = store_from_url(os.environ.get("GAME_STORE", "memory"))
+        catalog_dir = os.environ.get("PUZZLE_CATALOG_DIR")
+        catalogs = (
+            catalog.open_catalogs(catalog_dir, len(difficulty.BANDS))
+            if catalog_dir else {}
+        )
+        return cls(store, pool, catalogs)
+
+    def load_pool(self):
+        """Load and grade the saved puzzle pool now (in the master, before forking)."""
+        if self.pool.path:
+            self.pool.load()
+
+    def start(self, worker=None):
+        """
+        Start the puzzle pool. A forked worker passes its preload.WorkerSlot
+        and keeps its share of the pool loaded before the fork.
+        """
+        if worker is not None:
+            self.pool.share(worker.index, worker.count, worker.first)
+        self.pool.start()
+
+    def stop(self):
+        self.pool.stop()
+        self.store.close()
+
+    # ----- Sessions -----
+
+    @staticmethod
+    def session_id(cookie):
+        """
+        The session id of a request from its cookie value.
+
+        Returns:
+            tuple: (session id, True if it is new and must be set as a cookie)
+        """
+        if cookie and len(cookie) == 32 and cookie.isalnum():
+            return cookie, False
+        return uuid.uuid4().hex, True
+
+    @contextmanager
+    def session(self, session_id, create=None):
+        """
+        Check out the game of a session (see session_store). A checkout
+        whose changes lost a race with another worker's raises ApiError 409:
+        the client was answered nothing yet and must resync from /state.
+        """
+        try:
+            with self.store.session(session_id, create or self.new_game) as game:
+                yield game
+        except SessionConflict:
+            raise ApiError(
+                "The game was changed by another request. Reloading it.", 409
+            ) from None
+
+    # ----- New games -----
+
+    def ready_game(self, board_size, band=None):
+        """
+        A puzzle that needs no generation: a random catalog record, or else
+        a ready puzzle from the pool. With a difficulty band, one of that
+        band when a graded catalog or the pool has one, and any otherwise.
+
+        Returns:
+            tuple: (Puzzle, band name, puzzle ID), or (None, None, None).
+        """
+        library = self.catalogs.get(board_size)
+        if library is not None:
+            index = None
+            if band is not None:
+                index = library.random_index(band=difficulty.band_index(band))
+            if index is None:
+                index = library.random_index()
+            found = library.band(index)
+            return (
+                library[index],
+                difficulty.BANDS[found] if found is not None else None,
+                library.puzzle_id(index),
+            )
+        game, game_band, puzzle_id = self.pool.take(board_size, band)
+        if game is None and band is not None:
+            game, game_band, puzzle_id = self.pool.take(board_size)
+        return game, game_band, puzzle_id
+
+    def start_controller(self, board_size, game, band=None, puzzle_id=None):
+        """A GameController on a given puzzle (generated if game is None)."""
+        controller = GameController(board_size, game=game, puzzle_id=puzzle_id)
+        controller.difficulty = band
+        return controller
+
+    def new_game(self, board_size=DEFAULT_BOARD_SIZE, band=None):
+        """Start a game on a ready puzzle, generating one only if there is none."""
+        return self.start_controller(board_size, *self.ready_game(board_size, band))
+
+    def seeded_game(self, board_size, seed, client=None):
+        """
+        The puzzle of a client-chosen puzzle ID: its catalog record when a
+        catalog holds it, or else None to generate it (memoized, see
+        puzzle.puzzle_from_id). Every valid ID is served, but a client
+        generating large boards is rate limited (see ID_GENERATIONS_PER_MINUTE).
+
+        Args:
+            client (str): Who asks (e.g. the remote address), for the rate limit.
+
+        Returns:
+            tuple: (Puzzle or None, band name, puzzle ID)
+
+        Raises:
+            ApiError: 429 when the client generated too many large boards.
+        """
+        puzzle_id = puzzle.puzzle_id(board_size, seed)
+        library = self.catalogs.get(board_size)
+        index = library.seed_index(seed) if library is not None else None
+        if index is not None:
+            found = library.band(index)
+            return (
+                library[index],
+                difficulty.BANDS[found] if found is not None else None,
+                puzzle_id,
+            )
+        if (board_size > GENERATED_ID_MAX_SIZE and seed not in recent_daily_seeds()
+                and not self.id_generations.allow(client)):
+            raise ApiError(
+                "Too many shared puzzles opened. Try again in a minute.", 429
+            )
+        return None, None, puzzle_id
+
+    def parse_reset(self, data):
+        """
+        Read a /reset request: { board_size, difficulty } for a fresh puzzle,
+        or { puzzle_id } for a given one ("daily" for the puzzle of the day).
+
+        Returns:
+            tuple: (board size, difficulty band or None, seed or None)
+        """
+        try:
+            board_size = int(data.get("board_size", DEFAULT_BOARD_SIZE))
+        except (TypeError, ValueError):
+            raise ApiError("Invalid board size.") from None
+        band = data.get("difficulty") or None
+        if band is not None and band not in difficulty.BANDS:
+            raise ApiError(
+                f"Invalid difficulty. Must be one of: {', '.join(difficulty.BANDS)}."
+            )
+        seed = None
+        puzzle_id = data.get("puzzle_id")
+        if puzzle_id == "daily":
+            seed = puzzle.daily_seed()
+        elif puzzle_id:
+            try:
+                board_size, seed = puzzle.parse_puzzle_id(puzzle_id)
+            except ValueError as e:
+                raise ApiError(str(e)) from None
+        if not MIN_BOARD_SIZE <= board_size <= MAX_BOARD_SIZE:
+            raise ApiError(
+                f"Invalid board size. Must be between {MIN_BOARD_SIZE} and {MAX_BOARD_SIZE}."
+            )
+        return board_size, band, seed
+
+    def reset_controller(self, data, client=None):
+        """The GameController a /reset request asks for (client: see seeded_game)."""
+        board_size, band, seed = self.parse_reset(data)
+        if seed is None:
+            return self.new_game(board_size, band)
+        game, game_band, puzzle_id = self.seeded_game(board_size, seed, client)
+        if game is None:
+            return GameController(board_size, seed=seed)
+        return self.start_controller(board_size, game, game_band, puzzle_id)
+
+    # ----- Moves -----
+
+    @staticmethod
+    def parse_move(data):
+        """Read a /move request: (row, col, move_type)."""
+        try:
+            return (
+                int(data.get("row", -1)), int(data.get("col", -1)),
+                data.get("move_type", "queen"),
+            )
+        except (TypeError, ValueError):
+            raise ApiError("Cell outside the board.") from None
+
+    @staticmethod
+    def parse_moves(data):
+        """Read a /moves request: the list of (row, col, move_type)."""
+        try:
+            return [
+                (int(m["row"]), int(m["col"]), m.get("move_type", "queen"))
+                for m in data.get("moves", [])
+            ]
+        except (KeyError, TypeError, ValueError):
+            raise ApiError("Each move needs a row and a col.") from None
+
+    @staticmethod
+    def move_result(controller, data, change):
+        """
+        Apply a change to the board and describe it: the JSON of /move,
+        with the full state added when the client asks for it ({ full:
+        true }). A change sent with an out-of-date version was decided on a
+        board the client no longer has, so it is not applied: ApiError 409
+        tells the client to fetch the state again. Without a version the
+        change applies to the current board.
+
+        Args:
+            change (callable): Applies the change, returns (valid, message).
+        """
+        if "version" in data and data["version"] != controller.version:
+            raise ApiError("The game changed since this move. Reloading it.", 409)
+        valid, message = change()
+        result = controller.get_move_result()
+        if data.get("full"):
+            result["state"] = controller.get_game_state()
+        result["valid"] = valid
+        result["message"] = message
+        return result
+
+    def move(self, controller, move):
+        row, col, move_type = move
+        n = controller.board_size
+        if not (0 <= row < n and 0 <= col < n):
+            raise ApiError("Cell outside the board.")
+        return lambda: controller.update_move(row, col, move_type)
+
+    def moves(self, controller, batch):
+        def change():
+            try:
+                return controller.apply_moves(batch)
+            except ValueError as e:
+                raise ApiError(str(e)) from None
+        return change
+
+    # ----- Read-only views -----
+
+    @staticmethod
+    def state_key(controller):
+        """
+        What the full state of a game depends on, apart from the clock: it
+        changes with every new game and every move (for page ETags).
+        """
+        return (
+            controller.board_size, controller.puzzle_id,
+            controller.start_time, controller.version,
+        )
+
+    @staticmethod
+    def state(controller):
+        controller.pop_changes()
+        return {"state": controller.get_game_state()}
+
+    @staticmethod
+    def palettes_script():
+        """
+        js/palettes.js: the region palette of every board size, served once
+        as a fingerprinted static file; game states only carry the palette
+        index of each region (region_colors).
+        """
+        palettes = {
+            N: coloring.region_palette(N) for N in range(MIN_BOARD_SIZE, MAX_BOARD_SIZE + 1)
+        }
+        return f"const PALETTES = {json.dumps(palettes, separators=(',', ':'))};\n".encode()
+
+    @staticmethod
+    def elapsed(controller):
+        return {
+            "elapsed_time": controller.get_elapsed_time(),
+            "started_at": controller.start_time,
+            "server_time": time.time()
+        }
+
+# --- Unit Tests ---
+
+class TestGameService(unittest.TestCase):
+    def make_service(self):
+        from app.controllers.session_store import MemorySessionStore
+        return GameService(MemorySessionStore(), PuzzlePool(sizes=[], low_water=0))
+
+    def test_reset_and_move(self):
+        """Test the handlers on a session kept in a memory store."""
+        service = self.make_service()
+        session_id, is_new = service.session_id(None)
+        self.assertTrue(is_new)
+        self.assertEqual(service.session_id(session_id), (session_id, False))
+
+        controller = service.reset_controller({"puzzle_id": "daily", "board_size": 6})
+        with service.session(session_id, lambda: controller) as game:
+            game.controller = controller
+        with service.session(session_id) as game:
+            row, col = 0, game.controller.solution_queen_board[0]
+            result = service.move_result(
+                game.controller, {"version": 0},
+                service.move(game.controller, service.parse_move({"row": row, "col": col})),
+            )
+        self.assertEqual(result["changes"], [[row, col, "Q", False]])
+        self.assertNotIn("state", result)
+        self.assertEqual(result["version"], 1)
+
+        # A move decided on an older board is rejected, not applied
+        with service.session(session_id) as game:
+            change = service.move(game.controller, (1, 0, "cross"))
+            with self.assertRaises(ApiError) as raised:
+                service.move_result(game.controller, {"version": 0}, change)
+            self.assertEqual(raised.exception.status, 409)
+            self.assertEqual(game.controller.version, 1)
+            result = service.move_result(game.controller, {"version": 1, "full": True}, change)
+            self.assertEqual(result["state"]["version"], 2)
+            # Without a version (e.g. /auto_cross with no body) the change
+            # applies to the current board
+            result = service.move_result(game.controller, {}, game.controller.auto_cross)
+            self.assertNotIn("state", result)
+            self.assertTrue(result["changes"])
+            self.assertEqual(result["version"], 3)
+
+        with service.session(session_id) as game:
+            with self.assertRaises(ApiError):
+                service.move(game.controller, (6, 0, "queen"))
+            change = service.moves(game.controller, [(0, 0, "explode")])
+            with self.assertRaises(ApiError):
+                service.move_result(game.controller, {"version": 1}, change)
+
+    def test_new_games_have_ids(self):
+        """Test that a game generated inline gets an ID that reproduces it."""
+        controller = self.make_service().new_game(6)
+        game = puzzle.puzzle_from_id(controller.puzzle_id)
+        self.assertEqual(bytes(game.queen_board), controller.solution_queen_board)
+        self.assertEqual(game.regions, bytes(controller.board.regions))
+
+    def test_parse_reset(self):
+        """Test that /reset requests are validated."""
+        service = self.make_service()
+        self.assertEqual(service.parse_reset({}), (DEFAULT_BOARD_SIZE, None, None))
+        self.assertEqual(
+            service.parse_reset({"puzzle_id": puzzle.puzzle_id(9, 5)}), (9, None, 5)
+        )
+        for data in ({"board_size": 3}, {"difficulty": "trivial"}, {"puzzle_id": "x"}):
+            with self.assertRaises(ApiError):
+                service.parse_reset(data)
+
+    def test_seeded_games(self):
+        """Test that every ID is served, large generated boards rate limited per client."""
+        service = self.make_service()
+        self.assertEqual(
+            service.seeded_game(8, 5), (None, None, puzzle.puzzle_id(8, 5))
+        )
+        for seed in range(ID_GENERATION_BURST):
+            self.assertEqual(
+                service.seeded_game(15, seed, "a"), (None, None, puzzle.puzzle_id(15, seed))
+            )
+        with self.assertRaises(ApiError) as raised:
+            service.seeded_game(15, 99, "a")
+        self.assertEqual(raised.exception.status, 429)
+        # Other clients, small boards and daily puzzles are not held back
+        self.assertIsNone(service.seeded_game(15, 99, "b")[0])
+        self.assertIsNone(service.seeded_game(8, 99, "a")[0])
+        self.assertIsNone(service.seeded_game(15, puzzle.daily_seed(), "a")[0])
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,119 @@
+# app/controllers/grade_catalog.py
+"""
+Grade the difficulty of every puzzle in a directory of catalogs.
+
+Records are graded with difficulty.grade_puzzle in a process pool (each
+worker maps the catalog itself, so only index ranges are sent to it) and
+the bands are written to a <catalog>.bands sidecar, which lets the server
+pick a puzzle of a given difficulty in O(1).
+
+Usage:
+    python -m app.controllers.grade_catalog [--dir catalogs] [--workers 4]
+"""
+
+import argparse
+import os
+import sys
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from app.models import catalog, difficulty
+
+# Catalogs opened by this (worker) process, by path
+_open_catalogs = {}
+
+
+def grade_chunk(path, start, stop):
+    """
+    Band index of records start..stop-1 of a catalog (runs in a worker).
+
+    Returns:
+        bytes: One band index per record.
+    """
+    cat = _open_catalogs.get(path)
+    if cat is None:
+        cat = _open_catalogs[path] = catalog.Catalog(path)
+    return bytes(
+        difficulty.band_index(difficulty.grade_puzzle(cat[i]).band)
+        for i in range(start, stop)
+    )
+
+
+def grade_catalog(path, executor=None, chunk_size=256):
+    """
+    Grade every record of a catalog and write its sidecar.
+
+    Returns:
+        list: Number of records in each band.
+    """
+    with catalog.Catalog(path) as cat:
+        count = len(cat)
+    chunks = [(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+    if executor is None:
+        results = [grade_chunk(path, start, stop) for start, stop in chunks]
+    else:
+        results = executor.map(
+            grade_chunk, [path] * len(chunks),
+            [start for start, _ in chunks], [stop for _, stop in chunks],
+        )
+    bands = b"".join(results)
+    catalog.write_bands(path, bands, len(difficulty.BANDS))
+    return [bands.count(band) for band in range(len(difficulty.BANDS))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dir", default="catalogs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (0 grades in this process)")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    executor = ProcessPoolExecutor(args.workers) if args.workers else None
+    try:
+        for name in sorted(os.listdir(args.dir)):
+            if not (name.startswith("catalog_") and name.endswith(".bin")):
+                continue
+            path = os.path.join(args.dir, name)
+            start = time.perf_counter()
+            counts = grade_catalog(path, executor, args.chunk_size)
+            elapsed = time.perf_counter() - start
+            summary = ", ".join(
+                f"{band} {count}" for band, count in zip(difficulty.BANDS, counts)
+            )
+            print(
+                f"{path}: {summary} ({sum(counts) / max(elapsed, 1e-9):.0f} puzzles/s)",
+                file=sys.stderr,
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return 0
+
+# --- Unit Tests ---
+
+class TestGradeCatalog(unittest.TestCase):
+    def test_grade_catalog(self):
+        """Test that grading writes a sidecar matching grade_puzzle."""
+        import tempfile
+        from app.models import puzzle
+        header = catalog.CatalogHeader(6, True, puzzle.GENERATOR_VERSION, 0)
+        games = [puzzle.generate_puzzle(6, rng=i) for i in range(6)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "catalog_6.bin")
+            f, _ = catalog.open_for_append(path, header)
+            with f:
+                for game in games:
+                    f.write(puzzle.encode_puzzle(game))
+            counts = grade_catalog(path, chunk_size=4)
+            self.assertEqual(sum(counts), 6)
+            _open_catalogs.pop(path).close()
+            with catalog.Catalog(path, len(difficulty.BANDS)) as cat:
+                self.assertTrue(cat.graded)
+                for i, game in enumerate(games):
+                    band = difficulty.grade_puzzle(game).band
+                    self.assertEqual(difficulty.BANDS[cat.band(i)], band)
+
+if __name__ == '__main__':
+    sys.exit(main())
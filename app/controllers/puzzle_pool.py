@@ -0,0 +1,369 @@
+# app/controllers/puzzle_pool.py
+
+import glob
+import os
+import random
+import struct
+import threading
+import time
+import unittest
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app.models import difficulty, puzzle
+
+# File header; bump the version if the record layout changes. The header
+# is followed by the generator version (a file of another one is dropped,
+# as its seeds no longer give its puzzles), then the records: the seed the
+# puzzle was generated from (SEED_FORMAT), then the puzzle.
+POOL_MAGIC = b"QPOOL3\n"
+SEED_FORMAT = struct.Struct(">Q")
+VERSION_FORMAT = struct.Struct(">H")
+
+# Generations spent looking for a requested difficulty band before giving
+# up on it (small boards may never reach the hardest bands).
+BAND_ATTEMPTS = 200
+
+
+def generate_graded(size, unique, seed):
+    """Generate the puzzle of a seed and its difficulty band (runs in the process pool)."""
+    game = puzzle.generate_puzzle(size, unique, rng=seed)
+    return game, difficulty.grade_puzzle(game).band
+
+
+class PuzzlePool:
+    """
+    Ready-made puzzles keyed by board size.
+
+    A background thread keeps every size topped up to `low_water` puzzles,
+    so /reset can pop one in O(1) instead of generating it inside the
+    request. With `processes` > 0 the generation itself runs in a process
+    pool, so it does not compete with request threads for the GIL.
+
+    When `path` is set, the pool is loaded from that file on start and saved
+    back to it after each refill and on stop, so a restarted worker starts
+    warm. Loading takes ownership of the file (it is removed), so two workers
+    booting from the same file do not hand out the same puzzles. Under a
+    forking server the pool is loaded once before the fork and each worker
+    keeps its share of it, saved to a file of its own (see share()).
+
+    Puzzles are generated from drawn 64-bit seeds, kept with them, so that
+    a unique puzzle handed out has a puzzle ID (see puzzle.puzzle_id).
+
+    Every puzzle is graded (see difficulty.grade_puzzle) as it is added, so
+    take() can hand out one of a given band. A band asked for but missing
+    is remembered, and the refill thread keeps generating that size (up to
+    `low_water` puzzles per band, replacing the most common band) until one
+    turns up or BAND_ATTEMPTS generations have failed.
+    """
+
+    def __init__(self, sizes=range(4, 16), low_water=4, path=None,
+                 processes=0, unique=True, save_interval=30.0):
+        self.sizes = list(sizes)
+        self.low_water = low_water
+        self.path = path
+        self.processes = processes
+        self.unique = unique
+        self.save_interval = save_interval
+        self._pools = {n: deque() for n in self.sizes}   # (puzzle, band, seed)
+        self._wanted = {}   # (size, band) asked for but missing -> attempts
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._dirty = False
+        self._last_save = 0.0
+        self._loaded = False
+
+    # ----- Public API -----
+
+    def start(self):
+        """Load the saved pool (if any, and not loaded yet) and start the refill thread."""
+        if self._thread is not None:
+            return
+        if self.path and not self._loaded:
+            self.load()
+        if self.processes:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes)
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._refill_loop, name="puzzle-pool", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop the refill thread and save the pool."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        if self.path:
+            self.save()
+
+    def share(self, index, count, first=True):
+        """
+        Make this process worker `index` of `count` sharing a pool loaded
+        before the fork: it keeps every count-th puzzle of each size, saves
+        to <path>.w<index>, and refills up to its share of `low_water` with
+        its share of `processes`. A worker forked again in the same slot
+        (first=False) drops the pre-fork puzzles, which its predecessor may
+        have handed out, and loads the file that predecessor saved instead.
+        """
+        with self._lock:
+            for size, pool in self._pools.items():
+                self._pools[size] = deque(list(pool)[index::count] if first else ())
+        self.low_water = -(-self.low_water // count)
+        self.processes = -(-self.processes // count)
+        if self.path:
+            self.path = f"{self.path}.w{index}"
+            if not first:
+                self.load()
+
+    def pop(self, size):
+        """
+        Take a ready puzzle of the given size.
+
+        Returns:
+            Puzzle: A puzzle, or None if the pool for that size is empty
+                    (the caller then generates one itself).
+        """
+        return self.take(size)[0]
+
+    def take(self, size, band=None):
+        """
+        Take a ready puzzle of the given size, and of the given difficulty
+        band if one is named.
+
+        Returns:
+            tuple: (Puzzle, band name, puzzle ID), or (None, None, None) if
+                   there is none (a missing band is then generated in the
+                   background). The ID is None in a pool of non-unique puzzles.
+        """
+        pool = self._pools.get(size)
+        if pool is None:
+            return None, None, None
+        with self._lock:
+            entry = None
+            for candidate in pool:
+                if band is None or candidate[1] == band:
+                    entry = candidate
+                    break
+            if entry is not None:
+                pool.remove(entry)
+                self._dirty = True   # a saved copy would hand it out again
+            elif band is not None:
+                self._wanted.setdefault((size, band), 0)
+        if entry is None or len(pool) < self.low_water:
+            self._wakeup.set()
+        if entry is None:
+            return None, None, None
+        game, band, seed = entry
+        return game, band, puzzle.puzzle_id(size, seed) if self.unique else None
+
+    def counts(self):
+        """Number of ready puzzles per board size."""
+        return {n: len(pool) for n, pool in self._pools.items()}
+
+    def band_counts(self, size):
+        """Number of ready puzzles of a size in each difficulty band."""
+        with self._lock:
+            bands = [band for _, band, _ in self._pools.get(size, ())]
+        return {band: bands.count(band) for band in difficulty.BANDS}
+
+    # ----- Persistence -----
+
+    def save(self):
+        """Write every ready puzzle to `path` (atomically, via a temp file)."""
+        with self._lock:
+            games = [(game, seed) for pool in self._pools.values() for game, _, seed in pool]
+            self._dirty = False
+            self._last_save = time.monotonic()
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(POOL_MAGIC + VERSION_FORMAT.pack(puzzle.GENERATOR_VERSION))
+            for game, seed in games:
+                f.write(SEED_FORMAT.pack(seed) + puzzle.encode_puzzle(game))
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        """
+        Add the puzzles saved in `path`, and in the <path>.w<index> files of
+        workers sharing it (see share()), to the pool and remove the files.
+
+        Returns:
+            int: Number of puzzles loaded.
+        """
+        self._loaded = True
+        shards = [
+            name for name in glob.glob(glob.escape(self.path) + ".w*")
+            if name[len(self.path) + 2:].isdigit()
+        ]
+        loaded = sum(self._load_file(path) for path in [self.path] + sorted(shards))
+        self._dirty = loaded > 0
+        return loaded
+
+    def _load_file(self, path):
+        claimed = f"{path}.{os.getpid()}.loading"
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            return 0
+        with open(claimed, "rb") as f:
+            data = f.read()
+        os.remove(claimed)
+        header = POOL_MAGIC + VERSION_FORMAT.pack(puzzle.GENERATOR_VERSION)
+        if not data.startswith(header):
+            return 0
+
+        loaded = 0
+        offset = len(header)
+        while offset < len(data):
+            try:
+                seed, = SEED_FORMAT.unpack_from(data, offset)
+                game = puzzle.decode_puzzle(data, offset + SEED_FORMAT.size)
+            except (IndexError, ValueError, struct.error):
+                break  # truncated tail
+            offset += SEED_FORMAT.size + puzzle.record_size(game.size)
+            if game.size in self._pools:
+                band = difficulty.grade_puzzle(game).band
+                self._pools[game.size].append((game, band, seed))
+                loaded += 1
+        return loaded
+
+    # ----- Background refill -----
+
+    def _neediest_size(self):
+        """
+        Size with the fewest ready puzzles, or else the size of a band
+        asked for but missing, or None if all are topped up.
+        """
+        size = min(self.sizes, key=lambda n: len(self._pools[n]), default=None)
+        if size is not None and len(self._pools[size]) < self.low_water:
+            return size
+        with self._lock:
+            for size, band in list(self._wanted):
+                self._wanted[size, band] += 1
+                if self._wanted[size, band] > BAND_ATTEMPTS:
+                    del self._wanted[size, band]
+                else:
+                    return size
+        return None
+
+    def _generate(self, size, seed):
+        if self._executor is not None:
+            return self._executor.submit(
+                generate_graded, size, self.unique, seed
+            ).result()
+        return generate_graded(size, self.unique, seed)
+
+    def _add(self, size, game, band, seed):
+        """Add a graded puzzle; beyond low_water per band, drop the most common band."""
+        pool = self._pools[size]
+        self._wanted.pop((size, band), None)
+        pool.append((game, band, seed))
+        if len(pool) > self.low_water * len(difficulty.BANDS):
+            bands = [b for _, b, _ in pool]
+            common = max(difficulty.BANDS, key=bands.count)
+            pool.remove(next(entry for entry in pool if entry[1] == common))
+
+    def _refill_loop(self):
+        while not self._stopped.is_set():
+            size = self._neediest_size()
+            if size is None:
+                if self.path and self._dirty:
+                    self.save()
+                self._wakeup.wait(timeout=self.save_interval)
+                self._wakeup.clear()
+                continue
+            seed = random.getrandbits(64)
+            game, band = self._generate(size, seed)
+            with self._lock:
+                self._add(size, game, band, seed)
+                self._dirty = True
+            if self.path and time.monotonic() - self._last_save > self.save_interval:
+                self.save()
+
+# --- Unit Tests ---
+
+class TestPuzzlePool(unittest.TestCase):
+    def test_refill_and_persist(self):
+        """Test that the pool refills in the background and survives a restart."""
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "pool.bin")
+            pool = PuzzlePool(sizes=[4, 5], low_water=2, path=path)
+            pool.start()
+            deadline = time.monotonic() + 10
+            while pool.counts() != {4: 2, 5: 2} and time.monotonic() < deadline:
+                time.sleep(0.01)
+            pool.stop()
+            self.assertEqual(pool.counts(), {4: 2, 5: 2})
+
+            restarted = PuzzlePool(sizes=[4, 5], low_water=2, path=path)
+            self.assertEqual(restarted.load(), 4)
+            self.assertFalse(os.path.exists(path))
+            game, _, puzzle_id = restarted.take(5)
+            self.assertEqual(game.size, 5)
+            # The seed was saved with the puzzle: its ID gives the same puzzle
+            self.assertEqual(puzzle.puzzle_from_id(puzzle_id), game)
+            self.assertEqual(restarted.counts(), {4: 2, 5: 1})
+            self.assertIsNone(restarted.pop(9))
+            # Taking a puzzle marks the pool for saving, so it is not handed out twice
+            restarted._dirty = False
+            restarted.take(4)
+            self.assertTrue(restarted._dirty)
+
+    def test_share(self):
+        """Test that workers split a pool loaded before the fork and save it apart."""
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "pool.bin")
+            saved = PuzzlePool(sizes=[4], low_water=3, path=path)
+            for seed in range(5):
+                saved._add(4, *generate_graded(4, True, seed), seed)
+            saved.save()
+            master = PuzzlePool(sizes=[4], low_water=3, path=path)
+            self.assertEqual(master.load(), 5)
+
+            workers = []
+            for index in range(2):
+                worker = PuzzlePool(sizes=[4], low_water=3, path=path)
+                worker._pools = {4: deque(master._pools[4])}
+                worker.share(index, 2)
+                workers.append(worker)
+            self.assertEqual([w.counts()[4] for w in workers], [3, 2])
+            self.assertEqual(workers[1].path, path + ".w1")
+            self.assertEqual(workers[1].low_water, 2)
+            for worker in workers:
+                worker.save()
+
+            # A worker forked again in slot 1 takes over its predecessor's file
+            respawned = PuzzlePool(sizes=[4], low_water=3, path=path)
+            respawned._pools = {4: deque(master._pools[4])}
+            respawned.share(1, 2, first=False)
+            self.assertEqual(respawned.counts()[4], 2)
+            # and the next master loads the files of every worker
+            self.assertEqual(PuzzlePool(sizes=[4], path=path).load(), 3)
+
+    def test_take_band(self):
+        """Test that a missing band is generated in the background."""
+        pool = PuzzlePool(sizes=[8], low_water=1)
+        pool.start()
+        try:
+            deadline = time.monotonic() + 30
+            game, band = None, None
+            while game is None and time.monotonic() < deadline:
+                game, band, _ = pool.take(8, "medium")
+                time.sleep(0.01)
+        finally:
+            pool.stop()
+        self.assertEqual(band, "medium")
+        self.assertEqual(difficulty.grade_puzzle(game).band, "medium")
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,605 @@
+# app/controllers/session_store.py
+
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+import unittest
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class SessionConflict(Exception):
+    """
+    Raised on leaving a checkout whose changes could not be saved, because
+    another checkout (in another worker) saved the session first.
+    """
+
+
+class GameSession:
+    """
+    The game of one session while it is checked out of a store.
+    Replace `controller` to start a new game; the store saves it on exit.
+    """
+    __slots__ = ("session_id", "controller")
+
+    def __init__(self, session_id, controller):
+        self.session_id = session_id
+        self.controller = controller
+
+
+class SessionLocks:
+    """One lock per session id, dropped once no thread holds a reference."""
+
+    def __init__(self):
+        self._locks = weakref.WeakValueDictionary()
+        self._guard = threading.Lock()
+
+    def get(self, session_id):
+        with self._guard:
+            lock = self._locks.get(session_id)
+            if lock is None:
+                lock = threading.Lock()
+                self._locks[session_id] = lock
+            return lock
+
+
+class MemorySessionStore:
+    """
+    In-process LRU of GameControllers with TTL eviction.
+
+    Fast, but every gunicorn worker has its own copy, so use it only with a
+    single worker (threads are fine).
+    """
+
+    def __init__(self, max_sessions=10000, ttl=6 * 3600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._games = OrderedDict()   # session id -> (last access, controller)
+        self._guard = threading.Lock()
+        self._locks = SessionLocks()
+
+    @contextmanager
+    def session(self, session_id, create):
+        """
+        Check out the game of a session, holding its lock.
+
+        Args:
+            session_id (str): The session id.
+            create (callable): Builds a GameController for a new session.
+
+        Yields:
+            GameSession: The session; its controller is saved back on exit.
+        """
+        with self._locks.get(session_id):
+            with self._guard:
+                entry = self._games.get(session_id)
+            game = GameSession(session_id, entry[1] if entry else create())
+            yield game
+            with self._guard:
+                self._games[session_id] = (time.monotonic(), game.controller)
+                self._games.move_to_end(session_id)
+                self._evict()
+
+    def _evict(self):
+        expires = time.monotonic() - self.ttl
+        while self._games:
+            oldest_id, (last_access, _) = next(iter(self._games.items()))
+            if len(self._games) <= self.max_sessions and last_access >= expires:
+                break
+            del self._games[oldest_id]
+
+    def __len__(self):
+        return len(self._games)
+
+    def close(self):
+        """Nothing to flush: games live in memory only."""
+
+
+def save_key(controller):
+    """
+    What a checkout must change for a game to be written back: its version
+    and start time (a new game in place). None when the controller has no
+    version, and must then be written after every checkout.
+    """
+    try:
+        return (controller.version, controller.start_time)
+    except AttributeError:
+        return None
+
+
+class SQLiteSessionStore:
+    """
+    GameControllers pickled into a SQLite database, shared by every worker
+    process that opens the same file.
+
+    A checkout reads the game with a plain SELECT (WAL readers do not block
+    the writer) and builds new games outside any transaction; requests from
+    threads of the same worker are serialized by a per-session lock. Only a
+    checkout that changed the game writes it back, in a short IMMEDIATE
+    transaction that checks the row's revision has not moved since it was
+    read: if another worker saved the session in between, the first write
+    wins and leaving this checkout raises SessionConflict (its changes are
+    lost, and its client must resync). Read-only checkouts only refresh `updated_at` once it is half
+    `ttl` old. Sessions not touched for `ttl` seconds are deleted.
+    """
+
+    def __init__(self, path, ttl=6 * 3600, cleanup_every=500):
+        self.path = path
+        self.ttl = ttl
+        self.cleanup_every = cleanup_every
+        self._local = threading.local()
+        self._locks = SessionLocks()
+        self._checkouts = 0
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS games ("
+                " session_id TEXT PRIMARY KEY,"
+                " updated_at REAL NOT NULL,"
+                " controller BLOB NOT NULL,"
+                " revision INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in db.execute("PRAGMA table_info(games)")]
+            if "revision" not in columns:   # database of an older version
+                db.execute(
+                    "ALTER TABLE games ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"
+                )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS games_updated_at ON games (updated_at)"
+            )
+
+    def _connect(self):
+        # One connection per thread and process: a connection opened before
+        # a fork (gunicorn preload_app) must not be used by the workers
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    @contextmanager
+    def session(self, session_id, create):
+        """
+        Check out the game of a session, holding its lock.
+
+        Args:
+            session_id (str): The session id.
+            create (callable): Builds a GameController for a new session.
+
+        Yields:
+            GameSession: The session; its controller is saved back on exit
+            if it changed.
+
+        Raises:
+            SessionConflict: On exit, if another checkout saved it first.
+        """
+        with self._locks.get(session_id):
+            db = self._connect()
+            row = db.execute(
+                "SELECT revision, updated_at, controller FROM games WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            controller = pickle.loads(row[2]) if row else create()
+            before = save_key(controller)
+            game = GameSession(session_id, controller)
+            yield game
+            now = time.time()
+            if (row is None or game.controller is not controller or before is None
+                    or save_key(game.controller) != before):
+                if not self._write(db, session_id, game.controller,
+                                   row[0] if row else None, now):
+                    raise SessionConflict(session_id)
+            elif now - row[1] > self.ttl / 2:
+                db.execute(
+                    "UPDATE games SET updated_at = ? WHERE session_id = ?",
+                    (now, session_id),
+                )
+            self._checkouts += 1
+            if self._checkouts % self.cleanup_every == 0:
+                db.execute("DELETE FROM games WHERE updated_at < ?", (now - self.ttl,))
+
+    def _write(self, db, session_id, controller, revision, now):
+        """
+        Save a game read at `revision` (None for a new session), unless
+        another checkout saved it first. Returns True if it was saved.
+        """
+        data = pickle.dumps(controller, pickle.HIGHEST_PROTOCOL)
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if revision is None:
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO games (session_id, updated_at, controller)"
+                    " VALUES (?, ?, ?)",
+                    (session_id, now, data),
+                )
+            else:
+                cursor = db.execute(
+                    "UPDATE games SET updated_at = ?, controller = ?, revision = revision + 1"
+                    " WHERE session_id = ? AND revision = ?",
+                    (now, data, session_id, revision),
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def close(self):
+        """Nothing to flush: every changed checkout commits."""
+
+
+# A journal record: row, col, old state << 4 | new state, and the version
+# of the game once the checkout that made the change was saved
+JOURNAL_RECORD = struct.Struct(">BBBI")
+
+
+class SessionLog:
+    """Where the journal of an in-memory session stands."""
+    __slots__ = ("generation", "records", "game")
+
+    def __init__(self, generation, records, game):
+        self.generation = generation   # of the snapshot the journal follows
+        self.records = records         # records appended since that snapshot
+        self.game = game               # (id, start time) of the snapshotted game
+
+
+class JournalSessionStore(MemorySessionStore):
+    """
+    The memory store, made durable by an append-only journal per session,
+    so games survive a worker restart.
+
+    A checkout that changed cells appends one small fixed-size record per
+    changed cell (JOURNAL_RECORD) to the session's journal. The records
+    are buffered and written by a background thread every
+    `flush_interval` seconds, all sessions in one group (and fsynced with
+    `fsync`), so a move costs no disk I/O on the request path. A new game,
+    or `snapshot_every` records, writes a pickled snapshot of the game
+    instead and starts a new, empty journal (compaction).
+
+    A session missing from memory (after a restart or eviction) is rebuilt
+    from its snapshot and the records of its journal. Records hold the old
+    state of each cell too, so a journal can also be walked back (undo).
+
+    Files: <session id>.snap and <session id>.<generation>.log under
+    `directory`. Like the memory store, every worker process has its own
+    games, so use one worker (or sticky sessions) per directory.
+    """
+
+    def __init__(self, directory, snapshot_every=256, flush_interval=0.05,
+                 fsync=True, max_sessions=10000, ttl=6 * 3600, cleanup_every=500):
+        super().__init__(max_sessions, ttl)
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.cleanup_every = cleanup_every
+        os.makedirs(directory, exist_ok=True)
+        self._pending = {}   # journal path -> bytes waiting to be written
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer = None   # started on the first append (after any fork)
+        self._closed = threading.Event()
+        self._checkouts = 0
+
+    def _snapshot_path(self, session_id):
+        return os.path.join(self.directory, f"{session_id}.snap")
+
+    def _log_path(self, session_id, generation):
+        return os.path.join(self.directory, f"{session_id}.{generation}.log")
+
+    @contextmanager
+    def session(self, session_id, create):
+        """
+        Check out the game of a session, holding its lock.
+
+        Args:
+            session_id (str): The session id.
+            create (callable): Builds a GameController for a new session.
+
+        Yields:
+            GameSession: The session; its controller is saved back on exit.
+        """
+        with self._locks.get(session_id):
+            with self._guard:
+                entry = self._games.get(session_id)
+            controller, log = entry[1] if entry else self._load(session_id)
+            game = GameSession(session_id, controller or create())
+            yield game
+            log = self._save(session_id, game.controller, log)
+            with self._guard:
+                self._games[session_id] = (time.monotonic(), (game.controller, log))
+                self._games.move_to_end(session_id)
+                self._evict()
+                self._checkouts += 1
+                cleanup = self._checkouts % self.cleanup_every == 0
+        if cleanup:
+            self._cleanup()
+
+    def _load(self, session_id):
+        """The game of a session rebuilt from disk: (controller, log), or (None, None)."""
+        try:
+            with open(self._snapshot_path(session_id), "rb") as f:
+                generation, controller = pickle.load(f)
+        except FileNotFoundError:
+            return None, None
+        self.flush()   # records of this session may still be buffered
+        path = self._log_path(session_id, generation)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        # A crash can leave a partial record at the end: ignore it
+        data = data[:len(data) - len(data) % JOURNAL_RECORD.size]
+        changes, version = [], controller.version
+        for row, col, states, version in JOURNAL_RECORD.iter_unpack(data):
+            changes.append((row, col, states >> 4, states & 0xF))
+        if changes:
+            controller.replay(changes, version)
+        return controller, SessionLog(
+            generation, len(changes), (id(controller), controller.start_time)
+        )
+
+    def _save(self, session_id, controller, log):
+        """Journal the changes of a checkout, or snapshot the game; returns its log."""
+        game = (id(controller), controller.start_time)
+        changes = controller.journal or ()
+        if (log is None or log.game != game or controller.journal is None
+                or log.records + len(changes) >= self.snapshot_every):
+            generation = log.generation + 1 if log is not None else 0
+            self._snapshot(session_id, controller, generation)
+            return SessionLog(generation, 0, game)
+        if changes:
+            controller.journal = []
+            self._append(self._log_path(session_id, log.generation), b"".join(
+                JOURNAL_RECORD.pack(row, col, old << 4 | new, controller.version)
+                for row, col, old, new in changes
+            ))
+            log.records += len(changes)
+        return log
+
+    def _snapshot(self, session_id, controller, generation):
+        """Write the game as the snapshot of `generation` and drop the journal before it."""
+        controller.journal = []   # pickled empty: journaling stays on when loaded
+        path = self._snapshot_path(session_id)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump((generation, controller), f, pickle.HIGHEST_PROTOCOL)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        if generation > 0:
+            old = self._log_path(session_id, generation - 1)
+            with self._write_lock:
+                with self._pending_lock:
+                    self._pending.pop(old, None)
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass
+
+    def _append(self, path, data):
+        with self._pending_lock:
+            self._pending[path] = self._pending.get(path, b"") + data
+            if self._writer is None and not self._closed.is_set():
+                self._writer = threading.Thread(
+                    target=self._write_loop, name="session-journal", daemon=True
+                )
+                self._writer.start()
+
+    def _write_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write every buffered journal record (one group, one fsync per file)."""
+        with self._write_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            for path, data in pending.items():
+                with open(path, "ab") as f:
+                    f.write(data)
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+
+    def close(self):
+        """Stop the writer thread and write what is still buffered."""
+        self._closed.set()
+        if self._writer is not None:
+            self._writer.join()
+        self.flush()
+
+    def _cleanup(self):
+        """
+        Delete the files of sessions not saved for `ttl` seconds. A session
+        expires as a whole, by the newest of its files (a game in progress
+        keeps an old snapshot next to a fresh journal), and never while it
+        is in memory.
+        """
+        expires = time.time() - self.ttl
+        sessions = {}
+        for name in os.listdir(self.directory):
+            sessions.setdefault(name.split(".", 1)[0], []).append(
+                os.path.join(self.directory, name)
+            )
+        for session_id, paths in sessions.items():
+            with self._guard:
+                if session_id in self._games:
+                    continue
+            with self._locks.get(session_id):
+                with self._guard:
+                    if session_id in self._games:   # loaded meanwhile
+                        continue
+                newest = 0.0
+                for path in paths:
+                    try:
+                        newest = max(newest, os.path.getmtime(path))
+                    except FileNotFoundError:
+                        pass
+                if newest >= expires:
+                    continue
+                with self._write_lock:
+                    with self._pending_lock:
+                        for path in paths:
+                            self._pending.pop(path, None)
+                    for path in paths:
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            pass
+
+
+def store_from_url(url):
+    """
+    Build a session store from a short description, e.g. the GAME_STORE
+    environment variable.
+
+    Args:
+        url (str): "memory", "sqlite:<path to database file>" or
+                   "journal:<directory>".
+
+    Returns:
+        MemorySessionStore, SQLiteSessionStore or JournalSessionStore
+    """
+    if not url or url == "memory":
+        return MemorySessionStore()
+    if url.startswith("sqlite:"):
+        return SQLiteSessionStore(url[len("sqlite:"):])
+    if url.startswith("journal:"):
+        return JournalSessionStore(url[len("journal:"):])
+    raise ValueError(f"Unknown session store: {url!r}")
+
+# --- Unit Tests ---
+
+class TestSessionStores(unittest.TestCase):
+    def test_memory_store_lru(self):
+        """Test that the memory store keeps sessions apart and evicts the oldest."""
+        store = MemorySessionStore(max_sessions=2)
+        for session_id in ("a", "b", "c"):
+            with store.session(session_id, lambda: [session_id]) as game:
+                game.controller.append(1)
+        self.assertEqual(len(store), 2)
+        with store.session("a", lambda: []) as game:
+            self.assertEqual(game.controller, [])
+        with store.session("c", lambda: []) as game:
+            self.assertEqual(game.controller, ["c", 1])
+
+    def test_sqlite_store_round_trip(self):
+        """Test that the SQLite store persists changes and replaced controllers."""
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sessions.sqlite3")
+            store = SQLiteSessionStore(path)
+            with store.session("a", lambda: {"moves": 0}) as game:
+                game.controller["moves"] += 1
+            with store.session("a", lambda: {"moves": 0}) as game:
+                self.assertEqual(game.controller, {"moves": 1})
+                game.controller = {"moves": 10}
+            other = SQLiteSessionStore(path)
+            with other.session("a", lambda: None) as game:
+                self.assertEqual(game.controller, {"moves": 10})
+            self.assertEqual(len(other), 1)
+
+    def test_sqlite_store_writes_changes_only(self):
+        """Test that read-only checkouts do not write and concurrent saves keep the first."""
+        import tempfile
+        from app.controllers.game_controller import GameController
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sessions.sqlite3")
+            store, other = SQLiteSessionStore(path), SQLiteSessionStore(path)
+
+            def revision():
+                return store._connect().execute(
+                    "SELECT revision FROM games WHERE session_id = 'a'"
+                ).fetchone()[0]
+
+            with store.session("a", lambda: GameController(6, seed=1)):
+                pass
+            with store.session("a", None) as game:
+                game.controller.get_game_state()
+            self.assertEqual(revision(), 0)
+            with store.session("a", None) as game:
+                game.controller.update_move(0, 0, "cross")
+            self.assertEqual(revision(), 1)
+            # Another worker saves the session while this checkout is out:
+            # the first save wins and the late one is reported
+            with self.assertRaises(SessionConflict):
+                with store.session("a", None) as game:
+                    with other.session("a", None) as rival:
+                        rival.controller.update_move(1, 1, "queen")
+                    game.controller.update_move(2, 2, "cross")
+            # A read-only checkout that overlaps a save loses nothing
+            with store.session("a", None) as game:
+                with other.session("a", None) as rival:
+                    rival.controller.update_move(3, 3, "cross")
+            with store.session("a", None) as game:
+                self.assertEqual(game.controller.user_board[1][1], "Q")
+                self.assertEqual(game.controller.user_board[2][2], "")
+            self.assertEqual(game.controller.user_board[3][3], "X")
+            self.assertEqual(revision(), 3)
+
+    def test_journal_store_recovers(self):
+        """Test that a journaled game is rebuilt after a restart, through snapshots."""
+        import tempfile
+        from app.controllers.game_controller import GameController
+        with tempfile.TemporaryDirectory() as tmp:
+            store = JournalSessionStore(tmp, snapshot_every=5)
+            with store.session("a", lambda: GameController(6, seed=1)) as game:
+                pass
+            moves = [(0, 0, "queen"), (0, 1, "queen"), (2, 2, "cross"),
+                     (0, 0, "clear"), (3, 3, "cross"), (4, 4, "queen"), (5, 0, "cross")]
+            for move in moves:
+                with store.session("a", None) as game:
+                    game.controller.update_move(*move)
+            expected = game.controller
+            store.close()
+            self.assertFalse(os.path.exists(os.path.join(tmp, "a.0.log")))
+            # A crash mid-write leaves a partial record
+            with open(os.path.join(tmp, "a.1.log"), "ab") as f:
+                f.write(b"\x01")
+
+            restarted = JournalSessionStore(tmp)
+            with restarted.session("a", None) as game:
+                self.assertEqual(game.controller.user_board, expected.user_board)
+                self.assertEqual(game.controller.error_board, expected.error_board)
+                self.assertEqual(game.controller.version, expected.version)
+                self.assertEqual(game.controller.start_time, expected.start_time)
+            restarted.close()
+
+    def test_journal_cleanup_by_session(self):
+        """Test that a session expires by its newest file, its files all together."""
+        import tempfile
+        from app.controllers.game_controller import GameController
+        with tempfile.TemporaryDirectory() as tmp:
+            store = JournalSessionStore(tmp, ttl=60)
+            for session_id in ("active", "idle"):
+                with store.session(session_id, lambda: GameController(6, seed=1)):
+                    pass
+                with store.session(session_id, None) as game:
+                    game.controller.update_move(0, 0, "cross")
+            store.close()
+            old = time.time() - 120
+            for name in os.listdir(tmp):
+                if name.startswith("idle") or name.endswith(".snap"):
+                    os.utime(os.path.join(tmp, name), (old, old))
+
+            restarted = JournalSessionStore(tmp, ttl=60)
+            restarted._cleanup()
+            self.assertEqual(sorted(os.listdir(tmp)), ["active.0.log", "active.snap"])
+            with restarted.session("active", None) as game:
+                self.assertEqual(game.controller.user_board[0][0], "X")
+            restarted.close()
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
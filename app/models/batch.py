@@ -0,0 +1,258 @@
+import random
+import unittest
+
+from app.models import geometry
+from app.models.puzzle import Puzzle
+
+try:
+    import numpy as np
+except ImportError:   # optional: the batch API then runs one board at a time
+    np = None
+
+# Chance that an unassigned cell next to a region joins it in one growth
+# round: low enough that regions grow unevenly, high enough to finish in a
+# few dozen rounds.
+JOIN_PROBABILITY = 0.3
+
+# Every random draw is a 64-bit hash of (seed, stream, board, step, item),
+# so board k of a seed is the same whichever path computes it and however
+# many boards are generated with it.
+LAYOUT, PICK, JOIN = 1, 2, 3
+MASK = (1 << 64) - 1
+JOIN_BELOW = int(JOIN_PROBABILITY * (1 << 64))
+TOP_BIT = 1 << 63
+# Permutations drawn at once per pending board on the NumPy path
+ATTEMPT_BLOCK = 16
+
+
+def mix(x):
+    """splitmix64 finalizer of a 64-bit int."""
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & MASK
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & MASK
+    return x ^ (x >> 31)
+
+def mix_array(x):
+    """mix() over a NumPy uint64 array (the multiplications wrap)."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def generate_batch(K, N, seed=None, use_numpy=None):
+    """
+    Generate K boards of size N in one call: the queen layouts and the
+    regions grown around them (connected, no uniqueness check).
+
+    A layout is the first of a board's random permutations in which no two
+    consecutive rows touch. Regions then grow in rounds from the queens:
+    every unassigned cell next to a region picks one of its assigned
+    neighbours at random and joins its region with JOIN_PROBABILITY.
+
+    With NumPy, permutations are drawn in blocks for every pending board
+    and all the boards grow together with array operations; without it
+    (or with use_numpy=False) the same draws are made one board at a time.
+    Both paths give the same boards for the same seed.
+
+    Args:
+        K (int): Number of boards.
+        N (int): Board size (1 or at least 4).
+        seed (int): Seed for the random draws (None for a random one).
+        use_numpy (bool): Force (True) or avoid (False) NumPy; by default
+                          it is used when installed.
+
+    Returns:
+        tuple: (queen_boards, regions)
+          - queen_boards: K x N queen columns.
+          - regions: K x N x N region index (queen row) of every cell.
+          With NumPy these are uint8 arrays, otherwise nested lists
+          (equal to the arrays' tolist()).
+    """
+    if N != 1 and N < 4:
+        raise ValueError(f"No valid board exists for N = {N} with immediate diagonal constraints")
+    if seed is None:
+        seed = random.getrandbits(64)
+    seed &= MASK
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        if np is None:
+            raise ImportError("NumPy is required for use_numpy=True")
+        queen_boards = sample_layouts(K, N, seed)
+        return queen_boards, grow_regions_batch(queen_boards, seed)
+
+    queen_boards, regions = [], []
+    for k in range(K):
+        board = sample_layout(k, N, seed)
+        queen_boards.append(board)
+        regions.append(grow_board_regions(k, board, seed))
+    return queen_boards, regions
+
+# ----- Pure-Python path (one board) -----
+
+def sample_layout(k, N, seed):
+    """Queen columns of board k: its first permutation with no touching rows."""
+    board_key = mix(mix(seed ^ LAYOUT) ^ k)
+    attempt = 0
+    while True:
+        attempt_key = mix(board_key ^ attempt)
+        keys = [mix(attempt_key ^ j) for j in range(N)]
+        perm = sorted(range(N), key=keys.__getitem__)
+        if all(abs(perm[j + 1] - perm[j]) != 1 for j in range(N - 1)):
+            return perm
+        attempt += 1
+
+def grow_board_regions(k, queen_board, seed):
+    """N x N region index of every cell of board k (see generate_batch)."""
+    N = len(queen_board)
+    regions = [-1] * (N * N)
+    for r, c in enumerate(queen_board):
+        regions[r * N + c] = r
+    pick_key = mix(mix(seed ^ PICK) ^ k)
+    join_key = mix(mix(seed ^ JOIN) ^ k)
+    step = 0
+    while -1 in regions:
+        picks = mix(pick_key ^ step)
+        joins = mix(join_key ^ step)
+        before = regions[:]
+        for cell in range(N * N):
+            if before[cell] >= 0:
+                continue
+            r, c = divmod(cell, N)
+            best, chosen = 0, -1
+            for d, (nr, nc) in enumerate(((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1))):
+                if 0 <= nr < N and 0 <= nc < N and before[nr * N + nc] >= 0:
+                    key = mix(picks ^ (cell * 4 + d)) >> 1 | TOP_BIT
+                    if key > best:
+                        best, chosen = key, before[nr * N + nc]
+            if chosen >= 0 and mix(joins ^ cell) < JOIN_BELOW:
+                regions[cell] = chosen
+        step += 1
+    return [regions[r * N:(r + 1) * N] for r in range(N)]
+
+# ----- NumPy path (every board at once) -----
+
+def sample_layouts(K, N, seed):
+    """
+    K queen layouts (NumPy): blocks of ATTEMPT_BLOCK permutations per
+    pending board, keeping each board's first one with no touching rows.
+
+    Returns:
+        ndarray: K x N uint8 queen columns.
+    """
+    layouts = np.zeros((K, N), dtype=np.uint8)
+    pending = np.arange(K, dtype=np.uint64)
+    board_keys = mix_array(np.uint64(mix(seed ^ LAYOUT)) ^ pending)
+    rows = np.arange(N, dtype=np.uint64)
+    first = 0
+    while len(pending):
+        attempts = np.arange(first, first + ATTEMPT_BLOCK, dtype=np.uint64)
+        attempt_keys = mix_array(board_keys[:, None] ^ attempts[None, :])
+        keys = mix_array(attempt_keys[:, :, None] ^ rows[None, None, :])
+        perms = keys.argsort(axis=2, kind="stable").astype(np.int16)
+        ok = (np.abs(np.diff(perms, axis=2)) != 1).all(axis=2)
+        found = ok.any(axis=1)
+        chosen = perms[found, ok[found].argmax(axis=1)]
+        layouts[pending[found].astype(np.intp)] = chosen
+        pending, board_keys = pending[~found], board_keys[~found]
+        first += ATTEMPT_BLOCK
+    return layouts
+
+def grow_regions_batch(queen_boards, seed):
+    """
+    Grow the regions of many boards at once (NumPy), in the same rounds
+    and with the same draws as grow_board_regions.
+
+    Args:
+        queen_boards (ndarray): K x N queen columns.
+        seed (int): Seed of the batch.
+
+    Returns:
+        ndarray: K x N x N uint8 region index of every cell.
+    """
+    K, N = queen_boards.shape
+    regions = np.full((K, N, N), -1, dtype=np.int16)
+    rows = np.arange(N)
+    regions[np.arange(K)[:, None], rows, queen_boards.astype(np.intp)] = rows
+
+    boards = np.arange(K, dtype=np.uint64)
+    pick_keys = mix_array(np.uint64(mix(seed ^ PICK)) ^ boards)
+    join_keys = mix_array(np.uint64(mix(seed ^ JOIN)) ^ boards)
+    cells = np.arange(N * N, dtype=np.uint64).reshape(N, N)
+    directions = np.arange(4, dtype=np.uint64)[:, None, None]
+    pick_items = (cells * np.uint64(4))[None] + directions   # 4 x N x N
+    step = 0
+    while (regions < 0).any():
+        padded = np.pad(regions, ((0, 0), (1, 1), (1, 1)), constant_values=-1)
+        neighbours = np.stack([
+            padded[:, :-2, 1:-1],   # up
+            padded[:, 2:, 1:-1],    # down
+            padded[:, 1:-1, :-2],   # left
+            padded[:, 1:-1, 2:],    # right
+        ])                          # 4 x K x N x N
+        picks = mix_array(pick_keys ^ np.uint64(step))
+        keys = mix_array(picks[None, :, None, None] ^ pick_items[:, None])
+        keys = (keys >> np.uint64(1)) | np.uint64(TOP_BIT)
+        keys[neighbours < 0] = 0
+        pick = keys.argmax(axis=0)[None]
+        chosen = np.take_along_axis(neighbours, pick, axis=0)[0]
+        joins = mix_array(mix_array(join_keys ^ np.uint64(step))[:, None, None] ^ cells[None])
+        grow = (regions < 0) & (chosen >= 0) & (joins < np.uint64(JOIN_BELOW))
+        regions[grow] = chosen[grow]
+        step += 1
+    return regions.astype(np.uint8)
+
+def to_puzzles(queen_boards, regions):
+    """
+    Convert the output of generate_batch (arrays or lists) to Puzzles.
+
+    Returns:
+        list: One Puzzle per board.
+    """
+    puzzles = []
+    for board, grid in zip(queen_boards, regions):
+        board = [int(c) for c in board]
+        flat = bytes(int(k) for row in grid for k in row)
+        puzzles.append(Puzzle(len(board), board, flat))
+    return puzzles
+
+# --- Unit Tests ---
+
+class TestBatchGeneration(unittest.TestCase):
+    def check_batch(self, queen_boards, regions, K, N):
+        self.assertEqual(len(queen_boards), K)
+        for game in to_puzzles(queen_boards, regions):
+            self.assertEqual(sorted(game.queen_board), list(range(N)))
+            for r in range(1, N):
+                self.assertNotEqual(abs(game.queen_board[r] - game.queen_board[r - 1]), 1)
+            # Every region holds its queen and is connected
+            neighbors = geometry.board_geometry(N).neighbors
+            for k, col in enumerate(game.queen_board):
+                seen, stack = {k * N + col}, [k * N + col]
+                while stack:
+                    for nb in neighbors[stack.pop()]:
+                        if game.regions[nb] == k and nb not in seen:
+                            seen.add(nb)
+                            stack.append(nb)
+                self.assertEqual(len(seen), game.regions.count(k))
+
+    def test_python_batch(self):
+        """Test the pure-Python path: valid boards, reproducible from a seed."""
+        queen_boards, regions = generate_batch(5, 8, seed=3, use_numpy=False)
+        self.check_batch(queen_boards, regions, 5, 8)
+        self.assertEqual(generate_batch(5, 8, seed=3, use_numpy=False), (queen_boards, regions))
+        # Board k does not depend on how many boards are generated with it
+        self.assertEqual(generate_batch(2, 8, seed=3, use_numpy=False)[1], regions[:2])
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_numpy_batch(self):
+        """Test the NumPy path: valid boards, the same as the pure-Python path."""
+        queen_boards, regions = generate_batch(50, 9, seed=3, use_numpy=True)
+        self.assertEqual(queen_boards.shape, (50, 9))
+        self.assertEqual(regions.shape, (50, 9, 9))
+        self.check_batch(queen_boards, regions, 50, 9)
+        python_boards, python_regions = generate_batch(50, 9, seed=3, use_numpy=False)
+        self.assertEqual(queen_boards.tolist(), python_boards)
+        self.assertEqual(regions.tolist(), python_regions)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
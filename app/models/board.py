@@ -0,0 +1,111 @@
+import unittest
+
+# State byte of a cell, and the user_board value it stands for
+EMPTY, CROSS, QUEEN = 0, 1, 2
+CELL_VALUES = ('', 'X', 'Q')
+CELL_STATES = {value: state for state, value in enumerate(CELL_VALUES)}
+
+
+class Board:
+    """
+    Compact N x N game board. Cell (r, c) has flat index r * N + c.
+
+    - regions: one byte per cell with its region index (region i holds the
+      queen of row i in the solution). Shared with the puzzle, never copied.
+    - cells: one state byte per cell (EMPTY, CROSS or QUEEN).
+    - errors: integer bitset, bit r * N + c set when that queen is in conflict.
+
+    Colors are not stored: a palette indexed by region is applied only when
+    the board is rendered.
+    """
+    __slots__ = ("size", "regions", "cells", "errors")
+
+    def __init__(self, size, regions):
+        if len(regions) != size * size:
+            raise ValueError("regions must hold one byte per cell")
+        self.size = size
+        self.regions = bytes(regions)
+        self.cells = bytearray(size * size)
+        self.errors = 0
+
+    def index(self, row, col):
+        return row * self.size + col
+
+    def region(self, row, col):
+        return self.regions[row * self.size + col]
+
+    def state(self, row, col):
+        return self.cells[row * self.size + col]
+
+    def set_state(self, row, col, state):
+        self.cells[row * self.size + col] = state
+
+    def has_error(self, row, col):
+        return bool((self.errors >> (row * self.size + col)) & 1)
+
+    @property
+    def error_count(self):
+        return self.errors.bit_count()
+
+    def copy(self):
+        """Copy with its own cells and errors (the regions are shared)."""
+        board = Board.__new__(Board)
+        board.size = self.size
+        board.regions = self.regions
+        board.cells = bytearray(self.cells)
+        board.errors = self.errors
+        return board
+
+    # ----- Rendering (nested lists, e.g. for JSON) -----
+
+    def region_rows(self):
+        """N x N matrix of region indices."""
+        N = self.size
+        return [list(self.regions[r * N:(r + 1) * N]) for r in range(N)]
+
+    def user_rows(self):
+        """N x N matrix of '' / 'X' / 'Q'."""
+        N = self.size
+        return [
+            [CELL_VALUES[state] for state in self.cells[r * N:(r + 1) * N]]
+            for r in range(N)
+        ]
+
+    def error_rows(self):
+        """N x N matrix of booleans, True on queens in conflict."""
+        N = self.size
+        return [
+            [bool((self.errors >> (r * N + c)) & 1) for c in range(N)]
+            for r in range(N)
+        ]
+
+    def colored_rows(self, palette):
+        """N x N matrix of palette entries, looked up by region."""
+        N = self.size
+        return [
+            [palette[k] for k in self.regions[r * N:(r + 1) * N]]
+            for r in range(N)
+        ]
+
+# --- Unit Tests ---
+
+class TestBoard(unittest.TestCase):
+    def test_rows_round_trip(self):
+        """Test that cell states, errors and regions render as nested lists."""
+        board = Board(2, [0, 0, 1, 1])
+        board.set_state(0, 1, QUEEN)
+        board.set_state(1, 0, CROSS)
+        board.errors |= 1 << board.index(0, 1)
+        self.assertEqual(board.user_rows(), [['', 'Q'], ['X', '']])
+        self.assertEqual(board.error_rows(), [[False, True], [False, False]])
+        self.assertEqual(board.region_rows(), [[0, 0], [1, 1]])
+        self.assertEqual(board.colored_rows("ab"), [['a', 'a'], ['b', 'b']])
+        self.assertEqual(board.error_count, 1)
+
+        copy = board.copy()
+        copy.set_state(0, 1, EMPTY)
+        self.assertEqual(board.state(0, 1), QUEEN)
+        self.assertIs(copy.regions, board.regions)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,341 @@
+import mmap
+import os
+import random
+import struct
+import unittest
+from collections import namedtuple
+
+from app.models import puzzle
+
+# File header: magic, board size, unique flag, generator version and the
+# seed of record 0. Record i is puzzle.encode_puzzle of the puzzle generated
+# from seed base_seed + i, so every record has the same width and can be
+# found by its index alone. Bump the magic if the layout changes.
+CATALOG_MAGIC = b"QCAT1\n"
+HEADER_FORMAT = struct.Struct(">6sBBHQ")
+HEADER_SIZE = HEADER_FORMAT.size
+
+# Difficulty sidecar (<catalog>.bands, see write_bands): magic, the number
+# of records in each difficulty band, the record indices grouped by band
+# (uint32 each) and then the band of every record (one byte each).
+BANDS_MAGIC = b"QBAND1\n"
+INDEX_FORMAT = struct.Struct(">I")
+
+CatalogHeader = namedtuple(
+    "CatalogHeader", ["size", "unique", "generator_version", "base_seed"]
+)
+
+
+def pack_header(header):
+    """
+    Encode a catalog header.
+
+    Args:
+        header (CatalogHeader): The header.
+
+    Returns:
+        bytes: HEADER_SIZE bytes.
+    """
+    return HEADER_FORMAT.pack(
+        CATALOG_MAGIC, header.size, int(header.unique),
+        header.generator_version, header.base_seed,
+    )
+
+def unpack_header(data):
+    """
+    Decode the header at the start of a catalog.
+
+    Args:
+        data (bytes): At least the first HEADER_SIZE bytes of the file.
+
+    Returns:
+        CatalogHeader: The header.
+
+    Raises:
+        ValueError: If the data is not a catalog header.
+    """
+    if len(data) < HEADER_SIZE:
+        raise ValueError("Truncated catalog header")
+    magic, size, unique, version, base_seed = HEADER_FORMAT.unpack_from(data)
+    if magic != CATALOG_MAGIC:
+        raise ValueError("Not a puzzle catalog")
+    return CatalogHeader(size, bool(unique), version, base_seed)
+
+def record_offset(N, index):
+    """
+    Byte offset of record `index` in a catalog of N x N puzzles.
+
+    Args:
+        N (int): Board size.
+        index (int): Record index.
+
+    Returns:
+        int: The offset.
+    """
+    return HEADER_SIZE + index * puzzle.record_size(N)
+
+def record_seed(header, index):
+    """Seed record `index` of a catalog was generated from."""
+    return header.base_seed + index
+
+def record_id(header, index):
+    """
+    Puzzle ID of record `index` (see puzzle.puzzle_id), or None for
+    catalogs of non-unique puzzles, which IDs do not cover.
+    """
+    if not header.unique or header.generator_version != puzzle.GENERATOR_VERSION:
+        return None
+    return puzzle.puzzle_id(header.size, record_seed(header, index))
+
+def open_for_append(path, header):
+    """
+    Open a catalog to add records, creating it if needed. An existing file
+    must have the same header; a partly written last record is cut off, so
+    an interrupted run can resume where it stopped.
+
+    Args:
+        path (str): Catalog file.
+        header (CatalogHeader): Expected header.
+
+    Returns:
+        tuple: (file opened for appending, number of complete records)
+
+    Raises:
+        ValueError: If the file holds a different catalog.
+    """
+    f = open(path, "a+b")
+    try:
+        f.seek(0)
+        existing = f.read(HEADER_SIZE)
+        if not existing:
+            f.write(pack_header(header))
+            f.flush()
+            return f, 0
+        if unpack_header(existing) != header:
+            raise ValueError(f"{path} holds a catalog with other settings")
+        size = os.fstat(f.fileno()).st_size
+        count = (size - HEADER_SIZE) // puzzle.record_size(header.size)
+        f.truncate(record_offset(header.size, count))
+        return f, count
+    except BaseException:
+        f.close()
+        raise
+
+def bands_path(path):
+    """Path of the difficulty sidecar of a catalog."""
+    return f"{path}.bands"
+
+def write_bands(path, bands, band_count):
+    """
+    Write the difficulty sidecar of a catalog (atomically, via a temp file).
+
+    Args:
+        path (str): Catalog file.
+        bands (bytes): Band index of each record, in record order.
+        band_count (int): Number of bands.
+    """
+    groups = [[] for _ in range(band_count)]
+    for index, band in enumerate(bands):
+        groups[band].append(index)
+    tmp_path = f"{bands_path(path)}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(BANDS_MAGIC)
+        f.write(struct.pack(f">{band_count}I", *map(len, groups)))
+        for group in groups:
+            f.write(struct.pack(f">{len(group)}I", *group))
+        f.write(bytes(bands))
+    os.replace(tmp_path, bands_path(path))
+
+class Catalog:
+    """
+    Read-only view of a catalog file, memory-mapped so that every process
+    opening it shares the same pages and nothing is parsed up front.
+    Record i is decoded on access, in O(1), from its fixed offset.
+    """
+
+    def __init__(self, path, band_count=0):
+        self.path = path
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.header = unpack_header(self._data)
+        except ValueError:
+            self._data.close()
+            raise
+        self.size = self.header.size
+        self._record_size = puzzle.record_size(self.size)
+        self._count = (len(self._data) - HEADER_SIZE) // self._record_size
+        self._bands = None
+        if band_count:
+            self._open_bands(band_count)
+
+    def _open_bands(self, band_count):
+        """Map the difficulty sidecar, if there is one covering this catalog."""
+        try:
+            f = open(bands_path(self.path), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            bands = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start = len(BANDS_MAGIC) + 4 * band_count
+        if bands[:len(BANDS_MAGIC)] != BANDS_MAGIC or len(bands) < start:
+            bands.close()
+            return
+        counts = struct.unpack_from(f">{band_count}I", bands, len(BANDS_MAGIC))
+        graded = sum(counts)
+        if graded > self._count or len(bands) != start + 5 * graded:
+            bands.close()
+            return
+        self._bands = bands
+        self._band_starts = []
+        for count in counts:
+            self._band_starts.append((start, count))
+            start += 4 * count
+        self._band_bytes = start
+
+    @property
+    def graded(self):
+        """True if a difficulty sidecar was loaded."""
+        return self._bands is not None
+
+    def band(self, index):
+        """Band index of record `index`, or None if it was not graded."""
+        if self._bands is None or not 0 <= index < len(self._bands) - self._band_bytes:
+            return None
+        return self._bands[self._band_bytes + index]
+
+    def band_size(self, band):
+        """Number of graded records in a band."""
+        if self._bands is None:
+            return 0
+        return self._band_starts[band][1]
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        """The puzzle of record `index` (negative indices count from the end)."""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("Catalog index out of range")
+        return puzzle.decode_puzzle(self._data, record_offset(self.size, index))
+
+    def puzzle_id(self, index):
+        """Puzzle ID of record `index` (see record_id)."""
+        return record_id(self.header, index)
+
+    def seed_index(self, seed):
+        """
+        Index of the record of a puzzle ID's seed, or None if the catalog
+        does not hold it (or its records have no IDs, see record_id).
+        """
+        index = seed - self.header.base_seed
+        if not 0 <= index < self._count or record_id(self.header, index) is None:
+            return None
+        return index
+
+    def random_index(self, rng=random, band=None):
+        """
+        Index of a random record, of the given band index if one is given
+        (None if the catalog has no graded record in that band).
+        """
+        if band is None:
+            return rng.randrange(self._count)
+        if not self.band_size(band):
+            return None
+        start, count = self._band_starts[band]
+        offset = start + 4 * rng.randrange(count)
+        return INDEX_FORMAT.unpack_from(self._bands, offset)[0]
+
+    def prefetch(self):
+        """Ask the OS to read the whole file in now (e.g. before forking workers)."""
+        if hasattr(mmap, "MADV_WILLNEED"):
+            self._data.madvise(mmap.MADV_WILLNEED)
+            if self._bands is not None:
+                self._bands.madvise(mmap.MADV_WILLNEED)
+
+    def close(self):
+        self._data.close()
+        if self._bands is not None:
+            self._bands.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_catalogs(directory, band_count=0):
+    """
+    Open every catalog_<N>.bin in a directory (as written by bulk_generate).
+
+    Args:
+        directory (str): Directory holding the catalogs.
+        band_count (int): Number of difficulty bands, to load the sidecars
+                          written by grade_catalog (0 skips them).
+
+    Returns:
+        dict: Board size -> Catalog, for the non-empty catalogs.
+    """
+    catalogs = {}
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("catalog_") and name.endswith(".bin"):
+            cat = Catalog(os.path.join(directory, name), band_count)
+            if len(cat):
+                catalogs[cat.size] = cat
+            else:
+                cat.close()
+    return catalogs
+
+# --- Unit Tests ---
+
+class TestCatalogFormat(unittest.TestCase):
+    def test_append_and_resume(self):
+        """Test that a catalog resumes after its last complete record."""
+        import tempfile
+        header = CatalogHeader(5, True, puzzle.GENERATOR_VERSION, 100)
+        games = [puzzle.generate_puzzle(5, rng=record_seed(header, i)) for i in range(3)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "catalog_5.bin")
+            f, count = open_for_append(path, header)
+            with f:
+                self.assertEqual(count, 0)
+                for game in games:
+                    f.write(puzzle.encode_puzzle(game))
+                f.write(b"\x05partial")
+            f, count = open_for_append(path, header)
+            f.close()
+            self.assertEqual(count, 3)
+            with open(path, "rb") as f:
+                data = f.read()
+            self.assertEqual(len(data), record_offset(5, 3))
+            self.assertEqual(unpack_header(data), header)
+            self.assertEqual(puzzle.decode_puzzle(data, record_offset(5, 2)), games[2])
+            self.assertEqual(
+                puzzle.puzzle_from_id(record_id(header, 1)), games[1]
+            )
+            with self.assertRaises(ValueError):
+                open_for_append(path, header._replace(base_seed=0))
+
+            with Catalog(path) as cat:
+                self.assertEqual(len(cat), 3)
+                self.assertEqual([cat[i] for i in range(3)], games)
+                self.assertEqual(cat[-1], games[2])
+                self.assertEqual(cat.puzzle_id(0), puzzle.puzzle_id(5, 100))
+                self.assertEqual(cat.seed_index(102), 2)
+                self.assertIsNone(cat.seed_index(103))
+                self.assertIsNone(cat.seed_index(99))
+                with self.assertRaises(IndexError):
+                    cat[3]
+            write_bands(path, bytes([1, 0, 1]), 3)
+            catalogs = open_catalogs(tmp, band_count=3)
+            self.assertEqual(list(catalogs), [5])
+            with catalogs[5] as cat:
+                self.assertEqual([cat.band(i) for i in range(3)], [1, 0, 1])
+                self.assertEqual(cat.random_index(band=0), 1)
+                self.assertIn(cat.random_index(band=1), (0, 2))
+                self.assertIsNone(cat.random_index(band=2))
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
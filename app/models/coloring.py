@@ -1,13 +1,20 @@
-import random
-from app.utils import color_utils
-from app.models import queens
+from functools import lru_cache
 
+from app.models import geometry, queens
+from app.utils import metrics, palette
+from app.utils.helper_functions import make_rng
 
+GROW_SECONDS = metrics.histogram(
+    "coloring_grow_regions_seconds", "Time to grow the regions of a board.")
+GROW_STEPS = metrics.counter(
+    "coloring_grow_regions_steps_total", "Cells claimed by region growth.")
 
 
 def get_neighbors(row, col, N):
     """
     Get valid neighbor positions (Manhattan distance 1) in an N x N board.
+    Inner loops should use the flat geometry.board_geometry(N).neighbors
+    table instead, which is built once per size.
     
     Args:
         row (int): Row index.
@@ -17,16 +24,8 @@ def get_neighbors(row, col, N):
     Returns:
         list: List of (row, col) tuples for neighbors.
     """
-    neighbors = []
-    if row > 0:
-        neighbors.append((row - 1, col))
-    if row < N - 1:
-        neighbors.append((row + 1, col))
-    if col > 0:
-        neighbors.append((row, col - 1))
-    if col < N - 1:
-        neighbors.append((row, col + 1))
-    return neighbors
+    geo = geometry.board_geometry(N)
+    return [geo.coords[nb] for nb in geo.neighbors[row * N + col]]
 
 def initialize_colored_board(queen_board, N, seed_colors):
     """
@@ -51,50 +50,171 @@ def initialize_colored_board(queen_board, N, seed_colors):
         number_board[i][col] = i + 1  # Queen numbers from 1 to N
     return colored_board, number_board
 
-def color_board(queen_board, N):
+def grow_regions(queen_board, N, rng=None):
+    """
+    Split the board into N connected regions grown from the queen positions.
+    
+    Region i starts at the queen of row i. Repeatedly, a random region that
+    can still grow is selected, and one of the uncolored cells adjacent to it
+    (Manhattan distance 1) is added to that region.
+    
+    Instead of rescanning the whole board on every step, each region keeps its
+    frontier (the uncolored cells it touches) and the frontiers are updated
+    incrementally when a cell is claimed. Only regions with a non-empty
+    frontier are candidates, which gives the same distribution as picking a
+    random region and retrying whenever it cannot grow.
+    
+    Args:
+        queen_board (list): List of queen positions (output from queens.py).
+        N (int): Board size.
+        rng: random.Random or seed to draw from (see make_rng).
+    
+    Returns:
+        bytearray: Region index (queen row) of every cell, indexed by r * N + c.
+    """
+    rng = make_rng(rng)
+    neighbors = geometry.board_geometry(N).neighbors
+    region = [-1] * (N * N)
+    frontier = [[] for _ in range(N)]   # Uncolored cells touching each region
+    position = [{} for _ in range(N)]   # Cell -> index in that region's frontier
+    active = []                         # Regions whose frontier is not empty
+    active_position = {}
+
+    def activate(k):
+        if k not in active_position:
+            active_position[k] = len(active)
+            active.append(k)
+
+    def deactivate(k):
+        i = active_position.pop(k)
+        last = active.pop()
+        if last != k:
+            active[i] = last
+            active_position[last] = i
+
+    def discard(k, cell):
+        i = position[k].pop(cell)
+        last = frontier[k].pop()
+        if last != cell:
+            frontier[k][i] = last
+            position[k][last] = i
+        if not frontier[k]:
+            deactivate(k)
+
+    def claim(k, cell):
+        region[cell] = k
+        for nb in neighbors[cell]:
+            j = region[nb]
+            if j == -1:
+                if nb not in position[k]:
+                    position[k][nb] = len(frontier[k])
+                    frontier[k].append(nb)
+                    activate(k)
+            elif cell in position[j]:
+                discard(j, cell)
+
+    with GROW_SECONDS.time(size=N):
+        for i, col in enumerate(queen_board):
+            claim(i, i * N + col)
+
+        steps = 0
+        while active:
+            k = rng.choice(active)
+            claim(k, rng.choice(frontier[k]))
+            steps += 1
+    GROW_STEPS.inc(steps, size=N)
+
+    return bytearray(region)
+
+def region_adjacency(regions, N):
+    """
+    The regions each region touches (shares an edge with).
+    
+    Args:
+        regions (bytes): Region index (0 to N-1) of each cell, indexed by r * N + c.
+        N (int): Board size.
+    
+    Returns:
+        list: N sets of region indices.
+    """
+    adjacency = [set() for _ in range(N)]
+    for index, neighbors in enumerate(geometry.board_geometry(N).neighbors):
+        k = regions[index]
+        for nb in neighbors:
+            if regions[nb] != k:
+                adjacency[k].add(regions[nb])
+    return adjacency
+
+@lru_cache(maxsize=1024)
+def region_colors(regions, N):
+    """
+    Palette index (into region_palette(N)) of every region, chosen so that
+    touching regions get the most distinct colors (see palette.assign_colors).
+    Memoized per puzzle.
+    
+    Args:
+        regions (bytes): Region index of each cell (hashable).
+        N (int): Board size.
+    
+    Returns:
+        bytes: Palette index of each region.
+    """
+    return bytes(palette.assign_colors(region_adjacency(regions, N)))
+
+def seed_colors(regions, N):
+    """(R, G, B) color of every region of a board."""
+    colors = palette.palette_colors(N)
+    return [colors[i] for i in region_colors(bytes(regions), N)]
+
+def paint_regions(regions, N):
+    """
+    Fill every region with the seed color of its queen.
+    
+    Args:
+        regions (bytes): Region index (0 to N-1) of each cell, indexed by r * N + c.
+        N (int): Board size.
+    
+    Returns:
+        list: N x N matrix of color tuples.
+    """
+    colors = seed_colors(regions, N)
+    return [[colors[k] for k in regions[r * N:(r + 1) * N]] for r in range(N)]
+
+def region_palette(N):
+    """
+    Hex colors of the regions of every N x N board, for clients that color
+    the cells themselves: the same for every game of that size, so clients
+    can cache it; region_colors picks the entry of each region. Shared: do
+    not modify it.
+    
+    Args:
+        N (int): Board size (number of regions).
+    
+    Returns:
+        tuple: N strings like '#ff0000'.
+    """
+    return palette.hex_palette(N)
+
+def color_board(queen_board, N, rng=None):
     """
     Color the board starting from the queen positions.
-    Each queen (number) is associated with a distinct seed color.
-    Then, repeatedly, a random seed color is selected, and one of its adjacent
-    uncolored cells (Manhattan distance 1) is filled with that color.
+    Each queen (number) is associated with a distinct seed color, and the
+    regions grown by grow_regions are filled with the color of their queen.
     
     Args:
         queen_board (list): List of queen positions (output from queens.py).
         N (int): Board size.
+        rng: random.Random or seed to draw from (see make_rng).
     
     Returns:
         tuple: (colored_board, number_board)
           - colored_board: N x N matrix of color tuples.
           - number_board: N x N matrix with queen numbers in queen positions.
     """
-    # Generate distinct colors for each queen
-    seed_colors = color_utils.generate_distinct_colors(N)
-    
-    colored_board, number_board = initialize_colored_board(queen_board, N, seed_colors)
-    
-    total_cells = N * N
-    colored_count = N  # initial colored cells from queens
-    
-    while colored_count < total_cells:
-        # Randomly select a seed color index
-        color_index = random.randint(0, N - 1)
-        current_color = seed_colors[color_index]
-        
-        # Find all uncolored candidate cells adjacent to any cell with current_color
-        candidates = []
-        for r in range(N):
-            for c in range(N):
-                if colored_board[r][c] is None:
-                    for nr, nc in get_neighbors(r, c, N):
-                        if colored_board[nr][nc] == current_color:
-                            candidates.append((r, c))
-                            break
-        
-        if candidates:
-            r, c = random.choice(candidates)
-            colored_board[r][c] = current_color
-            colored_count += 1
-        # If no candidate is found for this color, continue to next iteration.
+    regions = grow_regions(queen_board, N, rng)
+    # Distinct colors for each queen, most distinct between touching regions
+    _, number_board = initialize_colored_board(queen_board, N, seed_colors(regions, N))
+    colored_board = paint_regions(regions, N)
     
     return colored_board, number_board
 
@@ -148,11 +268,49 @@ class TestColoring(unittest.TestCase):
             for cell in row:
                 self.assertIsNotNone(cell)
         
-        # Assert that the queen positions have the correct seed colors
-        # (Since generate_distinct_colors is deterministic, re-generating it gives the same colors)
-        seed_colors = color_utils.generate_distinct_colors(N)
-        for i, col in enumerate(queen_board):
-            self.assertEqual(colored_board[i][col], seed_colors[i])
+        # Assert that the queens have distinct colors from the size's palette
+        queen_colors = {colored_board[i][col] for i, col in enumerate(queen_board)}
+        self.assertEqual(queen_colors, set(palette.palette_colors(N)))
+
+    def test_touching_regions_contrast(self):
+        """Test that region colors are memoized and each is used once."""
+        queen_board = queens.generate_random_board(8, rng=3)
+        regions = bytes(grow_regions(queen_board, 8, rng=3))
+        colors = region_colors(regions, 8)
+        self.assertIs(colors, region_colors(regions, 8))
+        self.assertEqual(sorted(colors), list(range(8)))
+        adjacency = region_adjacency(regions, 8)
+        for k in range(8):
+            self.assertNotIn(k, adjacency[k])
+            for other in adjacency[k]:
+                self.assertIn(k, adjacency[other])
+
+    def test_regions_are_connected(self):
+        """
+        Test that every region contains its queen and is a single
+        4-connected area, including on large boards.
+        """
+        for N in (4, 8, 15, 40):
+            queen_board = queens.generate_random_board(N)
+            regions = grow_regions(queen_board, N)
+            for k, col in enumerate(queen_board):
+                self.assertEqual(regions[k * N + col], k)
+                cells = {(r, c) for r in range(N) for c in range(N) if regions[r * N + c] == k}
+                seen = {(k, col)}
+                stack = [(k, col)]
+                while stack:
+                    r, c = stack.pop()
+                    for nb in get_neighbors(r, c, N):
+                        if nb in cells and nb not in seen:
+                            seen.add(nb)
+                            stack.append(nb)
+                self.assertEqual(seen, cells)
+
+    def test_seeded_regions(self):
+        """Test that the same seed grows the same regions."""
+        queen_board = queens.generate_random_board(10, rng=7)
+        regions = grow_regions(queen_board, 10, rng=7)
+        self.assertEqual(grow_regions(queen_board, 10, rng=7), regions)
             
 if __name__ == '__main__':
     unittest.main(exit=False)
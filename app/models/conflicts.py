@@ -0,0 +1,106 @@
+import unittest
+
+from app.models import geometry, solver
+from app.utils import metrics
+
+QUEEN_CHECKS = metrics.counter(
+    "conflict_queen_checks_total", "Queens re-checked by the conflict index.")
+
+
+class ConflictIndex:
+    """
+    Incremental record of which queens on a Board are in conflict.
+
+    Two queens conflict when they share a row, a column or a region, or when
+    they touch (distance 1, orthogonal or diagonal). The queens are kept as a
+    bitset, so placing or removing a queen only re-checks the queens that
+    share a line or region with it or touch it, each with a few bitset
+    operations, instead of comparing every pair of queens on the board.
+
+    The error flags live in `board.errors` (a bitset); `error_count` is the
+    number of queens flagged.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.region_masks = solver.build_region_masks(board.regions, board.size)
+        self.queens = 0
+
+    @property
+    def error_count(self):
+        return self.board.error_count
+
+    def reach(self, cell):
+        """Cells sharing a row, column or region with `cell`, or touching it."""
+        attacks = geometry.board_geometry(self.board.size).attacks
+        return attacks[cell] | self.region_masks[self.board.regions[cell]]
+
+    def refresh(self, cells):
+        """
+        Recompute the error flag of the cells in a bitset.
+
+        Returns:
+            list: The (row, col) cells whose flag changed.
+        """
+        N = self.board.size
+        errors = self.board.errors
+        changed = []
+        if metrics.ENABLED:
+            QUEEN_CHECKS.inc(cells.bit_count())
+        while cells:
+            low = cells & -cells
+            cells ^= low
+            cell = low.bit_length() - 1
+            flag = bool(self.queens & low) and bool(self.queens & ~low & self.reach(cell))
+            if flag != bool(errors & low):
+                errors ^= low
+                changed.append(divmod(cell, N))
+        self.board.errors = errors
+        return changed
+
+    def add_queen(self, row, col):
+        """Record a queen at (row, col); returns the cells whose flag changed."""
+        cell = row * self.board.size + col
+        self.queens |= 1 << cell
+        return self.refresh(self.queens & self.reach(cell))
+
+    def remove_queen(self, row, col):
+        """Forget the queen at (row, col); returns the cells whose flag changed."""
+        cell = row * self.board.size + col
+        self.queens &= ~(1 << cell)
+        return self.refresh((self.queens & self.reach(cell)) | (1 << cell))
+
+# --- Unit Tests ---
+
+class TestConflictIndex(unittest.TestCase):
+    def test_matches_pairwise_scan(self):
+        """Test the index against a pairwise comparison over random moves."""
+        import random
+        from app.models import puzzle
+        from app.models.board import Board
+        N = 8
+        game = puzzle.generate_puzzle(N, unique=False)
+        board = Board(N, game.regions)
+        index = ConflictIndex(board)
+        queens = set()
+        for _ in range(500):
+            r, c = random.randrange(N), random.randrange(N)
+            if (r, c) in queens:
+                queens.discard((r, c))
+                index.remove_queen(r, c)
+            else:
+                queens.add((r, c))
+                index.add_queen(r, c)
+            expected = [[False] * N for _ in range(N)]
+            for r1, c1 in queens:
+                for r2, c2 in queens:
+                    if (r1, c1) != (r2, c2) and (
+                        max(abs(r1 - r2), abs(c1 - c2)) == 1 or r1 == r2 or c1 == c2
+                        or board.region(r1, c1) == board.region(r2, c2)
+                    ):
+                        expected[r1][c1] = True
+            self.assertEqual(board.error_rows(), expected)
+            self.assertEqual(index.error_count, sum(map(sum, expected)))
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
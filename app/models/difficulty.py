@@ -0,0 +1,110 @@
+import unittest
+from collections import Counter, namedtuple
+
+from app.models import hints
+
+# Difficulty bands, easiest first, and the lowest score of each (chosen
+# so that generated puzzles of every size split roughly into quarters)
+BANDS = ("easy", "medium", "hard", "expert")
+BAND_SCORES = (0, 22, 38, 60)
+
+# Score of each deduction rule (see hints.deductions), and of every queen
+# that had to be revealed because no rule applied (a branch in the search)
+RULE_SCORES = {
+    "queen_eliminates": 0,
+    "last_cell": 1,
+    "confined": 2,
+    "empties_unit": 4,
+}
+BRANCH_SCORE = 15
+
+# rules: how often each rule was used; steps: number of deductions;
+# branches: queens that had to be guessed (revealed from the solution)
+Grade = namedtuple("Grade", ["score", "band", "rules", "steps", "branches"])
+
+
+def band_of(score):
+    """Name of the band a score falls in."""
+    band = BANDS[0]
+    for name, lowest in zip(BANDS, BAND_SCORES):
+        if score >= lowest:
+            band = name
+    return band
+
+def grade_puzzle(puzzle):
+    """
+    Grade a puzzle by solving it the way a player would.
+
+    The rules in hints.deductions are applied until they get stuck; each
+    time they do, the solution queen of the first row without one is
+    placed, counting as a branch, and deduction resumes from what was
+    already known. The score adds up the cost of every rule used and of
+    every branch, per 10 queens so that bands mean the same on every size.
+
+    Args:
+        puzzle (Puzzle): The puzzle (its queen_board is the solution).
+
+    Returns:
+        Grade: The score, its band and the effort behind it.
+    """
+    N = puzzle.size
+    rules = Counter()
+    queens, crosses = set(), set()
+    branches = 0
+    while True:
+        for step in hints.deductions(puzzle.regions, N, queens, crosses):
+            cells = {r * N + c for r, c in step.cells}
+            known = queens if step.action == "queen" else crosses
+            if cells <= known:
+                continue  # found again after a branch: no new effort
+            rules[step.rule] += 1
+            known.update(cells)
+        rows = {cell // N for cell in queens}
+        if len(rows) == N:
+            break
+        row = min(set(range(N)) - rows)
+        queens.add(row * N + puzzle.queen_board[row])
+        branches += 1
+    effort = sum(RULE_SCORES[rule] * count for rule, count in rules.items())
+    effort += BRANCH_SCORE * branches
+    score = round(effort * 10 / N)
+    return Grade(score, band_of(score), dict(rules), sum(rules.values()), branches)
+
+def band_index(band):
+    """Position of a band name in BANDS (ValueError if unknown)."""
+    try:
+        return BANDS.index(band)
+    except ValueError:
+        raise ValueError(f"Unknown difficulty: {band!r}") from None
+
+# --- Unit Tests ---
+
+class TestDifficulty(unittest.TestCase):
+    def test_bands(self):
+        """Test that scores map to increasing bands."""
+        self.assertEqual(band_of(0), "easy")
+        self.assertEqual(band_of(BAND_SCORES[-1]), "expert")
+        self.assertEqual(band_index("hard"), 2)
+        with self.assertRaises(ValueError):
+            band_index("trivial")
+
+    def test_grade_puzzle(self):
+        """Test that grading finishes every puzzle and counts its effort."""
+        from app.models import puzzle
+        for N in (4, 8, 12):
+            game = puzzle.generate_puzzle(N, rng=N)
+            grade = grade_puzzle(game)
+            self.assertIn(grade.band, BANDS)
+            self.assertEqual(grade.steps, sum(grade.rules.values()))
+            self.assertGreaterEqual(grade.rules.get("last_cell", 0) + grade.branches, N)
+        # Regions that are the rows: nothing is forced until a queen is
+        # placed, and every branch resumes from what is already known, so
+        # each step is counted once
+        rows = puzzle.Puzzle(5, [0, 2, 4, 1, 3], bytes(r for r in range(5) for _ in range(5)))
+        grade = grade_puzzle(rows)
+        self.assertEqual(grade.branches, 2)
+        self.assertEqual(grade.rules, {"queen_eliminates": 4, "empties_unit": 2, "last_cell": 3})
+        self.assertEqual(grade.steps, 9)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,77 @@
+import unittest
+from collections import namedtuple
+from functools import lru_cache
+
+# Everything about an N x N board that does not depend on the puzzle, built
+# once per size. Cell (r, c) has flat index r * N + c, and bitsets use bit
+# r * N + c for that cell.
+#   coords:         (row, col) of each flat index
+#   neighbors:      flat indices of the orthogonal neighbours of each cell
+#   king_neighbors: flat indices of the (up to 8) cells touching each cell
+#   row_masks, col_masks: bitset of each row and each column
+#   attacks:        for each cell, the bitset of cells a queen there rules
+#                   out whatever the regions: its row, column and king
+#                   neighbourhood (the cell itself included)
+Geometry = namedtuple("Geometry", [
+    "size", "coords", "neighbors", "king_neighbors",
+    "row_masks", "col_masks", "attacks",
+])
+
+
+@lru_cache(maxsize=64)
+def board_geometry(N):
+    """
+    The tables of an N x N board (see Geometry), shared by every caller.
+    
+    Args:
+        N (int): Board size.
+    
+    Returns:
+        Geometry: Read-only tables (tuples) for that size.
+    """
+    coords = tuple((r, c) for r in range(N) for c in range(N))
+    neighbors = tuple(
+        tuple(
+            nr * N + nc
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1))
+            if 0 <= nr < N and 0 <= nc < N
+        )
+        for r, c in coords
+    )
+    king_neighbors = tuple(
+        tuple(
+            nr * N + nc
+            for nr in range(max(0, r - 1), min(N, r + 2))
+            for nc in range(max(0, c - 1), min(N, c + 2))
+            if (nr, nc) != (r, c)
+        )
+        for r, c in coords
+    )
+    row_masks = tuple(((1 << N) - 1) << (r * N) for r in range(N))
+    col_masks = tuple(sum(1 << (r * N + c) for r in range(N)) for c in range(N))
+    attacks = tuple(
+        row_masks[r] | col_masks[c] | (1 << (r * N + c))
+        | sum(1 << nb for nb in king_neighbors[r * N + c])
+        for r, c in coords
+    )
+    return Geometry(N, coords, neighbors, king_neighbors, row_masks, col_masks, attacks)
+
+# --- Unit Tests ---
+
+class TestGeometry(unittest.TestCase):
+    def test_tables(self):
+        """Test the tables of a 4x4 board against their definitions."""
+        geo = board_geometry(4)
+        self.assertIs(board_geometry(4), geo)
+        self.assertEqual(geo.coords[6], (1, 2))
+        self.assertEqual(geo.neighbors[0], (4, 1))
+        self.assertEqual(sorted(geo.neighbors[5]), [1, 4, 6, 9])
+        self.assertEqual(sorted(geo.king_neighbors[0]), [1, 4, 5])
+        self.assertEqual(len(geo.king_neighbors[5]), 8)
+        self.assertEqual(geo.row_masks[1], 0b11110000)
+        self.assertEqual(geo.col_masks[0], 0b0001000100010001)
+        # A queen at (0, 0) rules out row 0, column 0 and (1, 1)
+        self.assertEqual(geo.attacks[0], 0b0001000100111111)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
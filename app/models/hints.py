@@ -0,0 +1,211 @@
+import unittest
+from collections import namedtuple
+
+from app.models import geometry, solver
+
+# One logical deduction: which rule fired, whether the cells must hold a
+# cross or a queen, the (row, col) cells concerned and a short explanation.
+Step = namedtuple("Step", ["rule", "action", "cells", "reason"])
+
+
+def unit_name(u, N):
+    """Readable name of unit u: rows are 0..N-1, columns N..2N-1, then regions."""
+    kind, index = divmod(u, N)
+    return f"{('row', 'column', 'region')[kind]} {index + 1}"
+
+def bit_cells(mask, N):
+    """(row, col) of every bit set in a bitset, in cell order."""
+    cells = []
+    while mask:
+        low = mask & -mask
+        mask ^= low
+        cells.append(divmod(low.bit_length() - 1, N))
+    return cells
+
+def deductions(regions, N, queens=(), ruled_out=()):
+    """
+    Deduce, one step at a time, what the rules force on a board.
+
+    Only the given queens are taken as facts (crosses are the player's own
+    notes and may be wrong). Steps are tried from the simplest rule up, and
+    each yielded step is applied before the next one is searched for:
+      1. queen_eliminates: a queen rules out its row, column, region and
+         king-move neighbours.
+      2. last_cell: a row, column or region with one cell left holds a queen.
+      3. confined: a region whose cells left all lie in one row (or column)
+         rules out the rest of that row, and a row or column whose cells
+         left all lie in one region rules out the rest of that region.
+      4. empties_unit: a cell is ruled out if a queen there would leave
+         some row, column or region without any cell.
+    The generator stops when no rule applies, when every unit has a queen,
+    or when the board turns out to be contradictory.
+
+    Args:
+        regions (bytes): Region index (0 to N-1) of each cell, indexed by r * N + c.
+        N (int): Board size.
+        queens (iterable): Flat indices (r * N + c) of the placed queens.
+        ruled_out (iterable): Flat indices of cells already known to be
+                              empty, e.g. from earlier deductions.
+
+    Yields:
+        Step: The next deduction.
+    """
+    geo = geometry.board_geometry(N)
+    row_masks, col_masks, attacks = geo.row_masks, geo.col_masks, geo.attacks
+    region_masks = solver.build_region_masks(regions, N)
+    unit_masks = row_masks + col_masks + tuple(region_masks)
+    kills = [attacks[cell] | region_masks[regions[cell]] for cell in range(N * N)]
+
+    open_cells = (1 << (N * N)) - 1
+    for cell in ruled_out:
+        open_cells &= ~(1 << cell)
+    filled = set()
+    pending = sorted(queens)
+
+    while True:
+        # 1) Apply the queens placed so far
+        while pending:
+            cell = pending.pop(0)
+            bit = 1 << cell
+            if not open_cells & bit:
+                return  # ruled out by another queen: contradiction
+            filled.update((cell // N, N + cell % N, 2 * N + regions[cell]))
+            ruled_out = open_cells & kills[cell] & ~bit
+            open_cells &= ~ruled_out
+            if ruled_out:
+                r, c = divmod(cell, N)
+                yield Step(
+                    "queen_eliminates", "cross", bit_cells(ruled_out, N),
+                    f"The queen at row {r + 1}, column {c + 1} rules out its "
+                    "row, column, region and neighbours.",
+                )
+
+        open_units = [u for u in range(3 * N) if u not in filled]
+        if not open_units:
+            return
+        available = {u: unit_masks[u] & open_cells for u in open_units}
+        if not all(available.values()):
+            return  # some unit has no cell left: contradiction
+
+        # 2) A unit with a single cell left
+        for u, cells in available.items():
+            if not cells & (cells - 1):
+                cell = cells.bit_length() - 1
+                pending.append(cell)
+                yield Step(
+                    "last_cell", "queen", [divmod(cell, N)],
+                    f"This is the only cell left for the queen of {unit_name(u, N)}.",
+                )
+                break
+        if pending:
+            continue
+
+        # 3) A unit confined to a single line or region
+        step = None
+        for u, cells in available.items():
+            if u >= 2 * N:
+                # Region: confined to one row or one column?
+                r0, c0 = divmod(cells.bit_length() - 1, N)
+                targets = (r0, N + c0)
+            else:
+                # Row or column: confined to one region?
+                targets = (2 * N + regions[cells.bit_length() - 1],)
+            for t in targets:
+                if t in filled or cells & ~unit_masks[t]:
+                    continue
+                ruled_out = available[t] & ~unit_masks[u]
+                if ruled_out:
+                    step = Step(
+                        "confined", "cross", bit_cells(ruled_out, N),
+                        f"The queen of {unit_name(t, N)} must be in "
+                        f"{unit_name(u, N)}, the only place left for it.",
+                    )
+                    break
+            if step:
+                break
+        if step:
+            for r, c in step.cells:
+                open_cells &= ~(1 << (r * N + c))
+            yield step
+            continue
+
+        # 4) A cell that would leave some unit empty
+        candidates = open_cells
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            cell = low.bit_length() - 1
+            blocked = next(
+                (u for u, cells in available.items()
+                 if not cells & ~kills[cell] and not unit_masks[u] >> cell & 1),
+                None,
+            )
+            if blocked is not None:
+                open_cells &= ~(1 << cell)
+                step = Step(
+                    "empties_unit", "cross", [divmod(cell, N)],
+                    f"A queen here would leave no cell for {unit_name(blocked, N)}.",
+                )
+                break
+        if step:
+            yield step
+            continue
+        return
+
+def forced_crosses(regions, N, queens=()):
+    """
+    Every cell that the rules in `deductions` rule out.
+
+    Args:
+        regions (bytes): Region index of each cell, indexed by r * N + c.
+        N (int): Board size.
+        queens (iterable): Flat indices of the placed queens.
+
+    Returns:
+        tuple: (crosses, queens) as sorted lists of (row, col): the cells
+               ruled out and the queens that were forced along the way.
+    """
+    crosses, forced = set(), set()
+    for step in deductions(regions, N, queens):
+        (crosses if step.action == "cross" else forced).update(step.cells)
+    return sorted(crosses - forced), sorted(forced)
+
+# --- Unit Tests ---
+
+class TestDeductions(unittest.TestCase):
+    BOARD = bytes([
+        0, 1, 1, 1,
+        0, 1, 1, 1,
+        2, 2, 3, 3,
+        2, 2, 3, 3,
+    ])
+
+    def test_solves_by_logic(self):
+        """Test that propagation alone solves a unique 4x4 board."""
+        crosses, queens = forced_crosses(self.BOARD, 4)
+        solution = solver.solve(self.BOARD, 4)[0]
+        self.assertEqual(queens, sorted(enumerate(solution)))
+        self.assertEqual(len(crosses), 16 - 4)
+
+    def test_queen_eliminates(self):
+        """Test that the first step after a queen rules out what it attacks."""
+        step = next(deductions(self.BOARD, 4, [1 * 4 + 0]))
+        self.assertEqual(step.rule, "queen_eliminates")
+        self.assertEqual(
+            step.cells, [(0, 0), (0, 1), (1, 1), (1, 2), (1, 3), (2, 0), (2, 1), (3, 0)]
+        )
+
+    def test_steps_are_sound(self):
+        """Test that no step crosses out the solution of generated puzzles."""
+        from app.models import puzzle
+        for N in (6, 9, 15):
+            game = puzzle.generate_puzzle(N, rng=N)
+            solution = set(enumerate(game.queen_board))
+            for step in deductions(game.regions, N):
+                if step.action == "cross":
+                    self.assertFalse(solution & set(step.cells), step)
+                else:
+                    self.assertTrue(solution >= set(step.cells), step)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
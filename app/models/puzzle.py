@@ -0,0 +1,426 @@
+import datetime
+import hashlib
+import unittest
+from collections import namedtuple
+from functools import lru_cache
+from unittest import mock
+
+from app.models import coloring, geometry, queens, solver
+from app.utils import metrics
+from app.utils.helper_functions import make_rng
+
+# A generated puzzle: the queen column for each row, and the region index
+# of every cell as bytes indexed by r * N + c (region i is the one holding
+# the queen of row i).
+Puzzle = namedtuple("Puzzle", ["size", "queen_board", "regions"])
+
+# Node budget for each "does this cell create a second solution?" check.
+# Checks that run out of budget are treated as if they had found one.
+CHECK_NODES = 500
+
+# Budget for growing unique regions around one queen layout, in solver
+# placements per cell (about 0.2 s at 15x15). Most layouts finish well
+# within it; the rare one that keeps clearing and regrowing is dropped for a
+# fresh layout, and after LAYOUT_ATTEMPTS of those the puzzle is grown
+# without the uniqueness checks, so generation time stays bounded.
+LAYOUT_NODES_PER_CELL = 100
+LAYOUT_ATTEMPTS = 6
+
+# Part of every puzzle ID; bump it whenever a change to the generators makes
+# the same seed give a different puzzle, so old IDs are rejected instead of
+# silently resolving to another board.
+GENERATOR_VERSION = 2
+
+GENERATE_SECONDS = metrics.histogram(
+    "puzzle_generate_seconds", "Time to generate a puzzle.")
+UNIQUE_CHECKS = metrics.counter(
+    "puzzle_unique_checks_total", "Solver checks run while growing unique regions.")
+UNIQUE_CLEARS = metrics.counter(
+    "puzzle_unique_clears_total", "Areas cleared and regrown while growing unique regions.")
+UNIQUE_FALLBACKS = metrics.counter(
+    "puzzle_unique_fallbacks_total", "Unique puzzles that ran out of layouts and were grown unchecked.")
+
+
+def grow_unique_regions(queen_board, N, rng=None, budget=None):
+    """
+    Grow N connected regions around the queens, keeping the queen layout the
+    only solution at every step.
+    
+    Regions start as the queen cells. Cells that are not part of any region
+    yet cannot hold a queen, so at the start the layout is trivially the only
+    solution. A cell may then join a neighbouring region only if the solver
+    proves that no solution puts that region's queen on it; since regions only
+    grow, a refused (region, cell) pair stays refused. The most constrained
+    cells (fewest regions left to join) are filled first.
+    
+    If some cells can no longer join any region, the area around one of them
+    is cleared (regrown), with a radius that widens each time this happens,
+    and growth resumes.
+    
+    Args:
+        queen_board (list): The intended solution (queen column per row).
+        N (int): Board size.
+        rng: random.Random or seed to draw from (see make_rng).
+        budget (int): Give up after trying this many queen placements in
+                      the solver checks, or None to go on until done.
+    
+    Returns:
+        bytearray: Region index (queen row) of every cell, indexed by r * N + c,
+                   or None if the budget ran out.
+    """
+    rng = make_rng(rng)
+    neighbors = geometry.board_geometry(N).neighbors
+    queen_cells = {r * N + c for r, c in enumerate(queen_board)}
+    cell_region = [-1] * (N * N)
+    region_masks = [0] * N
+    unassigned = set(range(N * N)) - queen_cells
+    for r, c in enumerate(queen_board):
+        cell_region[r * N + c] = r
+        region_masks[r] |= 1 << (r * N + c)
+    unassigned_mask = sum(1 << cell for cell in unassigned)
+    refused = set()
+    clears = 0
+    checks = 0
+    nodes = [0]   # queen placements tried by the solver checks
+
+    def release(cell):
+        nonlocal unassigned_mask
+        region_masks[cell_region[cell]] ^= 1 << cell
+        cell_region[cell] = -1
+        unassigned.add(cell)
+        unassigned_mask |= 1 << cell
+
+    while unassigned:
+        if budget is not None and nodes[0] > budget:
+            UNIQUE_CHECKS.inc(checks, size=N)
+            UNIQUE_CLEARS.inc(clears, size=N)
+            return None
+        options = {}
+        for cell in unassigned:
+            joinable = {
+                cell_region[nb] for nb in neighbors[cell]
+                if cell_region[nb] != -1 and (cell_region[nb], cell) not in refused
+            }
+            if joinable:
+                options[cell] = joinable
+
+        if not options:
+            # Stuck: clear the area around a cell that cannot join any region
+            clears += 1
+            radius = 2 + clears // (2 * N)
+            r0, c0 = divmod(rng.choice(sorted(unassigned)), N)
+            for r in range(max(0, r0 - radius), min(N, r0 + radius + 1)):
+                for c in range(max(0, c0 - radius), min(N, c0 + radius + 1)):
+                    if cell_region[r * N + c] != -1 and r * N + c not in queen_cells:
+                        release(r * N + c)
+            # Drop the parts of each region that got cut off from its queen
+            for k, col in enumerate(queen_board):
+                seen = {k * N + col}
+                stack = [k * N + col]
+                while stack:
+                    for nb in neighbors[stack.pop()]:
+                        if cell_region[nb] == k and nb not in seen:
+                            seen.add(nb)
+                            stack.append(nb)
+                for cell in range(N * N):
+                    if cell_region[cell] == k and cell not in seen:
+                        release(cell)
+            # Shrinking regions can only remove solutions, so retry every pair
+            refused.clear()
+            continue
+
+        fewest = min(len(joinable) for joinable in options.values())
+        cell = rng.choice([c for c, joinable in options.items() if len(joinable) == fewest])
+        k = rng.choice(sorted(options[cell]))
+
+        region_masks[k] |= 1 << cell
+        cell_region[cell] = k
+        # Any new solution must put region k's queen on the new cell
+        checks += 1
+        other = solver.search(
+            N, region_masks, cell_region, limit=1,
+            blocked=unassigned_mask & ~(1 << cell), placed=[cell],
+            max_nodes=CHECK_NODES, nodes=nodes,
+        )
+        if other is None or other:
+            region_masks[k] ^= 1 << cell
+            cell_region[cell] = -1
+            refused.add((k, cell))
+        else:
+            unassigned.discard(cell)
+            unassigned_mask ^= 1 << cell
+
+    UNIQUE_CHECKS.inc(checks, size=N)
+    UNIQUE_CLEARS.inc(clears, size=N)
+    return bytearray(cell_region)
+
+def generate_puzzle(N, unique=True, rng=None):
+    """
+    Generate a puzzle: a random queen layout and regions grown around it.
+    
+    Args:
+        N (int): Board size.
+        unique (bool): If True, grow the regions with grow_unique_regions so
+                       that the queen layout is the only solution, drawing a
+                       fresh layout whenever one runs out of its node budget
+                       (after LAYOUT_ATTEMPTS layouts, the last one is grown
+                       unchecked). Otherwise use the unconstrained
+                       coloring.grow_regions.
+        rng: random.Random or seed to draw from (see make_rng). The layout
+             and the regions are drawn from the same generator, so a seed
+             always gives the same puzzle.
+    
+    Returns:
+        Puzzle: The generated puzzle.
+    """
+    rng = make_rng(rng)
+    with GENERATE_SECONDS.time(size=N, unique=unique):
+        queen_board = queens.generate_random_board(N, rng)
+        regions = None
+        if unique:
+            for attempt in range(LAYOUT_ATTEMPTS):
+                if attempt:
+                    queen_board = queens.generate_random_board(N, rng)
+                regions = grow_unique_regions(
+                    queen_board, N, rng, budget=LAYOUT_NODES_PER_CELL * N * N)
+                if regions is not None:
+                    break
+            else:
+                UNIQUE_FALLBACKS.inc(size=N)
+        if regions is None:
+            regions = coloring.grow_regions(queen_board, N, rng)
+    return Puzzle(N, queen_board, bytes(regions))
+
+def puzzle_id(N, seed):
+    """
+    Stable ID of the unique-solution puzzle generated from a seed.
+    
+    Args:
+        N (int): Board size.
+        seed (int): Non-negative generation seed.
+    
+    Returns:
+        str: An ID like 'q2-8-00000000000004d2' (generator version, size, seed).
+    """
+    if seed < 0:
+        raise ValueError("Puzzle seeds must be non-negative")
+    return f"q{GENERATOR_VERSION}-{N}-{seed:016x}"
+
+def parse_puzzle_id(puzzle_id):
+    """
+    Split a puzzle ID written by puzzle_id.
+    
+    Args:
+        puzzle_id (str): The ID.
+    
+    Returns:
+        tuple: (N, seed)
+    
+    Raises:
+        ValueError: If the ID is malformed or from another generator version.
+    """
+    try:
+        version, size, seed = puzzle_id.split("-")
+        if version != f"q{GENERATOR_VERSION}":
+            raise ValueError
+        return int(size), int(seed, 16)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Unknown puzzle ID: {puzzle_id!r}") from None
+
+def daily_seed(day=None):
+    """
+    Seed shared by everyone playing on the given day.
+    
+    Args:
+        day (datetime.date): The day (UTC today by default).
+    
+    Returns:
+        int: A 64-bit seed.
+    """
+    day = day or datetime.datetime.now(datetime.timezone.utc).date()
+    digest = hashlib.sha256(f"daily:{day.isoformat()}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+@lru_cache(maxsize=256)
+def puzzle_from_id(puzzle_id):
+    """
+    The puzzle an ID stands for, regenerated from its seed and memoized, so
+    a shared or daily puzzle is only generated once per process.
+    
+    Args:
+        puzzle_id (str): ID written by puzzle_id.
+    
+    Returns:
+        Puzzle: The puzzle (shared between callers, do not modify it).
+    """
+    N, seed = parse_puzzle_id(puzzle_id)
+    return generate_puzzle(N, unique=True, rng=seed)
+
+def check_puzzle(puzzle, unique=True):
+    """
+    Verify a generated puzzle, e.g. before writing it to a catalog.
+    
+    Args:
+        puzzle (Puzzle): The puzzle to check.
+        unique (bool): Also require the queen layout to be the only solution.
+    
+    Raises:
+        ValueError: Describing the first rule the puzzle breaks.
+    """
+    N = puzzle.size
+    board = list(puzzle.queen_board)
+    if sorted(board) != list(range(N)):
+        raise ValueError("Queens must use every row and column once")
+    if any(abs(board[r] - board[r - 1]) == 1 for r in range(1, N)):
+        raise ValueError("Queens in consecutive rows touch diagonally")
+    if len(puzzle.regions) != N * N or any(k >= N for k in puzzle.regions):
+        raise ValueError("Regions must hold one index below N per cell")
+    for k, col in enumerate(board):
+        if puzzle.regions[k * N + col] != k:
+            raise ValueError(f"Region {k} does not hold the queen of row {k}")
+        neighbors = geometry.board_geometry(N).neighbors
+        seen = {k * N + col}
+        stack = [k * N + col]
+        while stack:
+            for nb in neighbors[stack.pop()]:
+                if puzzle.regions[nb] == k and nb not in seen:
+                    seen.add(nb)
+                    stack.append(nb)
+        if len(seen) != puzzle.regions.count(k):
+            raise ValueError(f"Region {k} is not connected")
+    if unique and solver.solve(puzzle.regions, N) != [board]:
+        raise ValueError("The queen layout is not the only solution")
+
+def record_size(N):
+    """
+    Number of bytes used by encode_puzzle for a board of size N.
+    
+    Args:
+        N (int): Board size.
+    
+    Returns:
+        int: 1 byte for N, N bytes of queen columns and N * N region indices.
+    """
+    return 1 + N + N * N
+
+def encode_puzzle(puzzle):
+    """
+    Pack a puzzle into a compact byte string (see record_size).
+    
+    Args:
+        puzzle (Puzzle): The puzzle to encode (size up to 255).
+    
+    Returns:
+        bytes: The encoded puzzle.
+    """
+    return (
+        bytes([puzzle.size])
+        + bytes(puzzle.queen_board)
+        + bytes(puzzle.regions)
+    )
+
+def decode_puzzle(data, offset=0):
+    """
+    Unpack a puzzle written by encode_puzzle.
+    
+    Args:
+        data (bytes): Buffer holding the encoded puzzle.
+        offset (int): Position of the puzzle in the buffer.
+    
+    Returns:
+        Puzzle: The decoded puzzle.
+    """
+    N = data[offset]
+    start = offset + 1 + N
+    if start + N * N > len(data):
+        raise ValueError("Truncated puzzle record")
+    queen_board = list(data[offset + 1:start])
+    return Puzzle(N, queen_board, bytes(data[start:start + N * N]))
+
+# --- Unit Tests ---
+
+class TestPuzzleGeneration(unittest.TestCase):
+    def test_unique_solution(self):
+        """Test that generated puzzles have the queen layout as only solution."""
+        for N in (1, 4, 5, 8, 12, 15):
+            puzzle = generate_puzzle(N)
+            self.assertEqual(solver.solve(puzzle.regions, N), [puzzle.queen_board])
+
+    def test_seeded_puzzle_ids(self):
+        """Test that a puzzle ID always resolves to the same puzzle."""
+        pid = puzzle_id(8, 1234)
+        self.assertEqual(parse_puzzle_id(pid), (8, 1234))
+        game = puzzle_from_id(pid)
+        self.assertIs(puzzle_from_id(pid), game)
+        self.assertEqual(generate_puzzle(8, rng=1234), game)
+        self.assertEqual(solver.solve(game.regions, 8), [game.queen_board])
+        for bad in ("q0-8-04d2", "8-1234", "q1-x-04d2", None):
+            with self.assertRaises(ValueError):
+                parse_puzzle_id(bad)
+        day = datetime.date(2026, 1, 1)
+        self.assertEqual(daily_seed(day), daily_seed(day))
+
+    def test_check_puzzle(self):
+        """Test that check_puzzle accepts generated puzzles and rejects broken ones."""
+        game = generate_puzzle(6, rng=5)
+        check_puzzle(game)
+        check_puzzle(generate_puzzle(6, unique=False, rng=5), unique=False)
+        swapped = list(game.queen_board)
+        swapped[0], swapped[1] = swapped[1], swapped[0]
+        rows = bytes(r for r in range(6) for _ in range(6))
+        for broken in (game._replace(queen_board=swapped), game._replace(regions=rows)):
+            with self.assertRaises(ValueError):
+                check_puzzle(broken)
+
+    def test_encoding_round_trip(self):
+        """Test that a puzzle survives encode_puzzle / decode_puzzle."""
+        puzzle = generate_puzzle(6)
+        data = b"xx" + encode_puzzle(puzzle)
+        self.assertEqual(len(data), 2 + record_size(6))
+        self.assertEqual(decode_puzzle(data, 2), puzzle)
+        with self.assertRaises(ValueError):
+            decode_puzzle(data[:-1], 2)
+
+    def test_regions_are_connected(self):
+        """Test that every region holds its queen and is one connected area."""
+        N = 10
+        puzzle = generate_puzzle(N)
+        for k, col in enumerate(puzzle.queen_board):
+            self.assertEqual(puzzle.regions[k * N + col], k)
+            cells = {(r, c) for r in range(N) for c in range(N) if puzzle.regions[r * N + c] == k}
+            seen = {(k, col)}
+            stack = [(k, col)]
+            while stack:
+                for nb in coloring.get_neighbors(*stack.pop(), N):
+                    if nb in cells and nb not in seen:
+                        seen.add(nb)
+                        stack.append(nb)
+            self.assertEqual(seen, cells)
+
+    def test_generation_budget(self):
+        """Test that the solver work of a 15x15 puzzle is bounded, with a fallback."""
+        N = 15
+        search = solver.search
+        worst = 0
+        for seed in range(5):
+            nodes = [0]
+            def counting(*args, **kwargs):
+                kwargs["nodes"] = [0]
+                try:
+                    return search(*args, **kwargs)
+                finally:
+                    nodes[0] += kwargs["nodes"][0]
+            with mock.patch.object(solver, "search", counting):
+                game = generate_puzzle(N, rng=seed)
+            check_puzzle(game, unique=False)
+            worst = max(worst, nodes[0])
+        # Each layout stops at most one check past its budget
+        per_layout = LAYOUT_NODES_PER_CELL * N * N + CHECK_NODES
+        self.assertLessEqual(worst, LAYOUT_ATTEMPTS * per_layout)
+        # Out of layouts, the puzzle is grown without the checks
+        with mock.patch.dict(globals(), LAYOUT_NODES_PER_CELL=0):
+            game = generate_puzzle(N, rng=1)
+        check_puzzle(game, unique=False)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
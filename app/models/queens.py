@@ -1,6 +1,15 @@
 import random
+import time
 import unittest
 
+from app.utils import metrics
+from app.utils.helper_functions import make_rng
+
+GENERATE_SECONDS = metrics.histogram(
+    "queens_board_generate_seconds", "Time to generate a queen layout.")
+DEAD_ENDS = metrics.counter(
+    "queens_board_dead_ends_total", "Rows undone by the queen layout backtracking.")
+
 
 def get_allowed_columns(row, board, used_columns, N):
     """
@@ -32,20 +41,24 @@ def get_allowed_columns(row, board, used_columns, N):
     
     return list(allowed)
 
-def generate_random_board(N):
+def generate_random_board(N, rng=None):
     """
     Generate a board with N queens on an N x N matrix.
     Each queen is placed such that:
       - There is exactly one queen per row and per column.
       - No queen is placed in an immediately diagonal cell relative to the queen in the previous row.
     
-    The board is generated row by row. For row 0, a random column is chosen.
-    For each subsequent row, a random column is chosen from the allowed columns.
-    If at any row no allowed column exists, the board generation is restarted.
+    The board is generated row by row with a randomized backtracking search.
+    Used columns, the columns diagonally adjacent to the previous queen and the
+    columns already tried in the current row are tracked as integer bitmasks,
+    and a random free column is drawn until one passes the mask. A dead end only
+    undoes the choice made in the previous row instead of restarting the board.
     
     Args:
         N (int): Size of the board (N x N). 
                  Valid values: N == 1 or N >= 4. (No valid board exists for N=2 or N=3)
+        rng: random.Random or seed to draw from (see make_rng); the same
+             seed always gives the same board. Defaults to the random module.
     
     Returns:
         list: A list of integers where each integer represents the column position of the queen for that row.
@@ -56,22 +69,52 @@ def generate_random_board(N):
     if N != 1 and N < 4:
         raise ValueError(f"No valid board exists for N = {N} with immediate diagonal constraints")
     
-    while True:
-        board = []           # List to store the column index for each row's queen
-        used_columns = set() # Set to track columns that are already occupied
-        valid = True
+    rng = make_rng(rng)
+    start = time.perf_counter() if metrics.ENABLED else 0
+    dead_ends = 0
+    full = (1 << N) - 1
+    board = []              # Column index chosen for each row so far
+    free = list(range(N))   # Columns not used yet, in no particular order
+    used = 0                # Bitmask of columns already occupied
+    tried = [0]             # Bitmask of columns attempted, per open row
+    
+    while tried:
+        blocked = used | tried[-1]
+        if board:
+            # Remove the columns immediately diagonal to the previous queen
+            last_col = board[-1]
+            blocked |= ((1 << last_col) >> 1) | (1 << (last_col + 1))
+        
+        if blocked & full == full:
+            # Dead end: drop this row and undo the choice made in the previous one
+            dead_ends += 1
+            tried.pop()
+            if board:
+                chosen = board.pop()
+                used &= ~(1 << chosen)
+                free.append(chosen)
+            continue
         
-        for row in range(N):
-            allowed = get_allowed_columns(row, board, used_columns, N)
-            if not allowed:
-                valid = False
-                break  # Restart board generation if no allowed column exists in this row
-            chosen = random.choice(allowed)
-            board.append(chosen)
-            used_columns.add(chosen)
+        # At least one free column is allowed, so this draw terminates
+        while True:
+            i = rng.randrange(len(free))
+            chosen = free[i]
+            if not (blocked >> chosen) & 1:
+                break
         
-        if valid:
+        tried[-1] |= 1 << chosen
+        free[i] = free[-1]
+        free.pop()
+        board.append(chosen)
+        used |= 1 << chosen
+        if len(board) == N:
+            if metrics.ENABLED:
+                DEAD_ENDS.inc(dead_ends, size=N)
+                GENERATE_SECONDS.observe(time.perf_counter() - start, size=N)
             return board
+        tried.append(0)
+    
+    raise ValueError(f"No valid board exists for N = {N}")
 
 def board_to_matrix(board, N):
     """
@@ -126,6 +169,20 @@ class TestQueensGeneration(unittest.TestCase):
             self.assertNotEqual(current, prev - 1)
             self.assertNotEqual(current, prev + 1)
 
+    def test_large_boards(self):
+        """Test that boards up to N = 50 respect all the placement rules."""
+        for N in (4, 5, 15, 30, 50):
+            board = generate_random_board(N)
+            self.assertEqual(sorted(board), list(range(N)))
+            for i in range(1, N):
+                self.assertNotEqual(abs(board[i] - board[i - 1]), 1)
+
+    def test_seeded_board(self):
+        """Test that a seed or a seeded random.Random reproduces the board."""
+        board = generate_random_board(12, rng=42)
+        self.assertEqual(generate_random_board(12, rng=random.Random(42)), board)
+        self.assertEqual(generate_random_board(12, rng=42), board)
+
     def test_single_cell_board(self):
         """Test that the board for N = 1 is correctly generated."""
         N = 1
@@ -0,0 +1,192 @@
+import unittest
+
+from app.models import geometry
+
+
+class SearchLimitReached(Exception):
+    """Raised inside search when the node budget runs out."""
+
+
+def line_masks(N):
+    """
+    Bitsets of the rows and columns of an N x N board. Cell (r, c) is bit r * N + c.
+    
+    Args:
+        N (int): Board size.
+    
+    Returns:
+        tuple: (row_masks, col_masks), one bitset per row and per column.
+    """
+    geo = geometry.board_geometry(N)
+    return geo.row_masks, geo.col_masks
+
+def attack_masks(N):
+    """
+    For each cell, the bitset of cells a queen there rules out regardless of
+    the regions: its row, its column and its king-move neighbours.
+    
+    Args:
+        N (int): Board size.
+    
+    Returns:
+        tuple: One bitset per cell, indexed by r * N + c.
+    """
+    return geometry.board_geometry(N).attacks
+
+def build_region_masks(regions, N):
+    """
+    Convert the region index of every cell into one bitset per region.
+    
+    Args:
+        regions (bytes): Region index (0 to N-1) of each cell, indexed by r * N + c.
+        N (int): Board size.
+    
+    Returns:
+        list: N bitsets, one per region.
+    """
+    masks = [0] * N
+    for cell, k in enumerate(regions):
+        masks[k] |= 1 << cell
+    return masks
+
+def search(N, region_masks, cell_region, limit=2, blocked=0, placed=(), max_nodes=None,
+           nodes=None):
+    """
+    Find solutions given the regions as bitsets: one queen per row, column and
+    region, with no two queens touching (king-move adjacency).
+    
+    Rows, columns and regions are all treated as groups that need exactly one
+    queen. The search always branches on the open group with the fewest cells
+    still available (most constrained first), fails as soon as any group has
+    none left, and stops once `limit` solutions have been found.
+    
+    Args:
+        N (int): Board size.
+        region_masks (list): N bitsets, one per region.
+        cell_region (list): Region index of each cell (r * N + c).
+        limit (int): Maximum number of solutions to collect.
+        blocked (int): Bitset of cells that may not hold a queen.
+        placed (iterable): Cells that already hold a queen.
+        max_nodes (int): Give up after trying this many queen placements.
+        nodes (list): If given, nodes[0] is increased by the number of queen
+                      placements tried (for callers with a budget of their own).
+    
+    Returns:
+        list: Up to `limit` solutions, each a list with the queen column per row,
+              or None if `max_nodes` was reached first.
+    """
+    row_masks, col_masks = line_masks(N)
+    attacks = attack_masks(N)
+    unit_masks = row_masks + col_masks + tuple(region_masks)
+    placed = list(placed)
+    filled = set()
+    for cell in placed:
+        blocked |= attacks[cell] | region_masks[cell_region[cell]]
+        filled.update((cell // N, N + cell % N, 2 * N + cell_region[cell]))
+    solutions = []
+    budget = [max_nodes if max_nodes is not None else -1]
+
+    def branch(blocked, open_units):
+        if not open_units:
+            board = [0] * N
+            for cell in placed:
+                board[cell // N] = cell % N
+            solutions.append(board)
+            return len(solutions) >= limit
+
+        best_count = N + 1
+        for u in open_units:
+            count = (unit_masks[u] & ~blocked).bit_count()
+            if count < best_count:
+                if not count:
+                    return False
+                best, best_count = u, count
+                if count == 1:
+                    break
+
+        available = unit_masks[best] & ~blocked
+        while available:
+            low = available & -available
+            available ^= low
+            cell = low.bit_length() - 1
+            budget[0] -= 1
+            if not budget[0]:
+                raise SearchLimitReached
+            region = cell_region[cell]
+            units = (cell // N, N + cell % N, 2 * N + region)
+            placed.append(cell)
+            done = branch(
+                blocked | attacks[cell] | region_masks[region],
+                [u for u in open_units if u not in units],
+            )
+            placed.pop()
+            if done:
+                return True
+        return False
+
+    try:
+        branch(blocked, [u for u in range(3 * N) if u not in filled])
+    except SearchLimitReached:
+        return None
+    finally:
+        if nodes is not None:
+            start = max_nodes if max_nodes is not None else -1
+            nodes[0] += start - budget[0]
+    return solutions
+
+def solve(regions, N, limit=2):
+    """
+    Find solutions of a colored board: one queen per row, column and region,
+    with no two queens touching (king-move adjacency).
+    
+    Args:
+        regions (bytes): Region index (0 to N-1) of each cell, indexed by r * N + c.
+        N (int): Board size.
+        limit (int): Maximum number of solutions to collect.
+    
+    Returns:
+        list: Up to `limit` solutions, each a list with the queen column per row.
+    """
+    return search(N, build_region_masks(regions, N), regions, limit)
+
+def count_solutions(regions, N, limit=2):
+    """
+    Count the solutions of a colored board, stopping at `limit`.
+    
+    Args:
+        regions (bytes): Region index (0 to N-1) of each cell, indexed by r * N + c.
+        N (int): Board size.
+        limit (int): Value at which counting stops.
+    
+    Returns:
+        int: Number of solutions, capped at `limit`.
+    """
+    return len(solve(regions, N, limit))
+
+# --- Unit Tests ---
+
+class TestSolver(unittest.TestCase):
+    def test_rows_as_regions(self):
+        """Test that a board whose regions are its rows has many solutions."""
+        N = 5
+        regions = bytes(r for r in range(N) for _ in range(N))
+        self.assertEqual(count_solutions(regions, N, limit=100), 14)
+        self.assertEqual(count_solutions(regions, N), 2)
+
+    def test_unique_board(self):
+        """Test a hand-made 4x4 board with exactly one solution."""
+        regions = bytes([
+            0, 1, 1, 1,
+            0, 1, 1, 1,
+            2, 2, 3, 3,
+            2, 2, 3, 3,
+        ])
+        solutions = solve(regions, 4, limit=10)
+        self.assertEqual(len(solutions), 1)
+        board = solutions[0]
+        for r in range(1, 4):
+            self.assertNotEqual(abs(board[r] - board[r - 1]), 1)
+        self.assertEqual(sorted(board), [0, 1, 2, 3])
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
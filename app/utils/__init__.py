@@ -1,2 +1,2 @@
-from .color_utils import generate_distinct_colors, rgb_distance, is_color_distinct, random_color, hsv_to_rgb
+from .color_utils import generate_distinct_colors, rgb_distance, is_color_distinct, random_color, hsv_to_rgb, rgb_to_hex
 
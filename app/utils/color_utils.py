@@ -57,6 +57,18 @@ def hsv_to_rgb(h, s, v):
     rgb = colorsys.hsv_to_rgb(h / 360.0, s, v)
     return (int(rgb[0] * 255), int(rgb[1] * 255), int(rgb[2] * 255))
 
+def rgb_to_hex(color):
+    """
+    Format an RGB color as a CSS hex string.
+    
+    Args:
+        color (tuple): (R, G, B) values between 0 and 255.
+    
+    Returns:
+        str: The color as '#rrggbb'.
+    """
+    return '#{:02x}{:02x}{:02x}'.format(color[0], color[1], color[2])
+
 def generate_distinct_colors(n):
     """
     Generate n distinct colors using evenly spaced hues.
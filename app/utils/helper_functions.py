@@ -1 +1,22 @@
 # Otras funciones de utilidad (cálculos de distancias, manejo de errores, etc.)
+import random
+
+
+def make_rng(rng=None):
+    """
+    Source of randomness for the generators.
+    
+    Args:
+        rng: None to use the global random module, a random.Random instance,
+             or a seed (int or str) for a new random.Random.
+    
+    Returns:
+        random.Random or module: An object with randrange / choice.
+    """
+    if rng is None or rng is random:
+        return random
+    if isinstance(rng, random.Random):
+        return rng
+    if isinstance(rng, (int, str)):
+        return random.Random(rng)
+    raise TypeError(f"Expected a random.Random or a seed, got {type(rng).__name__}")
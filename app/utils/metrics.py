@@ -0,0 +1,237 @@
+# Counters and latency histograms for the hot paths, in Prometheus text format
+import bisect
+import cProfile
+import heapq
+import io
+import os
+import pstats
+import threading
+import time
+import unittest
+from contextlib import contextmanager, nullcontext
+
+# Off unless QUEENS_METRICS is set: every recording call then returns at once
+ENABLED = os.environ.get("QUEENS_METRICS", "") not in ("", "0")
+
+# Default histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+_lock = threading.Lock()
+_metrics = {}   # name -> Counter or Histogram, in registration order
+
+
+def enable(on=True):
+    """Turn recording on or off (e.g. from tests)."""
+    global ENABLED
+    ENABLED = on
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+
+    def inc(self, value=1, **labels):
+        if not ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def render(self):
+        for key, value in self.values.items():
+            yield f"{self.name}{_label_text(key)} {value}"
+
+
+class Histogram:
+    """Observations counted in cumulative buckets, with their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.values = {}   # label set -> [count per bucket (+Inf last), sum]
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def time(self, **labels):
+        """Context manager observing the seconds spent inside it."""
+        if not ENABLED:
+            return nullcontext()
+        return self._timer(labels)
+
+    @contextmanager
+    def _timer(self, labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = key + (("le", bound),)
+                yield f"{self.name}_bucket{_label_text(labels)} {cumulative}"
+            yield f"{self.name}_sum{_label_text(key)} {total}"
+            yield f"{self.name}_count{_label_text(key)} {cumulative}"
+
+
+def _register(metric):
+    with _lock:
+        return _metrics.setdefault(metric.name, metric)
+
+def counter(name, help):
+    """Get or create the counter `name`."""
+    return _register(Counter(name, help))
+
+def histogram(name, help, buckets=LATENCY_BUCKETS):
+    """Get or create the histogram `name`."""
+    return _register(Histogram(name, help, buckets))
+
+def render():
+    """Every metric with at least one value, in Prometheus text format."""
+    lines = []
+    with _lock:
+        for metric in _metrics.values():
+            if metric.values:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def reset():
+    """Drop every recorded value (the metrics stay registered)."""
+    with _lock:
+        for metric in _metrics.values():
+            metric.values.clear()
+
+
+class SlowestProfiles:
+    """
+    Keeps the cProfile stats of the `keep` slowest profiled calls.
+
+    Only one call is profiled at a time (the profiler hooks are global in
+    recent Pythons); calls that overlap with it simply run unprofiled.
+    Every start() that returns a token must reach stop(), even when the
+    call fails (e.g. from a teardown hook or a finally block), or profiling
+    stays busy for good.
+    """
+
+    def __init__(self, keep=10, lines=30):
+        self.keep = keep
+        self.lines = lines
+        self._busy = threading.Lock()
+        self._slowest = []   # min-heap of (seconds, sequence, label, stats text)
+        self._sequence = 0
+
+    def start(self):
+        """Start profiling the current call; returns a token for stop(), or None."""
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile, time.perf_counter()
+
+    def stop(self, token, label):
+        """Stop profiling a call started with start() and keep it if it is slow enough."""
+        if token is None:
+            return
+        profile, start = token
+        try:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+        finally:
+            self._busy.release()
+        with _lock:
+            if len(self._slowest) >= self.keep and elapsed <= self._slowest[0][0]:
+                return
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(self.lines)
+        with _lock:
+            self._sequence += 1
+            entry = (elapsed, self._sequence, label, out.getvalue())
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    def report(self):
+        """The kept profiles as text, slowest first."""
+        with _lock:
+            entries = sorted(self._slowest, reverse=True)
+        return "\n".join(
+            f"==== {label}: {elapsed * 1000:.1f} ms ====\n{text}"
+            for elapsed, _, label, text in entries
+        )
+
+# --- Unit Tests ---
+
+class TestMetrics(unittest.TestCase):
+    def tearDown(self):
+        enable(False)
+        reset()
+
+    def test_disabled_records_nothing(self):
+        """Test that nothing is recorded while metrics are disabled."""
+        enable(False)
+        hits = counter("test_hits_total", "Hits.")
+        hits.inc(route="/")
+        with histogram("test_seconds", "Time.").time():
+            pass
+        self.assertEqual(hits.values, {})
+        self.assertEqual(render(), "\n")
+
+    def test_prometheus_text(self):
+        """Test counters and histograms in Prometheus text format."""
+        enable()
+        counter("test_hits_total", "Hits.").inc(route="/")
+        counter("test_hits_total", "Hits.").inc(2, route="/")
+        sizes = histogram("test_bytes", "Sizes.", buckets=(10, 100))
+        for value in (5, 50, 500):
+            sizes.observe(value, route="/")
+        text = render()
+        self.assertIn('# TYPE test_hits_total counter\ntest_hits_total{route="/"} 3\n', text)
+        self.assertIn('test_bytes_bucket{route="/",le="10"} 1\n', text)
+        self.assertIn('test_bytes_bucket{route="/",le="100"} 2\n', text)
+        self.assertIn('test_bytes_bucket{route="/",le="+Inf"} 3\n', text)
+        self.assertIn('test_bytes_sum{route="/"} 555\n', text)
+        self.assertIn('test_bytes_count{route="/"} 3\n', text)
+
+    def test_slowest_profiles(self):
+        """Test that only the slowest profiled calls are kept."""
+        profiles = SlowestProfiles(keep=2)
+        for label, seconds in (("a", 0.001), ("b", 0.02), ("c", 0.01)):
+            token = profiles.start()
+            self.assertIsNone(profiles.start())
+            time.sleep(seconds)
+            profiles.stop(token, label)
+        report = profiles.report()
+        self.assertLess(report.index("==== b"), report.index("==== c"))
+        self.assertNotIn("==== a", report)
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
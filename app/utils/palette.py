@@ -0,0 +1,185 @@
+# Region palettes picked for perceptual distance (CIELAB, ΔE), memoized
+import unittest
+from functools import lru_cache
+
+from app.utils import color_utils
+
+try:
+    import numpy as np
+except ImportError:   # optional: distance matrices are then built in Python
+    np = None
+
+# Candidate colors: hues every 10 degrees at a few saturation / value
+# levels, light enough for the queen and cross icons to stay readable
+CANDIDATE_LEVELS = ((0.35, 1.0), (0.55, 1.0), (0.75, 0.95), (0.6, 0.8))
+MIN_LIGHTNESS = 50
+
+
+def srgb_to_lab(color):
+    """
+    Convert an sRGB color to CIELAB (D65 white point).
+
+    Args:
+        color (tuple): (R, G, B) values between 0 and 255.
+
+    Returns:
+        tuple: (L, a, b).
+    """
+    def linear(value):
+        value /= 255
+        return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+    r, g, b = (linear(value) for value in color)
+    x = (0.4124564 * r + 0.3575761 * g + 0.1804375 * b) / 0.95047
+    y = 0.2126729 * r + 0.7151522 * g + 0.0721750 * b
+    z = (0.0193339 * r + 0.1191920 * g + 0.9503041 * b) / 1.08883
+
+    def f(t):
+        return t ** (1 / 3) if t > 216 / 24389 else (24389 / 27 * t + 16) / 116
+
+    fx, fy, fz = f(x), f(y), f(z)
+    return (116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz))
+
+def delta_e(lab1, lab2):
+    """CIE76 color difference: Euclidean distance in CIELAB."""
+    return ((lab1[0] - lab2[0]) ** 2 + (lab1[1] - lab2[1]) ** 2 + (lab1[2] - lab2[2]) ** 2) ** 0.5
+
+def delta_e_matrix(labs):
+    """
+    ΔE between every pair of colors, vectorized with NumPy when installed.
+
+    Args:
+        labs (list): (L, a, b) colors.
+
+    Returns:
+        list: len(labs) x len(labs) nested list of distances.
+    """
+    if np is not None:
+        points = np.asarray(labs, dtype=float)
+        diff = points[:, None, :] - points[None, :, :]
+        return np.sqrt((diff * diff).sum(axis=2)).tolist()
+    return [[delta_e(p, q) for q in labs] for p in labs]
+
+@lru_cache(maxsize=1)
+def candidates():
+    """The candidate colors as ((R, G, B), (L, a, b)) pairs, built once."""
+    pairs = []
+    for s, v in CANDIDATE_LEVELS:
+        for hue in range(0, 360, 10):
+            color = color_utils.hsv_to_rgb(hue, s, v)
+            lab = srgb_to_lab(color)
+            if lab[0] >= MIN_LIGHTNESS:
+                pairs.append((color, lab))
+    return tuple(pairs)
+
+@lru_cache(maxsize=1)
+def color_order():
+    """
+    Every candidate, ordered by greedy farthest-point selection in CIELAB:
+    each color is the one farthest (largest ΔE) from all those before it.
+    Any prefix is then a well spread palette, so palette(N) is the first N.
+    """
+    pairs = candidates()
+    distances = delta_e_matrix([lab for _, lab in pairs])
+    # Start from the most saturated color: the farthest from all the others on average
+    first = max(range(len(pairs)), key=lambda i: sum(distances[i]))
+    order = [first]
+    nearest = list(distances[first])
+    remaining = set(range(len(pairs))) - {first}
+    while remaining:
+        pick = max(remaining, key=lambda i: (nearest[i], -i))
+        order.append(pick)
+        remaining.discard(pick)
+        row = distances[pick]
+        nearest = [min(d, e) for d, e in zip(nearest, row)]
+    return tuple(pairs[i] for i in order)
+
+@lru_cache(maxsize=64)
+def palette_colors(N):
+    """
+    N perceptually distinct colors, the same for every board of size N.
+
+    Returns:
+        tuple: N (R, G, B) tuples (colors repeat past the candidate count).
+    """
+    order = color_order()
+    return tuple(order[i % len(order)][0] for i in range(N))
+
+@lru_cache(maxsize=64)
+def hex_palette(N):
+    """palette_colors(N) as '#rrggbb' strings, for clients (cacheable per size)."""
+    return tuple(color_utils.rgb_to_hex(color) for color in palette_colors(N))
+
+@lru_cache(maxsize=64)
+def palette_distances(N):
+    """ΔE between every pair of colors of palette_colors(N)."""
+    return delta_e_matrix([srgb_to_lab(color) for color in palette_colors(N)])
+
+def assign_colors(adjacency):
+    """
+    Give each region a color of the palette so that touching regions differ
+    the most: regions with the most neighbours first, each taking the
+    unused color whose smallest ΔE to its colored neighbours is largest.
+
+    Args:
+        adjacency (list): For each region, the set of regions it touches.
+
+    Returns:
+        tuple: Palette index of each region (a permutation of range(N)).
+    """
+    N = len(adjacency)
+    distances = palette_distances(N)
+    colors = [None] * N
+    unused = list(range(N))
+    for region in sorted(range(N), key=lambda k: (-len(adjacency[k]), k)):
+        taken = [colors[k] for k in adjacency[region] if colors[k] is not None]
+        best = max(
+            unused,
+            key=lambda i: min((distances[i][j] for j in taken), default=0),
+        )
+        colors[region] = best
+        unused.remove(best)
+    return tuple(colors)
+
+def min_contrast(colors):
+    """Smallest ΔE between two of the given (R, G, B) colors."""
+    distances = delta_e_matrix([srgb_to_lab(color) for color in colors])
+    return min(
+        (distances[i][j] for i in range(len(colors)) for j in range(i)),
+        default=float("inf"),
+    )
+
+# --- Unit Tests ---
+
+class TestPalette(unittest.TestCase):
+    def test_lab(self):
+        """Test the CIELAB conversion on reference colors."""
+        for color, lab in (((255, 255, 255), (100, 0, 0)), ((0, 0, 0), (0, 0, 0)),
+                           ((255, 0, 0), (53.24, 80.09, 67.20))):
+            for got, want in zip(srgb_to_lab(color), lab):
+                self.assertAlmostEqual(got, want, delta=0.05)
+
+    def test_palettes_are_distinct(self):
+        """Test that palettes are memoized and more distinct than evenly spaced hues."""
+        for N in (4, 8, 15):
+            self.assertIs(hex_palette(N), hex_palette(N))
+            self.assertEqual(len(set(hex_palette(N))), N)
+            self.assertGreater(
+                min_contrast(palette_colors(N)),
+                min_contrast(color_utils.generate_distinct_colors(N)),
+            )
+
+    def test_assign_colors(self):
+        """Test that touching regions get the most distinct colors first."""
+        # A path 0 - 1 - 2 - 3: the middle regions are colored first
+        adjacency = [{1}, {0, 2}, {1, 3}, {2}]
+        colors = assign_colors(adjacency)
+        self.assertEqual(sorted(colors), [0, 1, 2, 3])
+        distances = palette_distances(4)
+        self.assertEqual(
+            distances[colors[1]][colors[2]],
+            max(distances[colors[1]][j] for j in range(4) if j != colors[1]),
+        )
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
@@ -0,0 +1,145 @@
+# Read-only tables built once in the gunicorn master (preload_app), so that
+# forked workers share their pages copy-on-write instead of each building
+# its own copy. See gunicorn.conf.py for the hooks that call these.
+import gc
+import itertools
+import unittest
+from collections import namedtuple
+
+from app.models import coloring, geometry
+
+# Set by gunicorn.conf.py before the app is imported in the master: the
+# app must not start threads or process pools then (they do not survive
+# fork); each worker starts them in post_fork instead
+FORKING = False
+_starts, _stops = [], []   # run in each worker after the fork / at its exit
+_forked_slots = set()      # worker slots forked at least once (in the master)
+_frozen = False            # set by the first freeze()
+
+# The place of a forked worker among `count` workers: `index` is the
+# smallest not held by a live worker, and `first` tells whether it is the
+# first worker forked in that slot (so whether the data loaded before the
+# fork is still its to use, see PuzzlePool.share)
+WorkerSlot = namedtuple("WorkerSlot", ["index", "count", "first"])
+
+
+def prepare_fork():
+    """
+    Called in the master before the app is imported: no garbage collection
+    until the first fork (see freeze), so the objects built now are not
+    moved around and their pages stay identical in every worker.
+    """
+    global FORKING
+    FORKING = True
+    gc.disable()
+
+def warm_tables(sizes, catalogs=()):
+    """
+    Build the per-size tables every game reads (geometry tables, region
+    palettes) and read the catalogs in, so none of it is built per worker.
+
+    Args:
+        sizes (iterable): Board sizes to build tables for.
+        catalogs (iterable): catalog.Catalog objects to prefetch.
+    """
+    for N in sizes:
+        geometry.board_geometry(N)
+        coloring.region_palette(N)
+    for library in catalogs:
+        library.prefetch()
+
+def freeze():
+    """
+    Called in the master before each fork; only the first call does
+    anything: move every object alive now into the permanent generation,
+    so the collectors of the workers never traverse them and never dirty
+    (copy) their pages, then turn garbage collection back on in the master
+    (it only ever sees objects made after the freeze, so workers forked
+    again later still share the frozen pages).
+    """
+    global _frozen
+    if _frozen:
+        return
+    _frozen = True
+    gc.collect()
+    gc.freeze()
+    gc.enable()
+
+def assign_slot(taken, count):
+    """
+    Called in the master before forking a worker: its WorkerSlot.
+
+    Args:
+        taken (iterable): Slot indices of the live workers.
+        count (int): Number of workers.
+    """
+    taken = set(taken)
+    index = next(i for i in itertools.count() if i not in taken)
+    first = index not in _forked_slots
+    _forked_slots.add(index)
+    return WorkerSlot(index, max(count, index + 1), first)
+
+def in_workers(start, stop):
+    """
+    Run start(slot) in each worker after the fork (slot: its WorkerSlot)
+    and stop() when it exits, for the parts of the app that own threads or
+    processes.
+    """
+    _starts.append(start)
+    _stops.append(stop)
+
+def after_fork(slot):
+    """Called in each worker after the fork: start the app."""
+    for start in _starts:
+        start(slot)
+
+def worker_exit():
+    for stop in _stops:
+        stop()
+
+# --- Unit Tests ---
+
+class TestPreload(unittest.TestCase):
+    def test_warm_and_freeze(self):
+        """Test that warming fills the shared caches and gc is back on after one freeze."""
+        global _frozen
+        warm_tables(range(4, 7))
+        self.assertGreaterEqual(geometry.board_geometry.cache_info().currsize, 3)
+        self.assertEqual(coloring.region_palette(5), coloring.region_palette(5))
+        gc.disable()
+        try:
+            freeze()
+            frozen = gc.get_freeze_count()
+            self.assertGreater(frozen, 0)
+            self.assertTrue(gc.isenabled())
+            [object() for _ in range(10)]
+            freeze()   # respawning a worker: nothing more is frozen
+            self.assertEqual(gc.get_freeze_count(), frozen)
+        finally:
+            gc.unfreeze()
+            gc.enable()
+            _frozen = False
+        started = []
+        in_workers(started.append, started.clear)
+        try:
+            after_fork(WorkerSlot(0, 1, True))
+            self.assertEqual(started, [(0, 1, True)])
+            worker_exit()
+            self.assertEqual(started, [])
+        finally:
+            _starts.clear()
+            _stops.clear()
+
+    def test_assign_slot(self):
+        """Test that workers take the smallest free slot, known as refilled once forked."""
+        _forked_slots.clear()
+        try:
+            self.assertEqual(assign_slot([], 2), (0, 2, True))
+            self.assertEqual(assign_slot([0], 2), (1, 2, True))
+            # Worker 0 died and is forked again
+            self.assertEqual(assign_slot([1], 2), (0, 2, False))
+        finally:
+            _forked_slots.clear()
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
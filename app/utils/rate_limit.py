@@ -0,0 +1,61 @@
+# Per-client token buckets, for work a client can ask for at will
+import threading
+import time
+import unittest
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """
+    A token bucket per client key: each client may spend `burst` tokens at
+    once, and earns `rate` tokens per second back up to that. Only the
+    `max_clients` most recently seen clients are remembered (a forgotten
+    one starts again with a full bucket).
+    """
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()   # key -> (tokens, time of last update)
+        self._lock = threading.Lock()
+
+    def allow(self, key, cost=1.0):
+        """
+        Spend `cost` tokens of a client if it has them.
+
+        Returns:
+            bool: True if the client may go ahead.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return allowed
+
+# --- Unit Tests ---
+
+class TestRateLimiter(unittest.TestCase):
+    def test_buckets(self):
+        """Test that each client spends its own burst and earns tokens back."""
+        limiter = RateLimiter(rate=1000, burst=2, max_clients=2)
+        self.assertTrue(limiter.allow("a"))
+        self.assertTrue(limiter.allow("a"))
+        self.assertTrue(limiter.allow("b"))
+        limiter.rate = 0
+        self.assertFalse(limiter.allow("a"))
+        limiter.rate = 1000
+        time.sleep(0.002)
+        self.assertTrue(limiter.allow("a"))
+        # Only the most recent clients are remembered
+        limiter.allow("c")
+        self.assertEqual(list(limiter._buckets), ["a", "c"])
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
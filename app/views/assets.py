@@ -0,0 +1,237 @@
+# app/views/assets.py — static files and the page shell, served without rework
+#
+# Every static file is read, fingerprinted and compressed once at startup.
+# Pages link to the fingerprinted URL (css/styles.<hash>.css), which never
+# changes content and is cached by browsers for a year; the plain URL still
+# works and is revalidated with its ETag. The game page is rendered once as
+# a shell, and each request only splices its own values into it.
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import unittest
+from collections import namedtuple
+
+try:
+    import brotli
+except ImportError:   # optional: gzip copies only
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Content types worth compressing (images are already compressed)
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+# A static file: its name under the static folder, fingerprinted URL,
+# content type, content hash and body per content-coding ("identity" always)
+Asset = namedtuple("Asset", "name url content_type digest bodies")
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def fingerprinted_name(name, digest):
+    """css/styles.css -> css/styles.<digest>.css"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+def compressed_bodies(data, content_type):
+    """The identity body plus every smaller gzip / brotli copy."""
+    bodies = {"identity": data}
+    if content_type.startswith(COMPRESSIBLE):
+        packed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(packed) < len(data):
+            bodies["gzip"] = packed
+        if brotli is not None:
+            packed = brotli.compress(data, quality=11)
+            if len(packed) < len(data):
+                bodies["br"] = packed
+    return bodies
+
+def accepted_encodings(header):
+    """The content-codings an Accept-Encoding header allows (q=0 excluded)."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        params = params.replace(" ", "")
+        if not coding or params in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding)
+    return accepted
+
+def choose_encoding(bodies, header):
+    """The best body an Accept-Encoding header allows: br, then gzip, then identity."""
+    accepted = accepted_encodings(header)
+    for encoding in ("br", "gzip"):
+        if encoding in bodies and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header names `etag` (weak tags compare equal)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+def script_json(value):
+    """JSON safe to embed in an HTML <script> block (as Jinja's tojson)."""
+    return (
+        json.dumps(value, separators=(",", ":"))
+        .replace("<", "\\u003c").replace(">", "\\u003e")
+        .replace("&", "\\u0026").replace("'", "\\u0027")
+    )
+
+
+class StaticFiles:
+    """
+    Every file under a static folder, held in memory with its compressed
+    copies and served by response(); url() gives the fingerprinted URL
+    templates should link to. Files generated at startup are served the
+    same way once add()ed.
+    """
+
+    def __init__(self, root, prefix="/static/"):
+        self.root = root
+        self.prefix = prefix
+        self.assets = {}   # name -> Asset
+        self.paths = {}    # request path under prefix -> (Asset, immutable)
+        for folder, _, files in os.walk(root):
+            for filename in sorted(files):
+                path = os.path.join(folder, filename)
+                name = os.path.relpath(path, root).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    self.add(name, f.read())
+
+    def add(self, name, data):
+        """Serve `data` as the static file `name` (e.g. one generated at startup)."""
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        digest = fingerprint(data)
+        versioned = fingerprinted_name(name, digest)
+        asset = Asset(
+            name, self.prefix + versioned, content_type, digest,
+            compressed_bodies(data, content_type),
+        )
+        self.assets[name] = asset
+        self.paths[name] = (asset, False)
+        self.paths[versioned] = (asset, True)
+
+    def url(self, name):
+        """The fingerprinted URL of a static file (for templates)."""
+        return self.assets[name].url
+
+    def response(self, path, accept_encoding=None, if_none_match=None):
+        """
+        Answer a GET for a path under the prefix.
+
+        Returns:
+            tuple: (status, body, headers), or None when there is no such file.
+        """
+        found = self.paths.get(path)
+        if found is None:
+            return None
+        asset, immutable = found
+        encoding = choose_encoding(asset.bodies, accept_encoding)
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        headers = {
+            "ETag": f'"{asset.digest}{suffix}"',
+            "Cache-Control": IMMUTABLE if immutable else REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(if_none_match, headers["ETag"]):
+            return 304, b"", headers
+        headers["Content-Type"] = asset.content_type
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return 200, asset.bodies[encoding], headers
+
+
+class PageShell:
+    """
+    A template rendered once with a placeholder for each per-request field;
+    fill() splices the values in, so a page view costs no template work.
+    Field values are inserted as given: pass numbers, or text already made
+    safe for its place in the page (e.g. script_json).
+    """
+
+    def __init__(self, text, fields):
+        self.parts = re.split("\x00(" + "|".join(fields) + ")\x00", text)
+        self.digest = fingerprint(text.encode())
+
+    @staticmethod
+    def placeholders(fields):
+        """The values to render the template with."""
+        return {field: f"\x00{field}\x00" for field in fields}
+
+    def fill(self, **values):
+        parts = self.parts[:]
+        parts[1::2] = [str(values[field]) for field in parts[1::2]]
+        return "".join(parts)
+
+    def etag(self, *key):
+        """The ETag of the page filled from the values identified by `key`."""
+        return '"' + fingerprint(repr((self.digest,) + key).encode()) + '"'
+
+# --- Unit Tests ---
+
+class TestAssets(unittest.TestCase):
+    def make_files(self):
+        import tempfile
+        root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(root, "css"))
+        with open(os.path.join(root, "css", "site.css"), "w") as f:
+            f.write("body { color: black; }\n" * 50)
+        with open(os.path.join(root, "logo.png"), "wb") as f:
+            f.write(b"\x89PNG" + bytes(200))
+        return StaticFiles(root)
+
+    def test_static_files(self):
+        """Test fingerprinted URLs, compressed copies and conditional GETs."""
+        files = self.make_files()
+        url = files.url("css/site.css")
+        self.assertRegex(url, r"^/static/css/site\.[0-9a-f]{12}\.css$")
+
+        status, body, headers = files.response(url[len("/static/"):], "gzip, deflate")
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+        self.assertEqual(headers["Cache-Control"], IMMUTABLE)
+        self.assertEqual(gzip.decompress(body), b"body { color: black; }\n" * 50)
+
+        status, body, headers = files.response("css/site.css", "gzip;q=0")
+        self.assertEqual(headers["Cache-Control"], REVALIDATE)
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(files.response("css/site.css", None, headers["ETag"])[0], 304)
+
+        status, body, headers = files.response("logo.png", "gzip, br")
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(headers["Content-Type"], "image/png")
+        self.assertIsNone(files.response("missing.js"))
+
+        files.add("js/made.js", b"const X = 1;\n")
+        url = files.url("js/made.js")
+        self.assertRegex(url, r"^/static/js/made\.[0-9a-f]{12}\.js$")
+        status, body, headers = files.response(url[len("/static/"):])
+        self.assertEqual((status, body), (200, b"const X = 1;\n"))
+        self.assertTrue(headers["Content-Type"].endswith("javascript; charset=utf-8"))
+
+    def test_page_shell(self):
+        """Test that a shell splices per-request values into the rendered page."""
+        fields = ("size", "state")
+        values = PageShell.placeholders(fields)
+        shell = PageShell(f"<p>{values['size']}</p><script>s={values['state']};</script>", fields)
+        page = shell.fill(size=8, state=script_json({"x": "</script>"}))
+        self.assertEqual(page, '<p>8</p><script>s={"x":"\\u003c/script\\u003e"};</script>')
+        self.assertEqual(shell.etag(1, 2), shell.etag(1, 2))
+        self.assertNotEqual(shell.etag(1, 2), shell.etag(1, 3))
+        self.assertTrue(etag_matches(f'W/{shell.etag(1)}, "x"', shell.etag(1)))
+
+if __name__ == '__main__':
+    unittest.main(exit=False)
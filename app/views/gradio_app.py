@@ -1,154 +1,153 @@
 import gradio as gr
 from app.controllers.game_controller import GameController
+from app.controllers.game_service import DEFAULT_BOARD_SIZE, MIN_BOARD_SIZE, MAX_BOARD_SIZE
+from app.models import coloring
 
-# Global game controller instance; initialize with default board size 8.
-controller = GameController(8)
-cell_buttons = {}  # Global dictionary for cell button references
+# What a cell button shows for each user value
+CELL_LABELS = {"": "", "X": "✕", "Q": "♛"}
 
-# Create global status and game complete components.
-status_message = gr.Textbox(label="Status", value="", interactive=False)
-game_complete_flag = gr.Checkbox(label="Game Complete", value=False, interactive=False)
-timer_display = gr.Textbox(label="Timer", value=controller.get_elapsed_time(), interactive=False)
+# Palette colors of every board size as CSS classes (region-<N>-<k>, k the
+# palette index of the region, see coloring.region_colors), so a button is
+# colored by naming its class
+CSS = "\n".join(
+    f".region-{N}-{k} {{ background: {color} !important; }}"
+    for N in range(MIN_BOARD_SIZE, MAX_BOARD_SIZE + 1)
+    for k, color in enumerate(coloring.region_palette(N))
+) + """
+.cell { min-width: 0 !important; aspect-ratio: 1; font-size: 1.4em; }
+.cell-error { color: #d00 !important; }
+"""
 
-def get_cell_image(row, col, state):
-    """
-    Determine which image to display for a given cell.
-    Returns:
-        str: Path to the image asset.
-             - "assets/error.png" if an error is flagged.
-             - "assets/queen.png" if a queen is placed.
-             - "assets/cross.png" otherwise.
-    """
-    if state["error_board"][row][col]:
-        return "assets/error.png"
-    elif state["user_board"][row][col] == 'Q':
-        return "assets/queen.png"
-    else:
-        return "assets/cross.png"
 
-def render_board():
-    """
-    Create a 2D list of image paths representing the current board state.
-    
-    Returns:
-        tuple: (board_images: list of lists of str, elapsed_time: str)
+class GradioGame:
     """
-    state = controller.get_game_state()
-    board_images = []
-    for r in range(controller.board_size):
-        row_images = []
-        for c in range(controller.board_size):
-            row_images.append(get_cell_image(r, c, state))
-        board_images.append(row_images)
-    return board_images, state["elapsed_time"]
-
-def cell_click(row, col):
+    The game of one browser session (kept in a gr.State), with what each
+    cell button currently shows, so an event only updates the buttons whose
+    look changed. The grid is built once at the largest board size; smaller
+    boards hide the buttons they do not use.
     """
-    Callback when a board cell is clicked.
-    Assumes the move is to place a queen.
-    
-    Args:
-        row (int): Row index of the clicked cell.
-        col (int): Column index of the clicked cell.
-    
-    Returns:
-        tuple: (updated_cell_image: str, updated_timer: str, status_message: str, game_complete_flag: bool)
-    """
-    valid, msg = controller.update_move(row, col, "queen")
-    state = controller.get_game_state()
-    cell_image = get_cell_image(row, col, state)
-    complete = controller.is_game_complete()
-    return cell_image, state["elapsed_time"], msg, complete
 
-def update_full_board():
-    """
-    Update the entire board grid (used to refresh the timer and board state).
-    
-    Returns:
-        str: Updated timer string.
-    """
-    board_images, timer_str = render_board()
-    # Update each cell button with the new image
-    for r in range(controller.board_size):
-        for c in range(controller.board_size):
-            cell_buttons[(r, c)].update(value=board_images[r][c])
-    return timer_str
-
-def reset_game(board_size):
-    """
-    Reset the game with a new board of the specified size.
-    
-    Args:
-        board_size (int): The new board size.
-    
-    Returns:
-        tuple: (new_board_images: list of lists of str, new_timer: str)
-    """
-    global controller, cell_buttons
-    controller = GameController(int(board_size))
-    # Recreate the board grid if board size changes or for a full reset.
-    create_board_grid(controller.board_size)
-    board_images, timer_str = render_board()
-    # Update all cell buttons with new images.
-    for r in range(controller.board_size):
-        for c in range(controller.board_size):
-            cell_buttons[(r, c)].update(value=board_images[r][c])
-    return timer_str
-
-def create_board_grid(board_size):
+    def __init__(self, board_size=DEFAULT_BOARD_SIZE):
+        self.controller = GameController(board_size)
+        self.shown = {}   # (row, col) -> (label, classes) of every visible button
+
+    def look(self, row, col, user, error):
+        """(label, classes) of a cell button."""
+        N = self.controller.board_size
+        region = self.controller.board.regions[row * N + col]
+        color = coloring.region_colors(self.controller.board.regions, N)[region]
+        classes = ["cell", f"region-{N}-{color}"]
+        if error:
+            classes.append("cell-error")
+        return CELL_LABELS[user], classes
+
+    def updates(self, changes):
+        """
+        One update per button of the grid: the new label and classes of
+        each cell in `changes` ([row, col, user, error]) that looks
+        different, and empty (no-op) updates for every other button.
+        """
+        updates = [gr.update() for _ in range(MAX_BOARD_SIZE * MAX_BOARD_SIZE)]
+        for row, col, user, error in changes:
+            look = self.look(row, col, user, error)
+            if self.shown.get((row, col)) != look:
+                self.shown[(row, col)] = look
+                label, classes = look
+                updates[row * MAX_BOARD_SIZE + col] = gr.update(
+                    value=label, elem_classes=classes, visible=True
+                )
+        return updates
+
+    def new_game_updates(self):
+        """Updates showing a new game on the existing grid."""
+        N = self.controller.board_size
+        state = self.controller.get_game_state()
+        self.controller.pop_changes()
+        updates = self.updates(
+            [r, c, state["user_board"][r][c], state["error_board"][r][c]]
+            for r in range(N) for c in range(N)
+        )
+        for r, c in [cell for cell in self.shown if max(cell) >= N]:
+            del self.shown[(r, c)]
+            updates[r * MAX_BOARD_SIZE + c] = gr.update(visible=False)
+        return updates
+
+
+def status(game, message=""):
+    """(state, timer, status message, game complete) outputs."""
+    if game is None:
+        return [None, "", message, False]
+    return [game, game.controller.get_elapsed_time(), message, game.controller.is_game_complete()]
+
+def start_session():
+    """Page load: every browser tab is a session with its own game."""
+    game = GradioGame()
+    return status(game) + game.new_game_updates()
+
+def cell_click(row, col, game):
     """
-    Create a grid of buttons for the board based on the current board size.
-    Each button will display the cell image.
-    
-    Note: Instead of clearing an existing container, we build the grid from scratch.
+    Callback when a board cell is clicked: place a queen there, and update
+    the buttons of the cells that changed.
     """
-    global cell_buttons
-    cell_buttons = {}
-    # Create a new grid layout inside the placeholder column.
-    with board_grid_placeholder:
-        # Build the grid rows and cells.
-        for r in range(board_size):
-            with gr.Row():
-                for c in range(board_size):
-                    # Create a button for each cell.
-                    btn = gr.Button(value="", elem_id=f"cell_{r}_{c}", interactive=True)
-                    cell_buttons[(r, c)] = btn
-    # After creation, update all buttons with their correct images.
-    board_images, _ = render_board()
-    for r in range(board_size):
-        for c in range(board_size):
-            cell_buttons[(r, c)].update(value=board_images[r][c])
+    if game is None or max(row, col) >= game.controller.board_size:
+        return status(game) + [gr.update()] * (MAX_BOARD_SIZE * MAX_BOARD_SIZE)
+    valid, msg = game.controller.update_move(row, col, "queen")
+    return status(game, msg) + game.updates(game.controller.pop_changes())
+
+def reset_game(board_size, game):
+    """Start a new game of the given size on the existing grid."""
+    board_size = min(max(int(board_size or DEFAULT_BOARD_SIZE), MIN_BOARD_SIZE), MAX_BOARD_SIZE)
+    if game is None:
+        game = GradioGame(board_size)
+    else:
+        game.controller = GameController(board_size)
+    return status(game) + game.new_game_updates()
+
+def refresh_timer(game):
+    return game.controller.get_elapsed_time() if game is not None else ""
 
 # Build the Gradio interface.
-with gr.Blocks() as demo:
+with gr.Blocks(css=CSS) as demo:
     gr.Markdown("# Queen Game")
-    
+    game_state = gr.State(None)
+
     with gr.Row():
-        board_size_input = gr.Number(label="Board Size (N x N)", value=8, precision=0)
+        board_size_input = gr.Number(
+            label="Board Size (N x N)", value=DEFAULT_BOARD_SIZE, precision=0,
+            minimum=MIN_BOARD_SIZE, maximum=MAX_BOARD_SIZE,
+        )
         reset_button = gr.Button("Reset Game")
-    
-    timer_display_component = timer_display  # Global timer display
-    status_component = status_message         # Global status message
-    game_complete_component = game_complete_flag  # Global game complete flag
-    
-    with gr.Column() as board_grid_placeholder:
-        # Create the initial board grid.
-        create_board_grid(controller.board_size)
-    
-    # Set up callbacks for each cell button.
-    for r in range(controller.board_size):
-        for c in range(controller.board_size):
+
+    timer_display = gr.Textbox(label="Timer", value="", interactive=False)
+    status_message = gr.Textbox(label="Status", value="", interactive=False)
+    game_complete_flag = gr.Checkbox(label="Game Complete", value=False, interactive=False)
+
+    # The grid of cell buttons, built once; games only update and hide buttons
+    cell_buttons = []
+    with gr.Column():
+        for r in range(MAX_BOARD_SIZE):
+            with gr.Row():
+                for c in range(MAX_BOARD_SIZE):
+                    cell_buttons.append(gr.Button(
+                        value="", elem_id=f"cell_{r}_{c}", elem_classes=["cell"],
+                        visible=False,
+                    ))
+
+    outputs = [game_state, timer_display, status_message, game_complete_flag] + cell_buttons
+    for r in range(MAX_BOARD_SIZE):
+        for c in range(MAX_BOARD_SIZE):
             # Capture row and col in lambda default arguments.
-            cell_buttons[(r, c)].click(
-                fn=lambda r=r, c=c: cell_click(r, c),
-                outputs=[cell_buttons[(r, c)], timer_display_component, status_component, game_complete_component]
+            cell_buttons[r * MAX_BOARD_SIZE + c].click(
+                fn=lambda game, r=r, c=c: cell_click(r, c, game),
+                inputs=game_state, outputs=outputs,
             )
-    
-    # Callback for the reset button.
-    reset_button.click(fn=reset_game, inputs=board_size_input, outputs=timer_display_component)
-    
-    # Optional: A button to refresh the timer and board state.
-    refresh_timer = gr.Button("Refresh Timer")
-    refresh_timer.click(fn=update_full_board, outputs=timer_display_component)
-    
-demo.launch()
+
+    reset_button.click(fn=reset_game, inputs=[board_size_input, game_state], outputs=outputs)
+    demo.load(fn=start_session, outputs=outputs)
+
+    # Optional: A button to refresh the timer.
+    refresh_button = gr.Button("Refresh Timer")
+    refresh_button.click(fn=refresh_timer, inputs=game_state, outputs=timer_display)
+
+if __name__ == "__main__":
+    demo.launch()
@@ -27,70 +27,152 @@ document.addEventListener("DOMContentLoaded", () => {
   const clearBtn         = document.getElementById("clear-btn");
 
   // ----- Timer Helpers -----
-  function parseTimeToSeconds(str) {
-    const [m, s] = str.split(":").map(Number);
-    return m * 60 + s;
+  // The server sends when the game started and its own clock once per
+  // response; the elapsed time is then computed locally, so an open tab
+  // costs no requests. Every /move response re-syncs the clock offset.
+  let clockOffset = 0;  // server clock minus local clock, in seconds
+
+  function syncClock(serverTime) {
+    if (serverTime !== undefined) clockOffset = serverTime - Date.now() / 1000;
+  }
+  function elapsedSeconds() {
+    return Math.max(0, Math.floor(Date.now() / 1000 + clockOffset - gameState.started_at));
+  }
+  function formatTime(tot) {
+    const mm = Math.floor(tot / 60), ss = tot % 60;
+    return `${String(mm).padStart(2,"0")}:${String(ss).padStart(2,"0")}`;
+  }
+  function renderTimer() {
+    timerEl.textContent = formatTime(elapsedSeconds());
   }
   function startTimer() {
     clearInterval(window._timerInterval);
-    fetch("/get_time")
-      .then(r => r.json())
-      .then(data => {
-        timerEl.textContent = data.elapsed_time;
-        const base = parseTimeToSeconds(data.elapsed_time),
-              t0   = Date.now();
-        window._timerInterval = setInterval(() => {
-          const d   = Math.floor((Date.now() - t0) / 1000),
-                tot = base + d,
-                mm  = Math.floor(tot / 60),
-                ss  = tot % 60;
-          timerEl.textContent = `${String(mm).padStart(2,"0")}:${String(ss).padStart(2,"0")}`;
-        }, 1000);
-      });
+    renderTimer();
+    window._timerInterval = setInterval(() => {
+      if (!document.hidden) renderTimer();
+    }, 1000);
   }
+  document.addEventListener("visibilitychange", () => {
+    if (!document.hidden && !gameState.is_complete) renderTimer();
+  });
 
   // ----- AJAX -----
+  // /move and /moves answer with the cells that changed and a state
+  // version. Requests are chained so each one is sent with the version
+  // left by the previous answer. A 409 means our moves were not applied,
+  // because our version was out of date or another request saved the
+  // game first: the full state is fetched again.
+  let requestChain = Promise.resolve();
+  let pendingMoves = [];      // moves waiting to be sent as one batch
+  let flushTimer   = null;
+
+  function postMoves(url, payload) {
+    requestChain = requestChain
+      .then(() => fetch(url, {
+        method: "POST",
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify({ ...payload, version: gameState.version })
+      }))
+      .then(r => r.status === 409 ? resync() : r.json().then(handleMoveResult))
+      .catch(() => {});
+    return requestChain;
+  }
+
+  function resync() {
+    return fetch("/state")
+      .then(r => r.json())
+      .then(data => applyFullState(data.state));
+  }
+
+  function handleMoveResult(data) {
+    if (data.error) {
+      statusMessage.textContent = data.error;
+      return;
+    }
+    if (data.state) {
+      applyFullState(data.state);
+    } else {
+      applyChanges(data);
+    }
+    syncClock(data.server_time);
+    if (!gameState.is_complete) renderTimer();
+    statusMessage.textContent = data.message || "";
+    if (gameState.is_complete) showWinOverlay();
+  }
+
   function doMove(r, c, moveType) {
-    return fetch("/move", {
-      method: "POST",
-      headers: {"Content-Type": "application/json"},
-      body: JSON.stringify({ row: r, col: c, move_type: moveType })
-    })
-    .then(r => r.json())
-    .then(data => {
-      gameState = data.state;
-      timerEl.textContent = gameState.elapsed_time;
-      statusMessage.textContent = data.message || "";
-      // re-render all cells
-      document.querySelectorAll(".cell").forEach(cell => {
-        updateCell(cell,
-          gameState,
-          +cell.dataset.row,
-          +cell.dataset.col
-        );
-      });
-      if (gameState.is_complete) showWinOverlay();
+    flushMoves();
+    return postMoves("/move", { row: r, col: c, move_type: moveType });
+  }
+
+  // Coalesce rapid interactions (drag gestures, clear board) into batches
+  function queueMove(r, c, moveType) {
+    pendingMoves.push({ row: r, col: c, move_type: moveType });
+    if (!flushTimer) flushTimer = setTimeout(flushMoves, 50);
+  }
+
+  function flushMoves() {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+    if (!pendingMoves.length) return;
+    const moves = pendingMoves;
+    pendingMoves = [];
+    postMoves("/moves", { moves });
+  }
+
+  function applyChanges(data) {
+    for (const [r, c, val, err] of data.changes) {
+      gameState.user_board[r][c]  = val;
+      gameState.error_board[r][c] = err;
+      updateCell(cellAt(r, c), gameState, r, c);
+    }
+    gameState.version      = data.version;
+    gameState.is_complete  = data.is_complete;
+    gameState.elapsed_time = data.elapsed_time;
+  }
+
+  function applyFullState(state) {
+    if (state.board_size !== boardSize) {
+      boardSize = state.board_size;
+      buildBoard(state);
+      return;
+    }
+    gameState = state;
+    document.querySelectorAll(".cell").forEach(cell => {
+      updateCell(cell, gameState, +cell.dataset.row, +cell.dataset.col);
     });
   }
 
+  // Queued moves belong to the old board: drop them, and start the new
+  // game only after the requests already sent have been answered
   function doReset(size) {
-    fetch("/reset", {
-      method: "POST",
-      headers: {"Content-Type":"application/json"},
-      body: JSON.stringify({ board_size: size })
-    })
-    .then(r => r.json())
-    .then(data => {
-      gameState = data.state;
-      buildBoard(gameState);
-      timerEl.textContent = gameState.elapsed_time;
-      statusMessage.textContent = "";
-      document.getElementById("win-overlay")?.remove();
-      startTimer();
-    });
+    clearTimeout(flushTimer);
+    flushTimer   = null;
+    pendingMoves = [];
+    requestChain = requestChain
+      .then(() => fetch("/reset", {
+        method: "POST",
+        headers: {"Content-Type":"application/json"},
+        body: JSON.stringify({ board_size: size })
+      }))
+      .then(r => r.json())
+      .then(data => {
+        gameState = data.state;
+        buildBoard(gameState);
+        syncClock(gameState.server_time);
+        statusMessage.textContent = "";
+        document.getElementById("win-overlay")?.remove();
+        startTimer();
+      })
+      .catch(() => {});
+    return requestChain;
   }
 
   // ----- Rendering Helpers -----
+  function cellAt(r, c) {
+    return boardEl.children[r * boardSize + c];
+  }
+
   function updateCell(cell, state, r, c) {
     const content = cell.firstChild;
     content.innerHTML = "";
@@ -98,19 +180,19 @@ document.addEventListener("DOMContentLoaded", () => {
     const err = state.error_board[r][c];
     if (val === "X") {
       const img = document.createElement("img");
-      img.src = "/static/assets/cross.png";
+      img.src = ASSET_URLS.cross;
       img.className = "cross-icon";
       content.appendChild(img);
     }
     if (val === "Q") {
       const img = document.createElement("img");
-      img.src = "/static/assets/queen.png";
+      img.src = ASSET_URLS.queen;
       img.className = "queen-icon";
       content.appendChild(img);
     }
     if (err) {
       const img = document.createElement("img");
-      img.src = "/static/assets/error.png";
+      img.src = ASSET_URLS.error;
       img.className = "error-icon";
       content.appendChild(img);
     }
@@ -124,7 +206,7 @@ document.addEventListener("DOMContentLoaded", () => {
     ov.innerHTML = `
       <div class="win-box">
         <h2>🎉 You Win! 🎉</h2>
-        <p>Time: ${gameState.elapsed_time}</p>
+        <p>Time: ${timerEl.textContent}</p>
         <button id="close-win" class="btn btn-primary rounded-pill">Close</button>
       </div>`;
     document.body.appendChild(ov);
@@ -136,9 +218,9 @@ document.addEventListener("DOMContentLoaded", () => {
   function applyAction(r, c, action) {
     const curr = gameState.user_board[r][c] || "";
     if (action === "cross" && curr === "") {
-      doMove(r, c, "cross");
+      queueMove(r, c, "cross");
     } else if (action === "clear" && curr === "X") {
-      doMove(r, c, "clear");
+      queueMove(r, c, "clear");
     }
   }
 
@@ -192,6 +274,7 @@ document.addEventListener("DOMContentLoaded", () => {
                      :                "clear";
       doMove(r, c, moveType);
     }
+    flushMoves();
     // reset
     isDragging  = false;
     hasDragged  = false;
@@ -218,8 +301,8 @@ document.addEventListener("DOMContentLoaded", () => {
         cell.className = "cell";
         cell.dataset.row = r;
         cell.dataset.col = c;
-        const rgb = state.colored_board[r]?.[c];
-        if (rgb) cell.style.backgroundColor = `rgb(${rgb.join(",")})`;
+        const region = state.regions[r]?.[c];
+        if (region !== undefined) cell.style.backgroundColor = PALETTES[state.board_size][state.region_colors[region]];
 
         const content = document.createElement("div");
         content.className = "cell-content";
@@ -266,14 +349,24 @@ document.addEventListener("DOMContentLoaded", () => {
     for (let r = 0; r < boardSize; r++) {
       for (let c = 0; c < boardSize; c++) {
         if (gameState.user_board[r][c] === "X") {
-          doMove(r, c, "clear");
+          queueMove(r, c, "clear");
         }
       }
     }
+    flushMoves();  // one request for the whole board
   });
 
   // ----- Init -----
   buildBoard(gameState);
-  timerEl.textContent = gameState.elapsed_time;
+  syncClock(gameState.server_time);
   startTimer();
+  // The page may come from the browser cache (an unchanged game answers
+  // 304), with a stale server clock: take a fresh one
+  fetch("/get_time")
+    .then(r => r.json())
+    .then(data => {
+      syncClock(data.server_time);
+      if (!gameState.is_complete) renderTimer();
+    })
+    .catch(() => {});
 });
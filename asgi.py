@@ -0,0 +1,275 @@
+# asgi.py — the game API over asyncio (Quart), same routes and JSON as app.py
+#
+#   uvicorn asgi:app --host 0.0.0.0 --port 7860
+#
+# Requests are handled on the event loop, so idle or slow clients cost no
+# thread. Session checkouts (which may wait on a session lock or SQLite)
+# run in a small thread pool, and puzzles that have to be generated on
+# demand are made in a process pool, so neither blocks the loop.
+
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from quart import Quart, Response, g, jsonify, render_template, request
+from app.controllers.game_controller import GameController
+from app.controllers.game_service import (
+    ApiError, DEFAULT_BOARD_SIZE, GameService, SESSION_COOKIE,
+)
+from app.models import puzzle
+from app.utils import metrics
+from app.views import assets
+
+app = Quart(
+    __name__,
+    template_folder="app/views/templates",
+    static_folder=None
+)
+static_files = assets.StaticFiles(os.path.join(app.root_path, "app/views/static"))
+static_files.add("js/palettes.js", GameService.palettes_script())
+app.add_template_global(static_files.url, "asset_url")
+PAGE_FIELDS = ("board_size", "initial_state")
+index_shell = None   # index.html rendered once (see app.index_shell)
+
+service = GameService.from_env(app.instance_path)
+session_threads = ThreadPoolExecutor(
+    int(os.environ.get("ASYNC_SESSION_THREADS", 16)), thread_name_prefix="session"
+)
+generators = ProcessPoolExecutor(
+    int(os.environ.get("ASYNC_GENERATE_PROCESSES", 2)),
+    mp_context=multiprocessing.get_context("spawn"),
+)
+# Seeded puzzles already generated (shared and daily puzzles), newest last
+seeded_games = OrderedDict()
+SEEDED_GAMES = 256
+
+@app.before_serving
+async def start_service():
+    service.start()
+
+@app.after_serving
+async def stop_service():
+    await asyncio.get_running_loop().run_in_executor(None, service.stop)
+    generators.shutdown(cancel_futures=True)
+    session_threads.shutdown()
+
+@app.errorhandler(ApiError)
+async def api_error(e):
+    return jsonify({"error": str(e)}), e.status
+
+# Request metrics, as in app.py (QUEENS_METRICS=1, served on /metrics).
+# There is no METRICS_PROFILE_SLOWEST here: the requests of the loop
+# interleave, and their work runs in the thread and process pools, so a
+# cProfile of one request would mostly show the others.
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_seconds", "Time to handle a request.")
+RESPONSE_BYTES = metrics.histogram(
+    "http_response_bytes", "Size of the response body.", metrics.SIZE_BUCKETS)
+REQUESTS = metrics.counter(
+    "http_requests_total", "Requests handled.")
+
+@app.before_request
+async def start_request_metrics():
+    if metrics.ENABLED:
+        g.request_start = time.perf_counter()
+
+@app.after_request
+async def record_request_metrics(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route=route)
+        REQUESTS.inc(route=route, status=response.status_code)
+        RESPONSE_BYTES.observe(response.content_length or 0, route=route)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+async def metrics_text():
+    """Counters and histograms of this process (see app.metrics_text)."""
+    if not metrics.ENABLED:
+        return jsonify({"error": "Metrics are disabled (set QUEENS_METRICS=1)."}), 404
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+async def new_controller(board_size=DEFAULT_BOARD_SIZE, band=None):
+    """Start a game on a ready puzzle, generating one in the process pool if needed."""
+    game, game_band, puzzle_id = service.ready_game(board_size, band)
+    if game is None:
+        # Generated from a drawn seed, so that the puzzle has an ID
+        seed = random.getrandbits(64)
+        puzzle_id = puzzle.puzzle_id(board_size, seed)
+        loop = asyncio.get_running_loop()
+        game = await loop.run_in_executor(
+            generators, puzzle.generate_puzzle, board_size, True, seed
+        )
+    return service.start_controller(board_size, game, game_band, puzzle_id)
+
+class NeedsPuzzle(Exception):
+    """No puzzle is ready for a session that has to be started again."""
+
+def ready_controller():
+    """
+    A game on a ready puzzle, for the checkout of a session whose game
+    expired: it runs in a session thread holding the session lock, so it
+    raises NeedsPuzzle rather than generating one there.
+    """
+    game, band, puzzle_id = service.ready_game(DEFAULT_BOARD_SIZE)
+    if game is None:
+        raise NeedsPuzzle()
+    return service.start_controller(DEFAULT_BOARD_SIZE, game, band, puzzle_id)
+
+async def seeded_controller(board_size, seed, client=None):
+    """
+    Start a game on the puzzle of a seed: its catalog record, or else
+    generated once in the process pool (see GameService.seeded_game).
+    """
+    game, band, puzzle_id = service.seeded_game(board_size, seed, client)
+    if game is not None:
+        return service.start_controller(board_size, game, band, puzzle_id)
+    game = seeded_games.get(puzzle_id)
+    if game is None:
+        loop = asyncio.get_running_loop()
+        game = await loop.run_in_executor(generators, puzzle.puzzle_from_id, puzzle_id)
+        seeded_games[puzzle_id] = game
+        if len(seeded_games) > SEEDED_GAMES:
+            seeded_games.popitem(last=False)
+    seeded_games.move_to_end(puzzle_id)
+    return GameController(board_size, game=game, puzzle_id=puzzle_id)
+
+async def in_session(handler, controller=None):
+    """
+    Run handler(game) on the requesting browser's checked-out game (see
+    session_store) in the session thread pool. A new session gets
+    `controller`, or a game started here on the loop; so does one whose
+    game expired, when no puzzle is ready to restart it with.
+    """
+    session_id, is_new = service.session_id(request.cookies.get(SESSION_COOKIE))
+    if is_new:
+        g.new_session_id = session_id
+        if controller is None:
+            controller = await new_controller()
+
+    def run(create):
+        with service.session(session_id, create) as game:
+            return handler(game)
+
+    loop = asyncio.get_running_loop()
+    if controller is None:
+        try:
+            return await loop.run_in_executor(session_threads, run, ready_controller)
+        except NeedsPuzzle:
+            controller = await new_controller()
+    return await loop.run_in_executor(session_threads, run, lambda: controller)
+
+@app.after_request
+async def set_session_cookie(response):
+    session_id = g.pop("new_session_id", None)
+    if session_id:
+        response.set_cookie(
+            SESSION_COOKIE, session_id,
+            max_age=30 * 24 * 3600, httponly=True, samesite="Lax"
+        )
+    return response
+
+@app.route("/static/<path:filename>", methods=["GET"])
+async def static_file(filename):
+    """A static file from memory (see app.static_file)."""
+    found = static_files.response(
+        filename,
+        request.headers.get("Accept-Encoding"),
+        request.headers.get("If-None-Match"),
+    )
+    if found is None:
+        return jsonify({"error": "Not found."}), 404
+    status, body, headers = found
+    return Response(body, status=status, headers=headers)
+
+@app.route("/", methods=["GET"])
+async def index():
+    """Render the main game page from the cached shell (see app.index)."""
+    global index_shell
+    if index_shell is None:
+        index_shell = assets.PageShell(
+            await render_template("index.html", **assets.PageShell.placeholders(PAGE_FIELDS)),
+            PAGE_FIELDS,
+        )
+    shell = index_shell
+    if_none_match = request.headers.get("If-None-Match")
+
+    def render(game):
+        controller = game.controller
+        etag = shell.etag(*service.state_key(controller))
+        if assets.etag_matches(if_none_match, etag):
+            return etag, None
+        return etag, shell.fill(
+            board_size=controller.board_size,
+            initial_state=assets.script_json(controller.get_game_state()),
+        )
+
+    etag, page = await in_session(render)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if page is None:
+        return Response("", status=304, headers=headers)
+    return Response(page, mimetype="text/html", headers=headers)
+
+@app.route("/move", methods=["POST"])
+async def move():
+    """Apply one move (see app.move)."""
+    data = await request.get_json()
+    cell = service.parse_move(data)
+    return jsonify(await in_session(lambda game: service.move_result(
+        game.controller, data, service.move(game.controller, cell)
+    )))
+
+@app.route("/moves", methods=["POST"])
+async def moves():
+    """Apply a batch of moves atomically (see app.moves)."""
+    data = await request.get_json()
+    batch = service.parse_moves(data)
+    return jsonify(await in_session(lambda game: service.move_result(
+        game.controller, data, service.moves(game.controller, batch)
+    )))
+
+@app.route("/hint", methods=["GET"])
+async def hint():
+    """Next logical step for the current board (see app.hint)."""
+    return jsonify({"hint": await in_session(lambda game: game.controller.get_hint())})
+
+@app.route("/auto_cross", methods=["POST"])
+async def auto_cross():
+    """Cross every cell the rules rule out (see app.auto_cross)."""
+    data = await request.get_json(silent=True) or {}
+    return jsonify(await in_session(lambda game: service.move_result(
+        game.controller, data, game.controller.auto_cross
+    )))
+
+@app.route("/state", methods=["GET"])
+async def state():
+    """Full game state, for clients that need to resync."""
+    return jsonify(await in_session(lambda game: service.state(game.controller)))
+
+@app.route("/get_time", methods=["GET"])
+async def get_time():
+    """Elapsed time, game start and server clock (see app.get_time)."""
+    return jsonify(await in_session(lambda game: service.elapsed(game.controller)))
+
+@app.route("/reset", methods=["POST"])
+async def reset():
+    """Start a new game (see app.reset)."""
+    board_size, band, seed = service.parse_reset(await request.get_json())
+    if seed is None:
+        controller = await new_controller(board_size, band)
+    else:
+        controller = await seeded_controller(board_size, seed, request.remote_addr)
+
+    def replace(game):
+        game.controller = controller
+        return controller.get_game_state()
+
+    return jsonify({"state": await in_session(replace, controller)})
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=7860)
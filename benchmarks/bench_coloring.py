@@ -0,0 +1,79 @@
+"""
+Benchmark the region coloring.
+
+Compares the frontier-based coloring in app.models.coloring with the
+previous loop, which rescanned every cell and its neighbours on each
+iteration, even when the randomly picked seed color could not grow.
+
+Usage:
+    python -m benchmarks.bench_coloring [--runs 20] [--sizes 8 15 30 50]
+"""
+
+import argparse
+import random
+import time
+
+from app.models import coloring, queens
+from app.utils import color_utils
+
+
+def rescan_color_board(queen_board, N):
+    """
+    Reference implementation: the coloring loop used before the frontier engine.
+    
+    Returns:
+        list: N x N matrix of color tuples.
+    """
+    seed_colors = color_utils.generate_distinct_colors(N)
+    colored_board, _ = coloring.initialize_colored_board(queen_board, N, seed_colors)
+    colored_count = N
+    while colored_count < N * N:
+        current_color = seed_colors[random.randint(0, N - 1)]
+        candidates = []
+        for r in range(N):
+            for c in range(N):
+                if colored_board[r][c] is None:
+                    for nr, nc in coloring.get_neighbors(r, c, N):
+                        if colored_board[nr][nc] == current_color:
+                            candidates.append((r, c))
+                            break
+        if candidates:
+            r, c = random.choice(candidates)
+            colored_board[r][c] = current_color
+            colored_count += 1
+    return colored_board
+
+
+def time_coloring(color, N, runs):
+    """
+    Time a coloring function over several random queen boards.
+    
+    Returns:
+        float: Mean latency in milliseconds.
+    """
+    total = 0.0
+    for _ in range(runs):
+        queen_board = queens.generate_random_board(N)
+        start = time.perf_counter()
+        color(queen_board, N)
+        total += time.perf_counter() - start
+    return total / runs * 1e3
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 10, 15, 20, 30, 50])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    print(f"{'N':>3} | {'rescan (ms)':>12} | {'frontier (ms)':>13} | {'speedup':>7}")
+    for N in args.sizes:
+        old = time_coloring(rescan_color_board, N, args.runs)
+        new = time_coloring(coloring.color_board, N, args.runs)
+        print(f"{N:>3} | {old:>12.2f} | {new:>13.2f} | {old / new:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark move handling in GameController.
+
+Replays the same random moves through the incremental conflict index used
+by update_move and through the previous full rescan, which rebuilt
+error_board and compared every pair of queens after each move.
+
+Usage:
+    python -m benchmarks.bench_moves [--moves 5000] [--sizes 8 15]
+"""
+
+import argparse
+import random
+import time
+
+from app.controllers.game_controller import GameController
+
+
+def rescan_errors(user_board, region_board, n):
+    """
+    Reference implementation: the pairwise scan used before the conflict index.
+    
+    Returns:
+        list: N x N matrix of booleans (True on conflicting queens).
+    """
+    error_board = [[False] * n for _ in range(n)]
+    queens_pos = [(r, c) for r in range(n) for c in range(n) if user_board[r][c] == 'Q']
+    for i in range(len(queens_pos)):
+        for j in range(i + 1, len(queens_pos)):
+            r1, c1 = queens_pos[i]
+            r2, c2 = queens_pos[j]
+            if (max(abs(r1 - r2), abs(c1 - c2)) == 1 or r1 == r2 or c1 == c2
+                    or region_board[r1][c1] == region_board[r2][c2]):
+                error_board[r1][c1] = error_board[r2][c2] = True
+    return error_board
+
+
+def random_moves(n, count, rng):
+    return [
+        (rng.randrange(n), rng.randrange(n), rng.choice(("queen", "cross", "clear")))
+        for _ in range(count)
+    ]
+
+
+def replay_rescan(controller, moves):
+    """Apply the moves, rescanning every pair of queens and the board after each."""
+    n = controller.board_size
+    user_board = [[''] * n for _ in range(n)]
+    region_board = controller.region_board
+    states = {"queen": 'Q', "cross": 'X', "clear": ''}
+    for row, col, move_type in moves:
+        user_board[row][col] = states[move_type]
+        error_board = rescan_errors(user_board, region_board, n)
+        complete = all(
+            user_board[r][c] == 'Q' for r, c in enumerate(controller.solution_queen_board)
+        ) and not any(map(any, error_board))
+    return error_board
+
+
+def replay_incremental(controller, moves):
+    """Apply the moves through update_move and is_game_complete."""
+    for row, col, move_type in moves:
+        controller.update_move(row, col, move_type)
+        controller.is_game_complete()
+    return controller.error_board
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--moves", type=int, default=5000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 10, 15])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print(f"{'N':>3} | {'rescan (us/move)':>16} | {'incremental (us/move)':>21} | {'speedup':>7}")
+    for n in args.sizes:
+        controller = GameController(n)
+        moves = random_moves(n, args.moves, rng)
+
+        start = time.perf_counter()
+        expected = replay_rescan(controller, moves)
+        old = (time.perf_counter() - start) / len(moves) * 1e6
+
+        start = time.perf_counter()
+        actual = replay_incremental(controller, moves)
+        new = (time.perf_counter() - start) / len(moves) * 1e6
+
+        assert actual == expected, "incremental errors differ from the rescan"
+        print(f"{n:>3} | {old:>16.1f} | {new:>21.1f} | {old / new:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
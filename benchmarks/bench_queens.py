@@ -0,0 +1,84 @@
+"""
+Benchmark the queen layout generator.
+
+Compares the bitmask backtracking generator in app.models.queens with the
+previous restart-on-dead-end loop, which rebuilt every row's allowed columns
+from scratch and threw the whole board away when a row had no candidates.
+
+Usage:
+    python -m benchmarks.bench_queens [--runs 200] [--sizes 4 5 ... 30]
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from app.models import queens
+
+
+def restart_generate_board(N):
+    """
+    Reference implementation: the generator used before the bitmask engine.
+    
+    Args:
+        N (int): Size of the board (N >= 4).
+    
+    Returns:
+        list: Queen column for each row.
+    """
+    while True:
+        board = []
+        used_columns = set()
+        for row in range(N):
+            allowed = queens.get_allowed_columns(row, board, used_columns, N)
+            if not allowed:
+                break
+            chosen = random.choice(allowed)
+            board.append(chosen)
+            used_columns.add(chosen)
+        else:
+            return board
+
+
+def time_generator(generate, N, runs):
+    """
+    Time a generator over several runs.
+    
+    Returns:
+        dict: mean, p50, p99 and max latency in microseconds.
+    """
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        generate(N)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "max": samples[-1],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=list(range(4, 16)) + [20, 25, 30])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    print(f"{'N':>3} | {'restart mean':>12} {'p99':>9} {'max':>9} | "
+          f"{'bitmask mean':>12} {'p99':>9} {'max':>9}   (us)")
+    for N in args.sizes:
+        old = time_generator(restart_generate_board, N, args.runs)
+        new = time_generator(queens.generate_random_board, N, args.runs)
+        print(f"{N:>3} | {old['mean']:>12.1f} {old['p99']:>9.1f} {old['max']:>9.1f} | "
+              f"{new['mean']:>12.1f} {new['p99']:>9.1f} {new['max']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Run the benchmark suite and compare saved runs.
+
+Times queen layout generation, region coloring and puzzle generation across
+board sizes, GameController.update_move and get_game_state under a random
+move replay, and /move and /reset requests/sec through the Flask test
+client. Every case draws from a fixed seed, so two runs on the same machine
+measure the same work. Results are written as JSON; `compare` flags every
+case that got slower than the threshold.
+
+Usage:
+    python -m benchmarks.suite run [--out bench.json] [--quick]
+    python -m benchmarks.suite compare base.json new.json [--threshold 0.10]
+"""
+
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from app.controllers.game_controller import GameController
+from app.models import batch, coloring, puzzle, queens
+
+
+def measure(func, repeat, number):
+    """
+    Best over `repeat` rounds of the seconds per call of func, each round
+    calling it `number` times (the best round is the least disturbed by
+    the rest of the machine).
+    """
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        rounds.append((time.perf_counter() - start) / number)
+    return min(rounds)
+
+
+def latency(seconds, unit="ms"):
+    scale = {"ms": 1e3, "us": 1e6}[unit]
+    return {"value": seconds * scale, "unit": unit, "better": "lower"}
+
+
+def throughput(seconds):
+    return {"value": 1 / seconds, "unit": "req/s", "better": "higher"}
+
+
+def bench_generation(results, sizes, repeat, number, seed):
+    for N in sizes:
+        rng = random.Random(seed)
+        results[f"queens.generate_random_board[{N}]"] = latency(
+            measure(lambda: queens.generate_random_board(N, rng), repeat, number), "us"
+        )
+    for N in sizes:
+        rng = random.Random(seed)
+        boards = itertools.cycle(
+            [queens.generate_random_board(N, rng) for _ in range(number)]
+        )
+        results[f"coloring.color_board[{N}]"] = latency(measure(
+            lambda: coloring.color_board(next(boards), N, rng), repeat, number
+        ))
+    for N in sizes:
+        if N > 15:
+            continue  # the unique-region growth is only used up to 15
+        rng = random.Random(seed)
+        results[f"puzzle.generate_puzzle[{N}]"] = latency(measure(
+            lambda: puzzle.generate_puzzle(N, rng=rng), repeat, max(1, number // 10)
+        ))
+    for N in sizes:
+        # Per board, in batches of `number` (NumPy when installed)
+        results[f"batch.generate_batch[{N}]"] = latency(measure(
+            lambda: batch.generate_batch(number, N, seed), repeat, 1
+        ) / number)
+
+
+def random_moves(N, count, rng):
+    return [
+        (rng.randrange(N), rng.randrange(N), rng.choice(("queen", "cross", "clear")))
+        for _ in range(count)
+    ]
+
+
+def bench_moves(results, sizes, repeat, moves, seed):
+    for N in sizes:
+        if N > 15:
+            continue
+        rng = random.Random(seed)
+        replay = random_moves(N, moves, rng)
+        controller = GameController(N, seed=seed)
+
+        def run_moves():
+            controller.start_game(seed=seed)
+            for row, col, move_type in replay:
+                controller.update_move(row, col, move_type)
+
+        results[f"GameController.update_move[{N}]"] = latency(
+            measure(run_moves, repeat, 1) / moves, "us"
+        )
+        results[f"GameController.get_game_state[{N}]"] = latency(
+            measure(controller.get_game_state, repeat, 200), "us"
+        )
+
+
+def load_server():
+    """Import app.py (the Flask app) under its own name, or None without Flask."""
+    try:
+        import flask  # noqa: F401
+    except ImportError:
+        return None
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    spec = importlib.util.spec_from_file_location(
+        "queens_server", os.path.join(root, "app.py")
+    )
+    server = importlib.util.module_from_spec(spec)
+    # Flask finds the templates from the module's file only if the module
+    # is registered; otherwise it falls back to the working directory
+    sys.modules[spec.name] = server
+    spec.loader.exec_module(server)
+    return server
+
+
+def bench_http(results, repeat, requests, seed):
+    # The app is built with an empty pool that never refills (low water 0),
+    # so no background generation competes with the requests measured
+    tmp = tempfile.mkdtemp()
+    os.environ["PUZZLE_POOL_PATH"] = os.path.join(tmp, "pool.bin")
+    os.environ["PUZZLE_POOL_LOW_WATER"] = "0"
+    server = load_server()
+    if server is None:
+        print("Flask is not installed: skipping the HTTP benchmarks.", file=sys.stderr)
+        return
+    try:
+        client = server.app.test_client()
+        client.get("/")
+        rng = random.Random(seed)
+        replay = itertools.cycle(random_moves(8, requests, rng))
+        # Send the version of the last response, as the page does, so every
+        # /move takes the incremental path rather than a full-state resync
+        version = client.get("/state").get_json()["state"]["version"]
+
+        def move():
+            nonlocal version
+            row, col, move_type = next(replay)
+            version = client.post("/move", json={
+                "row": row, "col": col, "move_type": move_type, "version": version
+            }).get_json()["version"]
+
+        results["http./move"] = throughput(measure(move, repeat, requests))
+        random.seed(seed)   # /reset generates its puzzles from the global random
+        results["http./reset"] = throughput(measure(
+            lambda: client.post("/reset", json={"board_size": 8}),
+            repeat, max(1, requests // 10),
+        ))
+    finally:
+        server.service.stop()
+
+
+def run(args):
+    sizes = [4, 8, 12] if args.quick else args.sizes
+    repeat = 5 if args.quick else args.repeat
+    number = 10 if args.quick else args.number
+    results = {}
+    bench_generation(results, sizes, repeat, number, args.seed)
+    bench_moves(results, sizes, repeat, 200 if args.quick else 2000, args.seed)
+    if not args.no_http:
+        bench_http(results, repeat, 50 if args.quick else 500, args.seed)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "seed": args.seed,
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    for name, result in results.items():
+        print(f"{name:<40} {result['value']:>12.2f} {result['unit']}")
+    print(f"Results written to {args.out}", file=sys.stderr)
+    return 0
+
+
+def compare(args):
+    """Print base vs new for each case; exit 1 if any got slower than the threshold."""
+    with open(args.base) as f:
+        base = json.load(f)["results"]
+    with open(args.new) as f:
+        new = json.load(f)["results"]
+
+    slower = []
+    print(f"{'case':<40} {'base':>12} {'new':>12} {'change':>8}")
+    for name in sorted(base.keys() & new.keys()):
+        old, cur = base[name]["value"], new[name]["value"]
+        if base[name]["better"] == "lower":
+            change = cur / old - 1
+        else:
+            change = old / cur - 1
+        flag = ""
+        if change > args.threshold:
+            flag = "  SLOWER"
+            slower.append(name)
+        print(f"{name:<40} {old:>12.2f} {cur:>12.2f} {change:>+7.1%}{flag}")
+    for name in sorted(base.keys() ^ new.keys()):
+        print(f"{name:<40} only in {'base' if name in base else 'new'}")
+
+    if slower:
+        print(f"{len(slower)} case(s) slower than {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the suite and save the results")
+    run_parser.add_argument("--out", default="bench.json")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[4, 8, 12, 15, 30, 50])
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--number", type=int, default=50)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--quick", action="store_true", help="small sizes, few rounds")
+    run_parser.add_argument("--no-http", action="store_true")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="relative slowdown to flag (0.10 = 10%%)")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+# gunicorn.conf.py — read by gunicorn from the working directory
+#
+#   gunicorn app:app --bind 0.0.0.0:7860 --workers 8 --threads 4
+#
+# The app is imported once in the master (preload_app) with the read-only
+# tables built there (see app.utils.preload); workers are forked from it
+# and share those pages copy-on-write, so they boot without generating
+# anything and each adds little resident memory. Background threads and
+# process pools (the puzzle pool, the session journal) only start in the
+# workers, after the fork. Each worker gets a slot (see
+# preload.assign_slot) and keeps that share of the puzzle pool loaded in
+# the master, saving and refilling it on its own.
+
+from app.utils import preload
+
+preload_app = True
+preload.prepare_fork()
+
+
+def pre_fork(server, worker):
+    preload.freeze()
+    worker.slot = preload.assign_slot(
+        (w.slot.index for w in server.WORKERS.values()), server.num_workers
+    )
+
+
+def post_fork(server, worker):
+    preload.after_fork(worker.slot)
+
+
+def worker_exit(server, worker):
+    preload.worker_exit()